@@ -0,0 +1,69 @@
+"""
+Compare the storage backends by saving the training table and metrics
+of synthetic plans, the way options 2 and 3 of the main menu do.
+Only the backends that work offline are measured; add 'gspread' to the
+command line to include google sheet (needs creds.json and network).
+
+Usage: python benchmarks/bench_backends.py [EXERCISES] [gspread]
+"""
+import shutil
+import sys
+import tempfile
+import time
+
+from synthetic import make_plan
+from run import build_training_table, build_metrics_table
+from sheet_backends import (GspreadBackend, LocalFileBackend,
+                            MemoryBackend)
+
+
+def save_plan(backend, training_plan):
+    """
+    Write both tables of training_plan to backend.
+    Return the number of API calls made.
+    """
+    api_calls = backend.write_worksheet(
+        'Training Table', build_training_table(training_plan))
+    api_calls += backend.write_worksheet(
+        'Training Metrics', build_metrics_table(training_plan)[0])
+    return api_calls
+
+
+def main():
+    args = sys.argv[1:]
+    exercise_count = int(args[0]) if args and args[0].isdigit() else 1000
+    training_plan = make_plan(exercise_count)
+    folder = tempfile.mkdtemp()
+    backends = [
+        MemoryBackend(),
+        MemoryBackend(latency=0.05),
+        LocalFileBackend(f'{folder}/csv', 'csv'),
+        LocalFileBackend(f'{folder}/json', 'json'),
+    ]
+    if 'gspread' in args:
+        backends.append(GspreadBackend())
+
+    print(f'Saving a plan of {exercise_count} exercises, twice')
+    try:
+        for backend in backends:
+            label = backend.name
+            if getattr(backend, 'latency', 0):
+                label += f' ({backend.latency*1000:.0f} ms latency)'
+            if hasattr(backend, 'file_format'):
+                label += f' ({backend.file_format})'
+            start = time.perf_counter()
+            api_calls = save_plan(backend, training_plan)
+            first = time.perf_counter() - start
+            start = time.perf_counter()
+            api_calls += save_plan(backend, training_plan)
+            second = time.perf_counter() - start
+            read_back = backend.read_worksheet('Training Table')
+            print(f'{label:28} {first*1000:8.1f} ms, then '
+                  f'{second*1000:8.1f} ms, {api_calls} API calls, '
+                  f'{len(read_back)} rows read back')
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
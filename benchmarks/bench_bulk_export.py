@@ -0,0 +1,70 @@
+"""
+Measure how bulk_export.export_plans() scales with the number of
+workers, writing synthetic plans of many clients to an in-memory sheet
+with a latency per call, first without a quota and then with one
+shared by all workers. Every worksheet is checked to hold its client's
+tables afterwards.
+
+Usage: python benchmarks/bench_bulk_export.py [PLANS] [LATENCY]
+                                              [QUOTA_PER_MINUTE]
+"""
+import sys
+
+from synthetic import make_plans
+import sheet_sync
+from run import build_training_table, build_metrics_table
+from bulk_export import export_plans
+from sheet_backends import MemoryBackend
+from sheet_retry import ScheduledBackend
+
+
+WORKER_COUNTS = [1, 2, 4, 8, 16, 32]
+QUOTA_WORKER_COUNTS = [1, 4, 16]  # runs with a quota take seconds each
+BURST = 10  # calls let through at once, so the quota shows in short runs
+
+
+def export(plans, latency, workers, quota=None):
+    """
+    Export plans ({client: plan}) with workers threads and return the
+    report, after checking what was written.
+    """
+    fake = MemoryBackend(latency)
+    sheet_sync.set_backend(ScheduledBackend(fake, per_minute=quota,
+                                            burst=BURST))
+    report = export_plans(plans.items(), workers)
+    for client, training_plan in plans.items():
+        title = sheet_sync.worksheet_title
+        if (fake.worksheets[title('Training Table', client)]
+                != build_training_table(training_plan)
+                or fake.worksheets[title('Training Metrics', client)]
+                != build_metrics_table(training_plan)[0]):
+            sys.exit(f'the tables of {client} were not exported')
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    plan_count = int(args[0]) if args else 200
+    latency = float(args[1]) if len(args) > 1 else 0.05
+    quota = int(args[2]) if len(args) > 2 else 2400
+    plans = {f'Client {i}': training_plan for i, training_plan
+             in enumerate(make_plans(plan_count, 20))}
+    previous_backend = sheet_sync.get_backend()
+    try:
+        print(f'{plan_count} plans of 20 exercises, '
+              f'{latency * 1000:.0f} ms per call, no quota')
+        for workers in WORKER_COUNTS:
+            report = export(plans, latency, workers)
+            print(f'{workers:3} workers: {report.message()}')
+        print(f'\nWith a quota of {quota} writes a minute '
+              f'({quota / 60:.0f}/s, bursts of {BURST}) shared by the '
+              f'workers')
+        for workers in QUOTA_WORKER_COUNTS:
+            report = export(plans, latency, workers, quota)
+            print(f'{workers:3} workers: {report.message()}')
+    finally:
+        sheet_sync.set_backend(previous_backend)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Measure the name catalogue with tens of thousands of exercise names:
+exact lookups of other spellings, prefix lookups, and fuzzy lookups of
+names with a typo, also through a catalogue layered on it. Fuzzy
+results are checked against comparing the query with every name of the
+catalogue.
+
+Usage: python benchmarks/bench_catalogue.py [NAMES]
+"""
+import random
+import sys
+import time
+
+import synthetic  # noqa: F401, makes the app's modules importable
+from name_catalogue import (NameCatalogue, COMMON_EXERCISES, edit_distance,
+                            max_typos, normalise_name)
+
+
+MODIFIERS = ['Incline', 'Decline', 'Seated', 'Standing', 'Single Arm',
+             'Cable', 'Dumbbell', 'Barbell', 'Kettlebell', 'Machine',
+             'Wide Grip', 'Close Grip', 'Reverse', 'Alternating', 'Paused',
+             'Banded', 'Smith', 'Landmine', 'Deficit', 'Tempo']
+SUFFIXES = ['', 'on Bench', 'with Chains', 'to Failure', 'Isometric',
+            'Partial', 'Eccentric', 'Drop Set', 'Cluster', 'Pyramid']
+QUERIES = 2000
+
+
+def make_names(count, rng):
+    """
+    Return count different exercise names, like a catalogue grown from
+    many trainers' plans.
+    """
+    names = set()
+    while len(names) < count:
+        words = rng.sample(MODIFIERS, rng.randint(1, 3))
+        words.append(rng.choice(COMMON_EXERCISES))
+        words.append(rng.choice(SUFFIXES))
+        names.add(' '.join(word for word in words if word))
+    return sorted(names)
+
+
+def add_typo(name, rng):
+    """
+    Return name with one letter replaced, dropped, added or swapped.
+    """
+    i = rng.randrange(1, len(name) - 1)
+    letter = rng.choice('abcdefghijklmnopqrstuvwxyz')
+    typo = rng.choice(['replace', 'drop', 'add', 'swap'])
+    if typo == 'replace':
+        return name[:i] + letter + name[i+1:]
+    if typo == 'drop':
+        return name[:i] + name[i+1:]
+    if typo == 'add':
+        return name[:i] + letter + name[i:]
+    return name[:i-1] + name[i] + name[i-1] + name[i+1:]
+
+
+def per_lookup(function, queries):
+    start = time.perf_counter()
+    for query in queries:
+        function(query)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    rng = random.Random(0)
+    names = make_names(count, rng)
+    start = time.perf_counter()
+    catalogue = NameCatalogue(names)
+    print(f'{len(catalogue)} names indexed in '
+          f'{(time.perf_counter() - start) * 1000:.0f} ms')
+
+    sample = rng.sample(names, QUERIES)
+    spellings = [f' {name.lower()} ' for name in sample]
+    prefixes = [name[:rng.randint(4, 12)] for name in sample]
+    typos = [add_typo(name, rng) for name in sample]
+    print(f'exact: {per_lookup(catalogue.get, spellings):8.1f} us')
+    print(f'prefix: {per_lookup(catalogue.complete, prefixes):7.1f} us')
+    print(f'fuzzy: {per_lookup(catalogue.similar, typos):8.1f} us')
+    print(f'match: {per_lookup(catalogue.match, typos):8.1f} us')
+    # a session's catalogue, layered on the shared one
+    layer = NameCatalogue(base=catalogue)
+    print(f'layered match: {per_lookup(layer.match, typos):.1f} us')
+
+    # the index must find the same closest distance as a full scan
+    keys = [normalise_name(name) for name in names]
+    checked = 0
+    start = time.perf_counter()
+    for typo in typos[:100]:
+        key = normalise_name(typo)
+        limit = max_typos(key)
+        best = min(edit_distance(key, other, limit) for other in keys)
+        found = catalogue.similar(typo, limit=1)
+        if best <= limit:
+            if not found or edit_distance(
+                    key, normalise_name(found[0]), limit) != best:
+                sys.exit(f'{typo!r}: the index missed a name {best} typos '
+                         f'away')
+        elif found:
+            sys.exit(f'{typo!r}: {found[0]!r} is not within {limit} typos')
+        checked += 1
+    scan = (time.perf_counter() - start) / checked * 1e6
+    print(f'full scan: {scan:.0f} us per query, same results for '
+          f'{checked} queries')
+
+
+if __name__ == '__main__':
+    main()
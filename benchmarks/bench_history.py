@@ -0,0 +1,106 @@
+"""
+Measure the workout history: logging sessions, opening the history
+again and querying a client's weekly trend, compared with computing the
+same trend by going through every set logged. The trend of the weekly
+totals is checked against the one computed from the sets.
+
+A session is a synthetic plan of 20 exercises; clients train three
+times a week.
+
+Usage: python benchmarks/bench_history.py [YEARS] [CLIENTS]
+"""
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from synthetic import make_plan
+from run import MuscleGroup, Exercise
+from history_store import HistoryStore, week_of
+
+
+def trend_from_sets(history, client, until, weeks):
+    """
+    Return the weekly volume, tut and duration of client by rebuilding
+    every session of the client from the set records, like a history
+    without weekly totals would have to.
+    """
+    columns = {name: np.asarray(history.column(name))
+               for name in ('session', 'day', 'client', 'group', 'exercise',
+                            'reps', 'weight', 'contraction', 'pause',
+                            'extension', 'rest')}
+    mask = columns['client'] == history.name_ids[client]
+    totals = {}
+    groups = {}  # (session, week, group) -> MuscleGroup
+    for session, day, group, name, reps, weight, contraction, pause, \
+            extension, rest in zip(*(columns[name][mask].tolist() for name in
+                                     ('session', 'day', 'group', 'exercise',
+                                      'reps', 'weight', 'contraction',
+                                      'pause', 'extension', 'rest'))):
+        key = (session, week_of(date.fromordinal(day)), group)
+        muscle_group = groups.get(key)
+        if muscle_group is None:
+            muscle_group = groups[key] = MuscleGroup()
+        exercise = muscle_group.exercises.get(name)
+        if exercise is None:
+            exercise = muscle_group.exercises[name] = Exercise()
+            if contraction == contraction:  # not NaN
+                exercise.cadence = tuple(
+                    int(value) if value == int(value) else value
+                    for value in (contraction, pause, extension))
+            exercise.rest = None if rest < 0 else rest
+        exercise.add_set(reps, weight)
+        exercise.sets = len(exercise.reps)
+    for (_, week, _), muscle_group in groups.items():
+        muscle_group.update_metrics()
+        week_totals = totals.setdefault(week, [0, 0, 0])
+        for i, value in enumerate(muscle_group.calc_metrics()):
+            week_totals[i] += value
+    last_week = week_of(until)
+    return [tuple(totals.get(week, (0, 0, 0)))
+            for week in range(last_week - weeks + 1, last_week + 1)]
+
+
+def main():
+    args = sys.argv[1:]
+    years = int(args[0]) if args else 3
+    client_count = int(args[1]) if len(args) > 1 else 3
+    folder = tempfile.mkdtemp()
+    history = HistoryStore(folder)
+    first_day = date(2023, 1, 2)
+    session_days = [first_day + timedelta(days=week * 7 + day)
+                    for week in range(years * 52) for day in (0, 2, 4)]
+    plans = [make_plan(20, seed=seed) for seed in range(10)]
+
+    start = time.perf_counter()
+    for i, day in enumerate(session_days):
+        for client in range(client_count):
+            history.log_session(f'Client {client}', day,
+                                plans[(i + client) % len(plans)])
+    log_time = time.perf_counter() - start
+    sessions = len(session_days) * client_count
+    print(f'{sessions} sessions, {history.header["sets"]} sets logged: '
+          f'{log_time / sessions * 1000:.2f} ms per session')
+
+    start = time.perf_counter()
+    history = HistoryStore(folder)
+    print(f'open: {(time.perf_counter() - start) * 1000:.1f} ms')
+
+    weeks = years * 52
+    until = session_days[-1]
+    start = time.perf_counter()
+    rows = history.trend('Client 0', weeks=weeks, until=until)
+    trend_time = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = trend_from_sets(history, 'Client 0', until, weeks)
+    scan_time = time.perf_counter() - start
+    if [tuple(row[1:4]) for row in rows] != expected:
+        sys.exit('the weekly totals differ from the sets logged')
+    print(f'trend of {weeks} weeks: {trend_time * 1000:.2f} ms from the '
+          f'weekly totals, {scan_time * 1000:.0f} ms from the sets')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Measure the local plan journal: the time to record one change (which
+should not grow with the plan), to rewrite the snapshot and to restore
+a plan at startup, for plans of 1k to 100k exercises. Restored plans
+are checked against the original, also after a crash left the journal
+of a plan that a new snapshot replaced.
+
+Usage: python benchmarks/bench_journal.py [EXERCISES ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from synthetic import make_plan
+from run import TrainingPlan, Exercise, build_training_table
+from plan_journal import PlanJournal
+
+
+def check_replaced_plan(journal, training_plan):
+    """
+    Record a change of training_plan, replace the plan of journal with a
+    new one, then put back the old journal as if the app stopped before
+    emptying it: the new plan must be restored without the old
+    journal's changes.
+    """
+    group = next(iter(training_plan.values()))
+    exercise = Exercise()
+    exercise.name = 'Replaced'
+    exercise.sets = 1
+    exercise.add_set(10, 20.0)
+    group.add_exercise(exercise)
+    journal.exercise_added(training_plan, group.name, exercise)
+    journal.close()
+    with open(journal.journal_path, encoding='utf-8') as file:
+        old_journal = file.read()
+    new_plan = TrainingPlan(make_plan(10, seed=1))
+    journal.save_snapshot(new_plan, 'New client')
+    with open(journal.journal_path, 'w', encoding='utf-8') as file:
+        file.write(old_journal)
+    restored_plan, client = PlanJournal(journal.snapshot_path,
+                                        journal.journal_path).restore()
+    if (client != 'New client' or build_training_table(restored_plan)
+            != build_training_table(new_plan)):
+        sys.exit('the journal of a replaced plan was replayed')
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [1000, 10_000, 100_000]
+    folder = tempfile.mkdtemp()
+    for size in sizes:
+        journal = PlanJournal(os.path.join(folder, f'{size}.snapshot'),
+                              os.path.join(folder, f'{size}.journal'))
+        training_plan = TrainingPlan(make_plan(size))
+
+        start = time.perf_counter()
+        journal.save_snapshot(training_plan, 'Client')
+        snapshot_time = time.perf_counter() - start
+
+        # 100 changes, fewer than the plan's exercises so none compacts
+        changes = min(100, size - 1)
+        group = next(iter(training_plan.values()))
+        start = time.perf_counter()
+        for i in range(changes):
+            exercise = Exercise()
+            exercise.name = f'Added {i}'
+            exercise.sets = 1
+            exercise.add_set(10, 20.0)
+            group.add_exercise(exercise)
+            journal.exercise_added(training_plan, group.name, exercise)
+        change_time = (time.perf_counter() - start) / changes
+        journal.close()
+
+        start = time.perf_counter()
+        journal = PlanJournal(journal.snapshot_path, journal.journal_path)
+        restored_plan, client = journal.restore()
+        restore_time = time.perf_counter() - start
+        if (client != 'Client' or build_training_table(restored_plan)
+                != build_training_table(training_plan)):
+            sys.exit(f'the plan of {size} exercises was not restored')
+
+        print(f'{size:7} exercises: change {change_time * 1e6:6.1f} us, '
+              f'snapshot {snapshot_time * 1000:8.1f} ms '
+              f'({os.path.getsize(journal.snapshot_path) / 1e6:.1f} MB), '
+              f'restore {restore_time * 1000:8.1f} ms')
+        check_replaced_plan(journal, restored_plan)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure the memory used by 100k exercises with the slotted, array
+backed Exercise/MuscleGroup classes, compared with the previous layout
+(plain attributes, reps and weights as a list of [reps, weight] lists).
+
+Usage: python benchmarks/bench_memory.py [EXERCISES]
+"""
+import random
+import sys
+import tracemalloc
+
+from synthetic import GROUP_NAMES
+from run import MuscleGroup, Exercise
+
+
+class DictMuscleGroup():
+    """
+    A muscle group laid out like MuscleGroup before it used __slots__.
+    """
+    def __init__(self):
+        self.name = ''
+        self.exercises = {}
+
+
+class DictExercise():
+    """
+    An exercise laid out like Exercise before it used __slots__ and
+    arrays: one python list per set and '' for skipped values.
+    """
+    def __init__(self):
+        self.name = ''
+        self.sets = ''
+        self.reps_and_weights = []
+        self.cadence = []
+        self.rest = ''
+
+
+def build(exercise_count, group_class, exercise_class, add_set):
+    """
+    Build exercise_count exercises with 1 to 6 sets each, spread over
+    ten muscle groups. Values come from a fixed seed so both layouts
+    hold the same data.
+    """
+    rng = random.Random(0)
+    groups = {}
+    for i in range(exercise_count):
+        group_name = GROUP_NAMES[i % len(GROUP_NAMES)]
+        group = groups.get(group_name)
+        if group is None:
+            group = group_class()
+            group.name = group_name
+            groups[group_name] = group
+        exercise = exercise_class()
+        exercise.name = f'Exercise {i}'
+        exercise.sets = rng.randint(1, 6)
+        for _ in range(exercise.sets):
+            add_set(exercise, rng.randint(1, 15), rng.random() * 100)
+        if rng.random() < 0.5:
+            exercise.cadence = (rng.randint(0, 4), 0, rng.randint(1, 4))
+        if rng.random() < 0.5:
+            exercise.rest = rng.randint(30, 180)
+        group.exercises[exercise.name] = exercise
+    return groups
+
+
+def measure(exercise_count, group_class, exercise_class, add_set):
+    """
+    Return the bytes allocated to build the exercises and keep them.
+    """
+    tracemalloc.start()
+    groups = build(exercise_count, group_class, exercise_class, add_set)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del groups
+    return size
+
+
+def main():
+    exercise_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    before = measure(exercise_count, DictMuscleGroup, DictExercise,
+                     lambda ex, reps, weight:
+                     ex.reps_and_weights.append([reps, weight]))
+    after = measure(exercise_count, MuscleGroup, Exercise,
+                    Exercise.add_set)
+    print(f'{exercise_count} exercises')
+    print(f'previous layout:  {before / 2**20:7.1f} MiB '
+          f'({before / exercise_count:.0f} bytes per exercise)')
+    print(f'slots and arrays: {after / 2**20:7.1f} MiB '
+          f'({after / exercise_count:.0f} bytes per exercise)')
+    print(f'saving:           {(before - after) / 2**20:7.1f} MiB '
+          f'({1 - after / before:.0%})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Compare calculating the metrics group by group (MuscleGroup's own
+loop over all sets, update_metrics()) with the batched metrics_engine
+on many synthetic plans, end to end: packing the plans is timed with
+the computation. The plans are also saved to a plan store, where
+loading each plan and calling calc_metrics() is compared with
+calc_store_metrics(), which packs the plans straight from the rows.
+
+Usage: python benchmarks/bench_metrics.py [PLANS] [EXERCISES_PER_PLAN]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from synthetic import make_plans
+from metrics_engine import (PackedPlans, compute_metrics, calc_all_metrics,
+                            calc_store_metrics)
+from plan_store import PlanStore
+
+
+def best_time(function, repeat=3):
+    """
+    Return the fastest of repeat runs of function, in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    plan_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    exercises = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    plans = make_plans(plan_count, exercises)
+
+    def full_metrics(group):
+        group.update_metrics()  # not the cached running totals
+        return group.calc_metrics()
+
+    def loop():
+        return [{group.name: full_metrics(group)
+                 for group in training_plan.values()}
+                for training_plan in plans]
+
+    if loop() != calc_all_metrics(plans):
+        sys.exit('metrics_engine results differ from calc_metrics()')
+
+    packed = PackedPlans(plans)
+    loop_time = best_time(loop)
+    batch_time = best_time(lambda: calc_all_metrics(plans))
+    compute_time = best_time(lambda: compute_metrics(packed))
+    print(f'{plan_count} plans x {exercises} exercises '
+          f'({packed.group_count} groups, {len(packed.reps)} sets)')
+    print(f'update_metrics() loop:        {loop_time*1000:9.1f} ms')
+    print(f'pack + compute:               {batch_time*1000:9.1f} ms '
+          f'({loop_time/batch_time:.1f}x)')
+    print(f'compute only (packed once):   {compute_time*1000:9.1f} ms '
+          f'({loop_time/compute_time:.1f}x)')
+
+    with tempfile.TemporaryDirectory() as folder:
+        store = PlanStore(os.path.join(folder, 'plans.db'))
+        for i, training_plan in enumerate(plans):
+            store.save_plan(f'Client {i % 100}', f'Plan {i}', training_plan)
+        store_check(store)
+        store.close()
+
+
+def store_check(store):
+    """
+    Check calc_store_metrics() against loading every plan of store and
+    calling calc_metrics(), and print the times of both.
+    """
+    def load_loop():
+        return {(client, plan_id): {
+                    group.name: group.calc_metrics()
+                    for group in store.load_plan(client, plan_id).values()}
+                for client in store.clients()
+                for plan_id in store.plans(client)}
+
+    if load_loop() != calc_store_metrics(store):
+        sys.exit('calc_store_metrics() results differ from calc_metrics()')
+
+    load_time = best_time(load_loop)
+    store_time = best_time(lambda: calc_store_metrics(store))
+    print(f'load_plan() + calc_metrics(): {load_time*1000:9.1f} ms')
+    print(f'calc_store_metrics():         {store_time*1000:9.1f} ms '
+          f'({load_time/store_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
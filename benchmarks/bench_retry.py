@@ -0,0 +1,100 @@
+"""
+Check the rate limiting and retries of sheet_retry.ScheduledBackend
+against the in-memory sheet failing calls on purpose, and measure what
+they cost:
+
+- writes failing with 429/503 at random are retried until every
+  worksheet holds the last table submitted for it, never a partial one
+- a call failing with a status that isn't worth retrying fails at once
+- the token bucket keeps the calls to the quota
+
+Usage: python benchmarks/bench_retry.py [WRITES] [FAILURE_RATE]
+"""
+import sys
+import time
+
+from synthetic import make_plan
+import run
+from instrumentation import instruments
+from sheet_backends import MemoryBackend, SheetAPIError
+from sheet_retry import ScheduledBackend
+from sheet_sync import SyncWorker
+
+
+def flaky_writes(write_count, failure_rate):
+    """
+    Submit write_count tables to a SyncWorker writing to a sheet that
+    fails failure_rate of the calls, and check what ends up in it.
+    """
+    fake = MemoryBackend(latency=0.002, failure_rate=failure_rate,
+                         failure_status=429)
+    backend = ScheduledBackend(fake, base_delay=0.001, max_delay=0.02,
+                               max_attempts=8)
+    worker = SyncWorker(backend.write_worksheet)
+    tables = {}
+    retries = instruments.counters['sheet.retry']
+    start = time.perf_counter()
+    for i in range(write_count):
+        worksheet_name = f'Client {i % 20} - Training Table'
+        tables[worksheet_name] = run.build_training_table(
+            make_plan(20, seed=i))
+        worker.submit(worksheet_name, tables[worksheet_name])
+        if i % 50 == 49:  # let the uploads catch up now and then
+            worker.flush()
+    while not worker.flush():  # some uploads ran out of attempts
+        pass
+    seconds = time.perf_counter() - start
+    for worksheet_name, values in tables.items():
+        if fake.worksheets[worksheet_name] != [list(row) for row in values]:
+            sys.exit(f'{worksheet_name} does not hold its last table')
+    print(f'{write_count} submits, {failure_rate:.0%} of calls failing: '
+          f'{seconds:.2f} s, {fake.calls["write"]} writes, '
+          f'{fake.calls["failed write"]} failed '
+          f'({instruments.counters["sheet.retry"] - retries} retried), '
+          f'{worker.api_calls} API calls, {worker.merged} merged, '
+          f'every worksheet complete')
+
+
+def failures_in_a_row():
+    fake = MemoryBackend()
+    backend = ScheduledBackend(fake, base_delay=0.001)
+    fake.fail_next(429, 503, 503)
+    api_calls = backend.write_worksheet('Training Table', [['a']])
+    if fake.worksheets['Training Table'] != [['a']] or api_calls != 4:
+        sys.exit('write did not succeed on the fourth attempt')
+    fake.fail_next(400)
+    try:
+        backend.write_worksheet('Training Table', [['b']])
+    except SheetAPIError as error:
+        if fake.worksheets['Training Table'] != [['a']]:
+            sys.exit('a failed write changed the worksheet')
+        print(f'429, 503, 503 then success: 4 attempts; '
+              f'{error} fails at once')
+    else:
+        sys.exit('a 400 error was retried')
+
+
+def quota(per_minute, burst, call_count):
+    backend = ScheduledBackend(MemoryBackend(), per_minute=per_minute,
+                               burst=burst)
+    start = time.perf_counter()
+    for i in range(call_count):
+        backend.write_worksheet('Training Table', [[i]])
+    seconds = time.perf_counter() - start
+    # the bucket is refilled with what the burst leaves of the quota
+    expected = (call_count - burst) / ((per_minute - burst) / 60)
+    print(f'{call_count} writes with a quota of {per_minute}/min and '
+          f'bursts of {burst}: {seconds:.2f} s (expected {expected:.2f} s, '
+          f'{call_count / seconds * 60:.0f}/min)')
+
+
+def main():
+    write_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    failure_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+    failures_in_a_row()
+    flaky_writes(write_count, failure_rate)
+    quota(6000, 10, 110)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Measure week_scheduler.schedule_week() on synthetic plans of a few to
+thousands of muscle groups, for different numbers of training days and
+sessions a week. Every schedule is checked to keep the rest days and
+the maximum session length, and its longest day is compared with the
+lower bound and, for small plans, with the best schedule found by
+trying every one.
+
+Usage: python benchmarks/bench_scheduler.py [MOST_GROUPS]
+"""
+import itertools
+import sys
+import time
+
+from synthetic import make_plan
+from week_scheduler import (schedule_week, group_durations, spread_days,
+                            rest_days_between)
+
+
+EXERCISES_PER_GROUP = 4
+SETTINGS = [  # (training days, sessions of each group, rest days)
+    (3, 1, 1),
+    (5, 1, 1),
+    (4, 2, 1),
+    (6, 3, 1),
+]
+EXACT_GROUPS = 9  # plans small enough to try every schedule
+
+
+def check(schedule, durations, times, rest_days, max_session):
+    """
+    Exit if schedule breaks a rule or misses a session.
+    """
+    group_days = {}
+    for i, (names, load) in enumerate(zip(schedule.groups, schedule.loads)):
+        if load != sum(durations[name] for name in names):
+            sys.exit(f'the duration of day {i} is wrong')
+        if max_session is not None and load > max_session:
+            sys.exit(f'day {i} is longer than {max_session}(s)')
+        for name in names:
+            group_days.setdefault(name, []).append(schedule.days[i])
+    for name in durations:
+        scheduled = group_days.get(name, [])
+        if len(scheduled) + schedule.unscheduled.count(name) != times:
+            sys.exit(f'{name} is not trained {times} times')
+        for first, second in itertools.combinations(scheduled, 2):
+            if rest_days_between(first, second) < rest_days:
+                sys.exit(f'{name} is trained without {rest_days} rest days')
+
+
+def best_longest_day(durations, day_count):
+    """
+    Return the shortest longest day of all ways to spread durations
+    over day_count days, each group once.
+    """
+    values = list(durations.values())
+    best = sum(values)
+    for days in itertools.product(range(day_count), repeat=len(values) - 1):
+        loads = [0] * day_count
+        loads[0] = values[0]  # the days are interchangeable
+        for value, day in zip(values[1:], days):
+            loads[day] += value
+        best = min(best, max(loads))
+    return best
+
+
+def main():
+    most_groups = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    group_counts = [count for count in (EXACT_GROUPS, 100, 1000, 10_000)
+                    if count <= most_groups]
+    for group_count in group_counts:
+        group_names = [f'Group {i}' for i in range(group_count)]
+        durations = group_durations(make_plan(
+            group_count * EXERCISES_PER_GROUP, seed=group_count,
+            group_names=group_names))
+        print(f'{group_count} muscle groups, '
+              f'{sum(durations.values()) / 3600:.1f} h of training')
+        for day_count, times, rest_days in SETTINGS:
+            days = spread_days(day_count)
+            start = time.perf_counter()
+            schedule = schedule_week(durations, days, times, rest_days)
+            elapsed = time.perf_counter() - start
+            check(schedule, durations, times, rest_days, None)
+            line = (f'  {day_count} days, {times}x a week: '
+                    f'{elapsed * 1000:8.2f} ms, longest day '
+                    f'{schedule.longest():.0f}(s), lower bound '
+                    f'{schedule.lower_bound:.0f}(s)')
+            if group_count <= EXACT_GROUPS and times == 1:
+                line += (f', best {best_longest_day(durations, day_count):.0f}'
+                         f'(s)')
+            print(line)
+        # a session limit shorter than the balanced days
+        max_session = schedule.lower_bound * 0.9
+        schedule = schedule_week(durations, days, times, rest_days,
+                                 max_session)
+        check(schedule, durations, times, rest_days, max_session)
+        print(f'  at most {max_session:.0f}(s) a day: '
+              f'{len(schedule.unscheduled)} sessions not scheduled')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Load driver for session_server.py: open many connections to a server
+running in this process, each one creating a plan through the prompts
+(the answers of synthetic.make_session_script()), and measure how long
+it takes and how much memory every open session holds. Tables are
+saved to the in-memory sheet with a latency.
+
+Usage: python benchmarks/bench_server.py [SESSIONS] [EXERCISES]
+                                         [LATENCY]
+"""
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+
+from synthetic import make_session_script
+import sheet_sync
+from sheet_backends import MemoryBackend
+from session_server import SessionServer
+
+
+DYNO_MEMORY = 512e6  # bytes of a standard Heroku dyno
+DONE_MARKER = b'Total Duration Of Training'  # printed by the last step
+
+
+def resident_memory():
+    """
+    Return the resident memory of the process in bytes (Linux only),
+    or None.
+    """
+    try:
+        with open('/proc/self/status', encoding='utf-8') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+
+
+async def client(host, port, lines, ready, done):
+    """
+    Send the answers of a session and wait until its last table is
+    printed, then count it in ready and keep the connection (and the
+    session) open until done is set.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(''.join(f'{line}\n' for line in lines).encode())
+    await writer.drain()
+    received = b''
+    while DONE_MARKER not in received:
+        data = await reader.read(65536)
+        if not data:
+            raise RuntimeError('the session ended early')
+        received = received[-len(DONE_MARKER):] + data
+    ready.append(lines)
+    await done.wait()
+    writer.close()
+
+
+async def main():
+    session_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    exercises = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+    sheet_sync.set_backend(MemoryBackend(latency))
+
+    server = SessionServer(max_sessions=session_count)
+    host, port = await server.start('127.0.0.1', 0)
+    scripts = [make_session_script(exercises, seed=i)
+               for i in range(session_count)]
+    gc.collect()
+    tracemalloc.start()
+    rss_before = resident_memory()
+    start = time.perf_counter()
+
+    ready = []  # scripts of the sessions that printed their last table
+    done = asyncio.Event()
+    clients = [asyncio.ensure_future(client(host, port, lines, ready, done))
+               for lines in scripts]
+    while len(ready) < session_count:
+        for task in clients:
+            if task.done():  # a session failed, raise its error
+                task.result()
+        await asyncio.sleep(0.01)
+    seconds = time.perf_counter() - start
+
+    gc.collect()
+    python_memory, _ = tracemalloc.get_traced_memory()
+    rss = resident_memory()
+    open_sessions = len(server.sessions)
+    done.set()
+    await asyncio.gather(*clients)
+    await server.stop()
+    tracemalloc.stop()
+
+    answers = sum(len(lines) for lines in scripts)
+    print(f'{session_count} concurrent sessions of {exercises} exercises, '
+          f'{answers} answers, {latency * 1000:.0f} ms sheet latency')
+    print(f'all plans created in {seconds:.2f} s '
+          f'({answers / seconds:.0f} answers/s), '
+          f'{open_sessions} sessions open')
+    per_session = python_memory / session_count
+    print(f'python memory per open session: {per_session / 1e3:.0f} kB')
+    if rss is not None and rss_before is not None:
+        rss_per_session = (rss - rss_before) / session_count
+        print(f'resident memory per open session: '
+              f'{rss_per_session / 1e3:.0f} kB, about '
+              f'{DYNO_MEMORY / max(rss_per_session, per_session):.0f} '
+              f'sessions per 512 MB dyno (less the '
+              f'{rss_before / 1e6:.0f} MB the process starts with)')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
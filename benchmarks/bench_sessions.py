@@ -0,0 +1,54 @@
+"""
+Run many synthetic sessions in replay mode, through the prompts,
+validation and sheet sync paths, against an in-memory sheet with a
+configurable latency.
+
+Usage: python benchmarks/bench_sessions.py [SESSIONS] [EXERCISES]
+                                           [LATENCY]
+"""
+import contextlib
+import io
+import sys
+import time
+
+from synthetic import make_session_script
+import run
+import sheet_sync
+from sheet_backends import MemoryBackend
+
+
+def main():
+    session_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    exercises = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.01
+    backend = MemoryBackend(latency)
+    sheet_sync.set_backend(backend)
+
+    scripts = [make_session_script(exercises, seed=i, invalid_every=7)
+               for i in range(session_count)]
+    answers = sum(len(script) for script in scripts)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        for script in scripts:
+            training_plan = run.run_scripted_session(script)
+            if sum(len(group.exercises)
+                   for group in training_plan.values()) != exercises:
+                sys.exit('a session did not create the expected plan')
+            output.seek(0)
+            output.truncate()
+    session_time = time.perf_counter() - start
+    sheet_sync.sync_worker.flush()
+    total_time = time.perf_counter() - start
+
+    print(f'{session_count} sessions of {exercises} exercises, '
+          f'{answers} answers, {latency*1000:.0f} ms sheet latency')
+    print(f'sessions: {session_time:.2f} s '
+          f'({session_count/session_time:.1f} sessions/s, '
+          f'{answers/session_time:.0f} answers/s)')
+    print(f'with sheet sync flushed: {total_time:.2f} s, '
+          f'{backend.calls["write"]} sheet writes '
+          f'({sheet_sync.sync_worker.merged} merged before upload)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Round trip of a plan through the sheet: export the training table to an
+in-memory sheet, load it back with plan_import.import_worksheet() and
+check that the loaded plan gives the same training and metrics tables,
+for plans of 1k to 100k exercises, and for a plan of exercise names
+like the ones trainers use, many of them a letter or two apart from
+each other ('Incline Press', 'Decline Press'), which must not be merged.
+
+Each plan is loaded twice: from the values as they were written, and
+from the values as google's get_all_values() returns them, every cell
+formatted as text (e.g. 40.0 as '40').
+
+Usage: python benchmarks/bench_sheet_import.py [EXERCISES ...]
+"""
+import sys
+import time
+
+from synthetic import make_plan, GROUP_NAMES
+import sheet_sync
+from run import TrainingPlan, build_training_table, build_metrics_table
+from plan_import import import_worksheet
+from sheet_backends import MemoryBackend
+from name_catalogue import COMMON_GROUPS, COMMON_EXERCISES
+
+
+WORKSHEET = 'Training Table'
+"""
+Exercise names close to each other or to the common ones.
+"""
+SIMILAR_EXERCISES = [
+    'Incline Press', 'Decline Press', 'Cable Pulldown', 'Cable Pushdown',
+    'Hammer Curl', 'Leg Curl', 'Leg Curls Seated', 'Front Raise',
+    'Lateral Raise', 'Cable Row', 'Cable Rows', 'Dumbbell Fly',
+    'Dumbbell Flys', 'Split Squats', 'Split Squat Jumps',
+]
+
+
+def formatted(value):
+    """
+    Return value as google shows it in the sheet.
+    """
+    if isinstance(value, float):
+        return f'{value:g}'
+    return str(value)
+
+
+def named_plan():
+    """
+    Return a plan with every common muscle group, each with all common
+    and similar exercise names.
+    """
+    names = COMMON_EXERCISES + SIMILAR_EXERCISES
+    synthetic_plan = make_plan(len(COMMON_GROUPS) * len(names),
+                               group_names=COMMON_GROUPS)
+    training_plan = TrainingPlan()
+    for group in synthetic_plan.values():
+        exercises = list(group.exercises.values())
+        group.exercises = {}
+        for name, exercise in zip(names, exercises):
+            exercise.name = name
+            group.exercises[name] = exercise
+        training_plan[group.name] = group
+    return training_plan
+
+
+def load(backend, training_plan, as_text):
+    """
+    Write the training table of training_plan to backend and load it
+    back. Returns (loaded plan, exercises imported, seconds). Names
+    only reported as similar to others are fine, skipped rows aren't.
+    """
+    rows = build_training_table(training_plan)
+    if as_text:
+        rows = [[formatted(value) for value in row] for row in rows]
+    backend.write_worksheet(WORKSHEET, rows)
+    backend.reset_stats()
+
+    errors = []
+    warnings = []  # similar names, kept
+    loaded_plan = TrainingPlan()
+    start = time.perf_counter()
+    imported, skipped = import_worksheet(WORKSHEET, loaded_plan,
+                                         errors.append, warnings.append)
+    seconds = time.perf_counter() - start
+    if skipped:
+        sys.exit(f'{len(rows) - 1} exercises: {errors}')
+    return loaded_plan, imported, seconds
+
+
+def check_round_trip(backend, training_plan, as_text):
+    """
+    Load training_plan back with load(), exit if it isn't the same.
+    Returns the seconds the load took.
+    """
+    size = sum(len(group.exercises) for group in training_plan.values())
+    loaded_plan, imported, seconds = load(backend, training_plan, as_text)
+    if (imported != size
+            or build_training_table(loaded_plan)
+            != build_training_table(training_plan)
+            or build_metrics_table(loaded_plan)[0]
+            != build_metrics_table(training_plan)[0]):
+        sys.exit(f'the plan of {size} exercises was not loaded back')
+    return seconds
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [1000, 10_000, 100_000]
+    backend = MemoryBackend()
+    previous_backend = sheet_sync.get_backend()
+    sheet_sync.set_backend(backend)
+    # names the prompts accept, so every exported row can be loaded back
+    group_names = [name for name in GROUP_NAMES if len(name) >= 4]
+    try:
+        training_plan = named_plan()
+        for as_text in (False, True):
+            check_round_trip(backend, training_plan, as_text)
+        print(f'{len(COMMON_GROUPS)} groups of common and similar exercise '
+              f'names loaded back unmerged')
+        for size in sizes:
+            training_plan = TrainingPlan(make_plan(size,
+                                                   group_names=group_names))
+            for as_text in (False, True):
+                seconds = check_round_trip(backend, training_plan, as_text)
+                print(f'{size:7} exercises, '
+                      f'{"text" if as_text else "values"}: '
+                      f'load {seconds * 1000:8.1f} ms '
+                      f'({size / seconds:9.0f} rows/s), '
+                      f'{sum(backend.calls.values())} sheet call(s)')
+    finally:
+        sheet_sync.set_backend(previous_backend)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""
+Benchmark suite for the hot paths of run.py, on synthetic plans of 10
+to 100k exercises:
+
+- parse: check_input() on a mix of answers, and get_cadence_values()
+- metrics: MuscleGroup.calc_metrics() of every group, with the running
+  totals, and after update_metrics() recomputes them
+- rows: build_training_table() and build_metrics_table()
+- render: the training table pages of print_training_plan() and the
+  tabulate metrics table of print_calculated_values(), plus tabulate on
+  the whole training table for comparison (up to 10k exercises)
+- sheet: print_training_plan() and print_calculated_values() against an
+  in-memory sheet with a latency, timed until the sheet sync is done,
+  with the number of sheet calls they made
+
+The best time of several repetitions is kept for every benchmark.
+Results can be saved as a baseline (a JSON file) and later runs
+compared with it, any benchmark slower than the baseline by more than
+the tolerance being reported as a regression (exit status 1). Baselines
+depend on the machine, save one before comparing on a new machine.
+
+Usage: python benchmarks/bench_suite.py [--sizes 10,100,...]
+           [--only parse,metrics,...] [--latency SECONDS]
+           [--save | --compare] [--baseline FILE] [--tolerance 0.5]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+from synthetic import make_plan
+from bench_validation import make_answers
+import run
+import sheet_sync
+from sheet_backends import MemoryBackend
+from session_io import ScriptedInput
+from table_render import render_pages
+from tabulate import tabulate
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'baselines.json')
+SIZES = [10, 100, 1000, 10_000, 100_000]
+GROUPS = ['parse', 'metrics', 'rows', 'render', 'sheet']
+REPEAT = 5  # samples of every benchmark, the best one is kept
+SAMPLE_TIME = 0.01  # seconds, short benchmarks run several times a sample
+TABULATE_LIMIT = 10_000  # tabulate on more exercises takes too long
+
+
+def best_time(function):
+    """
+    Return the shortest time function takes, out of REPEAT samples.
+    Functions faster than SAMPLE_TIME are run several times per sample
+    (like timeit's autorange), so timer resolution and noise don't
+    turn into false regressions.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= SAMPLE_TIME:
+            break
+        number *= 10
+    samples = [elapsed]
+    for _ in range(REPEAT - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        samples.append(time.perf_counter() - start)
+    return min(samples) / number
+
+
+def consume_pages(headers, rows, units):
+    for _, _, lines in render_pages(headers, rows, [0, 1], units):
+        for _ in lines:
+            pass
+
+
+def bench_parse(size, plan):
+    """
+    Check size answers of the prompts, 10% of them invalid.
+    """
+    answers = make_answers(size, 0.1)
+    cadences = [answer for answer, requirements_list in make_answers(
+        size, 0.1) if 'cadence' in requirements_list and answer] or ['2 0 3']
+    cadences = (cadences * (size // len(cadences) + 1))[:size]
+
+    def check_answers():
+        for answer, requirements_list in answers:
+            run.check_input(answer, requirements_list)
+
+    def parse_cadences():
+        for answer in cadences:
+            run.get_cadence_values(answer)
+
+    yield 'check_input', best_time(check_answers), {}
+    yield 'get_cadence_values', best_time(parse_cadences), {}
+
+
+def bench_metrics(size, plan):
+    groups = list(plan.values())
+
+    def calc_metrics():
+        for group in groups:
+            group.calc_metrics()
+
+    def update_and_calc_metrics():
+        for group in groups:
+            group.update_metrics()
+            group.calc_metrics()
+
+    yield 'calc_metrics', best_time(calc_metrics), {}
+    yield 'update_metrics', best_time(update_and_calc_metrics), {}
+
+
+def bench_rows(size, plan):
+    def build_tables():  # a fresh plan each time, so no cached schema
+        run.build_training_table(run.TrainingPlan(plan))
+
+    yield 'build_training_table', best_time(build_tables), {}
+    yield 'build_metrics_table', best_time(
+        lambda: run.build_metrics_table(plan)), {}
+
+
+def bench_render(size, plan):
+    sheet_rows = run.build_training_table(plan)
+    headers, rows = sheet_rows[0], sheet_rows[1:]
+    set_columns = [i for i, header in enumerate(headers)
+                   if header.startswith('Set') and header != 'Sets']
+    other_units = [[i] for i in range(2, len(headers))
+                   if i not in set_columns]
+    set_units = [set_columns[i:i+2] for i in range(0, len(set_columns), 2)]
+    _, table_headers, table_rows, _ = run.build_metrics_table(plan)
+
+    yield 'training_pages', best_time(
+        lambda: consume_pages(headers, rows, other_units)), {}
+    yield 'set_pages', best_time(
+        lambda: consume_pages(headers, rows, set_units)), {}
+    yield 'metrics_tabulate', best_time(
+        lambda: tabulate(table_rows, headers=table_headers,
+                         tablefmt='fancy_grid', stralign='center',
+                         numalign='center')), {}
+    if size <= TABULATE_LIMIT:
+        yield 'training_tabulate', best_time(
+            lambda: tabulate(rows, headers=headers, tablefmt='fancy_grid',
+                             stralign='center', numalign='center')), {}
+
+
+def bench_sheet(size, plan, latency):
+    """
+    Time print_training_plan() and print_calculated_values() with their
+    output thrown away, until the sheet sync has saved their tables.
+    """
+    backend = MemoryBackend(latency)
+    previous_backend = sheet_sync.get_backend()
+    sheet_sync.set_backend(backend)
+    try:
+        for name, show_table in (
+                ('print_training_plan', lambda session: run.run_until_done(
+                    run.print_training_plan(session))),
+                ('print_calculated_values', run.print_calculated_values)):
+            def show_and_sync():
+                session = run.Session(ScriptedInput(['no'], echo=False))
+                session.training_plan = run.TrainingPlan(plan)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    show_table(session)
+                sheet_sync.sync_worker.flush()
+
+            backend.reset_stats()
+            start = time.perf_counter()
+            show_and_sync()
+            seconds = time.perf_counter() - start
+            yield name, seconds, {
+                'sheet_calls': sum(backend.calls.values()),
+                'sheet_seconds': round(sum(backend.call_times.values()), 6),
+            }
+    finally:
+        sheet_sync.set_backend(previous_backend)
+
+
+def run_suite(sizes, groups, latency):
+    """
+    Return {benchmark name: result} for every benchmark of groups at
+    every size, printing each result as it comes.
+    """
+    results = {}
+    for size in sizes:
+        plan = make_plan(size)
+        for group in groups:
+            if group == 'sheet':
+                benchmarks = bench_sheet(size, plan, latency)
+            else:
+                benchmarks = globals()[f'bench_{group}'](size, plan)
+            for name, seconds, extra in benchmarks:
+                key = f'{group}.{name}[{size}]'
+                results[key] = dict(seconds=round(seconds, 9), **extra)
+                details = ''.join(f', {k}={v}' for k, v in extra.items())
+                print(f'{key:44} {seconds * 1000:11.3f} ms{details}')
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print how results compare with baseline and return the names of the
+    benchmarks that got slower by more than tolerance (e.g. 0.5 for
+    50%), or made more sheet calls.
+    """
+    regressions = []
+    print(f'\nCompared with the baseline of {baseline["saved"]} '
+          f'({baseline["machine"]}):')
+    for key, result in results.items():
+        old = baseline['results'].get(key)
+        if old is None:
+            print(f'{key:44} new')
+            continue
+        ratio = result['seconds'] / old['seconds'] if old['seconds'] else 1
+        status = ''
+        if ratio > 1 + tolerance:
+            status = 'REGRESSION'
+        elif ratio < 1 / (1 + tolerance):
+            status = 'faster'
+        if result.get('sheet_calls', 0) > old.get('sheet_calls', 0):
+            status = 'REGRESSION (more sheet calls)'
+        if status.startswith('REGRESSION'):
+            regressions.append(key)
+        print(f'{key:44} {ratio:6.2f}x {status}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the hot paths of run.py.'
+    )
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)),
+                        help='plan sizes in exercises, comma separated')
+    parser.add_argument('--only', default=','.join(GROUPS),
+                        help=f'benchmark groups to run, of {GROUPS}')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds per call of the in-memory sheet')
+    parser.add_argument('--baseline', default=BASELINE_FILE, metavar='FILE')
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--save', action='store_true',
+                        help='save the results as the baseline')
+    action.add_argument('--compare', action='store_true',
+                        help='compare the results with the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='slowdown reported as a regression')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    groups = args.only.split(',')
+    for group in groups:
+        if group not in GROUPS:
+            parser.error(f'unknown benchmark group {group!r}')
+
+    results = run_suite(sizes, groups, args.latency)
+    if args.save:
+        # keep the results of benchmarks that were not run this time
+        baseline = {'results': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as file:
+                baseline = json.load(file)
+        baseline['results'].update(results)
+        baseline['saved'] = time.strftime('%Y-%m-%d %H:%M')
+        baseline['machine'] = (f'{platform.machine()}, python '
+                               f'{platform.python_version()}')
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(baseline, file, indent=1, sort_keys=True)
+        print(f'\nBaseline saved to {args.baseline}')
+    elif args.compare:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f'\n{len(regressions)} regressions')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Measure check_input() with the compiled requirement validators against
+the previous if/elif chain, over the answers of synthetic sessions
+(valid and invalid ones), and check both give the same results.
+
+Usage: python benchmarks/bench_validation.py [ROUNDS]
+"""
+import random
+import sys
+import time
+
+import synthetic  # noqa: F401, makes the app's modules importable
+from run import check_input, compile_requirements, color_error_message
+
+
+def legacy_cadence_values(user_input):
+    """
+    get_cadence_values() as it was before the compiled validators.
+    """
+    error_message = ''
+    nums = []
+    for element in user_input.split():
+        for el in element.split(','):
+            if el:
+                try:
+                    el = int(el)
+                except ValueError:
+                    try:
+                        el = float(el)
+                    except ValueError:
+                        error_message = color_error_message(
+                            '\nPlease enter numbers only'
+                        )
+                        return user_input, error_message
+                nums.append(el)
+    if len(nums) != 3:
+        error_message = color_error_message('\nPlease enter three numbers')
+    else:
+        user_input = nums
+    return user_input, error_message
+
+
+def legacy_check_input(user_input, requirements_list):
+    """
+    check_input() as it was before the compiled validators: one walk
+    over the requirement strings per call, and error messages colored
+    as soon as a check fails.
+    """
+    error_message = ''
+    for req in requirements_list:
+        if req == 'can skip':
+            if user_input == '':
+                break
+        elif req == 'name':
+            try:
+                if len(user_input) < 4:
+                    raise ValueError
+            except ValueError:
+                error_message = '\nName must be at least 4 characters long!'
+                error_message = color_error_message(error_message)
+        elif req == 'positive integer':
+            try:
+                user_input = int(user_input)
+                if user_input <= 0:
+                    raise ValueError
+            except ValueError:
+                error_message = '\nPlease enter a positive natural number.'
+                error_message = color_error_message(error_message)
+                break
+        elif req == 'positive float':
+            try:
+                user_input = float(user_input)
+                if user_input < 0:
+                    raise ValueError
+            except ValueError:
+                error_message = '\nPlease enter a positive real number'
+                error_message = color_error_message(error_message)
+                break
+        elif (
+            isinstance(req, tuple) and
+            (user_input < req[0] or user_input > req[1])
+        ):
+            error_message = f'\nPlease enter a value between\
+            {req[0]} and {req[1]}.'
+            error_message = color_error_message(error_message)
+            break
+        elif req == 'yes or no':
+            try:
+                user_input = user_input.lower()
+                if len(user_input) > 3:
+                    raise ValueError
+                elif user_input.find('yes') > -1:
+                    user_input = 'yes'
+                elif user_input.find('no') > -1:
+                    user_input = 'no'
+                else:
+                    raise ValueError
+            except ValueError:
+                error_message = "\nPlease enter a 'yes' or 'no' answer."
+                error_message = color_error_message(error_message)
+                break
+        elif req == 'cadence':
+            user_input, error_message = legacy_cadence_values(user_input)
+            if error_message:
+                break
+    return user_input, error_message
+
+
+"""
+The requirement lists of the prompts, with some valid and invalid
+answers for each.
+"""
+CASES = [
+    (['name'], ['Biceps', 'Bench press', 'abc', '']),
+    (['positive integer', 'minimum 1'], ['3', '12', '0', 'x', '-2']),
+    (['positive float'], ['12.5', '40', '0', 'heavy', '-5']),
+    (['can skip', 'cadence'], ['', '2 0 3', '1, 1, 2', '1 2', '2 x 3']),
+    (['can skip', 'positive integer'], ['', '60', '90', 'x']),
+    (['positive integer', (1, 4)], ['1', '4', '5', 'x']),
+    (['yes or no'], ['yes', 'no', 'YES', 'maybe', 'y']),
+]
+
+
+def make_answers(count, invalid_share):
+    """
+    Return count (answer, requirements_list) pairs, about invalid_share
+    of them failing their checks.
+    """
+    rng = random.Random(0)
+    answers = []
+    for _ in range(count):
+        requirements_list, inputs = rng.choice(CASES)
+        valid = [answer for answer in inputs
+                 if not legacy_check_input(answer, requirements_list)[1]]
+        invalid = [answer for answer in inputs if answer not in valid]
+        pool = invalid if rng.random() < invalid_share else valid
+        answers.append((rng.choice(pool), requirements_list))
+    return answers
+
+
+def timed(check, answers, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for answer, requirements_list in answers:
+            check(answer, requirements_list)
+    return time.perf_counter() - start
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for requirements_list, inputs in CASES:
+        for answer in inputs:
+            old = legacy_check_input(answer, requirements_list)
+            new = check_input(answer, requirements_list)
+            # error texts differ in wording for 'minimum 1' and ranges
+            if bool(old[1]) != bool(new[1]) or (
+                    not old[1] and old[0] != new[0]):
+                sys.exit(f'different results for {answer!r} '
+                         f'{requirements_list}: {old} / {new}')
+
+    for invalid_share in (0.0, 0.1, 0.5):
+        answers = make_answers(10_000, invalid_share)
+        calls = len(answers) * rounds
+        legacy_time = timed(legacy_check_input, answers, rounds)
+        compiled_time = timed(check_input, answers, rounds)
+        # callers holding the compiled check, like plan_import.py
+        checks = [(answer, compile_requirements(requirements_list))
+                  for answer, requirements_list in answers]
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for answer, check in checks:
+                check(answer)
+        precompiled_time = time.perf_counter() - start
+        print(f'{calls} checks, {invalid_share:.0%} invalid:')
+        for label, seconds in (('if/elif chain', legacy_time),
+                               ('check_input()', compiled_time),
+                               ('precompiled', precompiled_time)):
+            print(f'  {label:14} {seconds:.3f} s '
+                  f'({calls / seconds / 1e6:.2f} M checks/s, '
+                  f'{legacy_time / seconds:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Generate synthetic training plans for the benchmarks.
+"""
+import os
+import random
+import sys
+
+# make the app's modules importable when running a benchmark directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from run import MuscleGroup, Exercise  # noqa: E402
+
+
+GROUP_NAMES = ['Biceps', 'Triceps', 'Chest', 'Back', 'Shoulders', 'Legs',
+               'Glutes', 'Calves', 'Abs', 'Forearms']
+
+
+def make_plan(exercise_count, seed=0, max_sets=6, group_names=GROUP_NAMES):
+    """
+    Return a training plan dictionary with exercise_count exercises
+    spread over the muscle groups in group_names. About half of the
+    exercises have a cadence and half a rest time, like plans where
+    the user skipped some values.
+    """
+    rng = random.Random(seed)
+    training_plan = {}
+    for i in range(exercise_count):
+        group_name = group_names[i % len(group_names)]
+        group = training_plan.get(group_name)
+        if group is None:
+            group = MuscleGroup()
+            group.name = group_name
+            training_plan[group_name] = group
+        exercise = Exercise()
+        exercise.name = f'Exercise {i}'
+        exercise.sets = rng.randint(1, max_sets)
+        for _ in range(exercise.sets):
+            exercise.add_set(rng.randint(1, 15),
+                             rng.choice([0.0, 2.5, 10.0, 12.5, 22.75, 40.0,
+                                         100.0]))
+        if rng.random() < 0.5:
+            exercise.cadence = (rng.randint(0, 4), rng.choice([0, 1, 0.5]),
+                                rng.randint(1, 4))
+        if rng.random() < 0.5:
+            exercise.rest = rng.randint(30, 180)
+        group.add_exercise(exercise)
+    return training_plan
+
+
+def make_plans(plan_count, exercises_per_plan, seed=0):
+    """
+    Return a list of plan_count synthetic plans.
+    """
+    return [make_plan(exercises_per_plan, seed=seed + i)
+            for i in range(plan_count)]
+
+
+def make_session_script(exercise_count, seed=0, invalid_every=0):
+    """
+    Return the answers (one per line, see session_io.ScriptedInput) of a
+    session that creates a plan of exercise_count exercises through
+    option 1 and then shows the training table and the metrics.
+    If invalid_every is set, every so many answers an invalid answer is
+    given first, to go through the validation error path too.
+    """
+    rng = random.Random(seed)
+    lines = ['1']  # create a training plan
+    groups = []  # names of the groups created so far, in menu order
+    answer_count = 0
+    # names must be at least 4 characters long to pass the prompts
+    group_names = [name for name in GROUP_NAMES if len(name) >= 4]
+
+    def answer(text, invalid='x'):
+        nonlocal answer_count
+        answer_count += 1
+        if invalid_every and answer_count % invalid_every == 0:
+            lines.append(invalid)
+        lines.append(str(text))
+
+    for i in range(exercise_count):
+        group_name = group_names[i % len(group_names)]
+        if groups:  # choose 'new muscle group' or an existing one
+            if group_name in groups:
+                answer(groups.index(group_name) + 2, invalid='0')
+            else:
+                answer(1, invalid='0')
+        if group_name not in groups:
+            answer(group_name, invalid='ab')
+            groups.append(group_name)
+        answer(f'Exercise {i}', invalid='ab')
+        sets = rng.randint(1, 6)
+        answer(sets)
+        for _ in range(sets):
+            answer(rng.randint(1, 15))
+            answer(rng.choice([2.5, 10, 12.5, 40]))
+        answer(rng.choice(['', '2 0 3', '1, 1, 2']), invalid='1 2')
+        answer(rng.choice(['', 60, 90]))
+        answer('yes' if i < exercise_count - 1 else 'no', invalid='maybe')
+    lines.append('')  # press enter to return to the main menu
+    lines += ['2', 'no', '', '3', '']  # show the table and the metrics
+    return lines
@@ -0,0 +1,185 @@
+"""
+Bulk export of many clients' plans to google sheet, e.g. for a nightly
+job, instead of showing each plan with options 2 and 3 of the menu.
+
+The last plan saved for each client in the plan store (or the plan with
+a given id) is written to the client's 'Training Table' and 'Training
+Metrics' worksheets. Plans are spread over a bounded pool of worker
+threads. The workers share the app's storage backend (see sheet_sync.py),
+so google is authorised once and all calls go through the same HTTP
+session and the same rate limits: the quota is a budget for the whole
+export, however many workers there are (see sheet_retry.py). Plans are
+loaded from the store as workers become free, so only a few of them are
+in memory at a time.
+
+The backend can be chosen like in the app (MUSCLE_GAINS_BACKEND) or with
+--backend, e.g. --backend memory:0.05 for an in-memory sheet answering
+every call in 50 ms, to measure how the export scales offline.
+
+Usage: python bulk_export.py [--clients NAME,...] [--plan ID]
+                             [--workers N] [--quota N] [--backend SPEC]
+                             [--store FILE]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from run import build_training_table, build_metrics_table
+from sheet_backends import GspreadBackend, make_backend
+from sheet_retry import ScheduledBackend
+from sheet_sync import (BACKEND_VARIABLE, write_worksheet, worksheet_title,
+                        set_backend)
+from instrumentation import instruments
+
+
+WORKERS = 8
+QUEUED_PER_WORKER = 2  # plans loaded ahead of the workers
+
+
+class ExportReport():
+    """
+    This class counts the plans exported, the plans that failed and the
+    API calls made, to report the throughput of an export.
+    """
+    def __init__(self):
+        self.plans = 0
+        self.failed = 0
+        self.api_calls = 0
+        self.seconds = 0.0
+
+    def plans_per_second(self):
+        return self.plans / self.seconds if self.seconds else 0.0
+
+    def api_calls_per_second(self):
+        return self.api_calls / self.seconds if self.seconds else 0.0
+
+    def message(self):
+        message = (f'{self.plans} plans exported in {self.seconds:.2f} s: '
+                   f'{self.plans_per_second():.1f} plans/s, '
+                   f'{self.api_calls} API calls '
+                   f'({self.api_calls_per_second():.1f}/s)')
+        if self.failed:
+            message += f', {self.failed} failed'
+        return message
+
+
+def export_plan(client, training_plan):
+    """
+    Write the training table and the metrics of training_plan to the
+    worksheets of client. Return the number of API calls made.
+    """
+    with instruments.timer('export.plan', client=client) as fields:
+        api_calls = write_worksheet(
+            worksheet_title('Training Table', client),
+            build_training_table(training_plan))
+        api_calls += write_worksheet(
+            worksheet_title('Training Metrics', client),
+            build_metrics_table(training_plan)[0])
+        fields['api_calls'] = api_calls
+    return api_calls
+
+
+def export_plans(plans, workers=WORKERS, report_error=print):
+    """
+    Export plans, an iterable of (client, training_plan), with up to
+    workers plans being written at a time. Plans that can't be written
+    are passed to report_error and counted as failed.
+    Returns an ExportReport.
+    """
+    report = ExportReport()
+
+    def collect(future, client):
+        try:
+            report.api_calls += future.result()
+        except Exception as error:
+            report.failed += 1
+            report_error(f'Exporting the plan of {client} failed: {error}')
+        else:
+            report.plans += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers,
+                            thread_name_prefix='export') as executor:
+        running = {}  # future -> client
+        for client, training_plan in plans:
+            if len(running) >= workers * QUEUED_PER_WORKER:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future, running.pop(future))
+            future = executor.submit(export_plan, client, training_plan)
+            running[future] = client
+        for future in wait(running).done:
+            collect(future, running[future])
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def stored_plans(store, clients=None, plan_id=None, report_error=print):
+    """
+    Yield (client, training_plan) for each of clients (all clients of
+    the store by default): the plan saved as plan_id, or the client's
+    last saved plan.
+    """
+    for client in clients or store.clients():
+        plan_ids = store.plans(client)
+        if plan_id is None and plan_ids:
+            yield client, store.load_plan(client, plan_ids[-1])
+        elif plan_id in plan_ids:
+            yield client, store.load_plan(client, plan_id)
+        else:
+            report_error(f'{client} has no plan '
+                         f'{plan_id if plan_id else "saved"}, skipped')
+
+
+def main():
+    """
+    Export the plans chosen on the command line and print the
+    throughput.
+    """
+    parser = argparse.ArgumentParser(
+        description="Export many clients' plans to google sheet."
+    )
+    parser.add_argument('--clients', help='comma separated client names '
+                                          '(all clients by default)')
+    parser.add_argument('--plan', metavar='ID',
+                        help="plan to export (each client's last saved "
+                             "plan by default)")
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='plans written at the same time')
+    parser.add_argument('--quota', type=int, metavar='N',
+                        help='API calls per minute for each kind of call '
+                             "(the backend's quota by default)")
+    parser.add_argument('--backend', metavar='SPEC',
+                        help='e.g. memory:0.05 or local:FOLDER (see '
+                             'sheet_backends.make_backend())')
+    parser.add_argument('--store', metavar='FILE',
+                        help='plan store file (plans.db by default)')
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    from plan_store import PlanStore, STORE_FILE
+
+    instruments.configure_from_environment()
+    backend = make_backend(args.backend or os.environ.get(BACKEND_VARIABLE))
+    if isinstance(backend, GspreadBackend):
+        # a connection per worker, all in the same authorised session
+        backend.pool_size = max(backend.pool_size, args.workers)
+    set_backend(ScheduledBackend(backend, per_minute=args.quota))
+
+    clients = args.clients.split(',') if args.clients else None
+    store = PlanStore(args.store or STORE_FILE)
+    try:
+        report = export_plans(stored_plans(store, clients, args.plan),
+                              args.workers)
+    finally:
+        store.close()
+        instruments.close_log()
+    print(report.message())
+    return 1 if report.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
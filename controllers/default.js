@@ -1,6 +1,9 @@
 const Pty = require('node-pty');
 const fs = require('fs');
 
+// milliseconds run.py gets to save pending changes when a tab is closed
+const KILL_TIMEOUT = 30000;
+
 exports.install = function () {
 
     ROUTE('/');
@@ -15,8 +18,13 @@ function socket() {
 
     this.on('open', function (client) {
 
-        // Spawn terminal
-        client.tty = Pty.spawn('python3', ['run.py'], {
+        // Spawn terminal, keeping the plan of the browser tab's session
+        var args = ['run.py'];
+        var session = client.query && client.query.session;
+        if (session && /^[\w-]{1,64}$/.test(session)) {
+            args.push('--session', session);
+        }
+        client.tty = Pty.spawn('python3', args, {
             name: 'xterm-color',
             cols: 80,
             rows: 24,
@@ -38,9 +46,18 @@ function socket() {
 
     this.on('close', function (client) {
         if (client.tty) {
-            client.tty.kill(9);
+            // SIGTERM lets run.py write the uploads still queued to google
+            // sheet before it exits; kill it if that takes too long
+            var tty = client.tty;
+            var timer = setTimeout(function () {
+                tty.kill('SIGKILL');
+            }, KILL_TIMEOUT);
+            tty.on('exit', function () {
+                clearTimeout(timer);
+            });
+            tty.kill('SIGTERM');
             client.tty = null;
-            console.log("Process killed and terminal unloaded");
+            console.log("Process stopped and terminal unloaded");
         }
     });
 
@@ -0,0 +1,348 @@
+"""
+History of the sets clients performed, to follow how the volume, time
+under tension and duration of their training change over the weeks.
+
+Every logged session (what a client did on a given day, as a training
+plan) is appended to a folder of column files: one file per field of a
+set (reps, weight, cadence, ...) holding fixed-width numbers, read back
+as memory-mapped numpy arrays, so a query over one client's sets only
+touches the columns it needs. Names of clients, muscle groups and
+exercises are stored once in a names file and referred to by number.
+
+Each session also appends one summary per muscle group, with the
+metrics MuscleGroup.calc_metrics() gives for the sets of that session.
+The summaries are added up per week when the history is opened, and
+kept up to date as sessions are logged, so a trend over years of
+history costs one step per week instead of going through every set.
+
+Files are only appended to. A header file, replaced atomically after
+every session, says how much of each file belongs to complete
+sessions; anything after that (a session cut short by a crash) is cut
+off when the history is opened.
+
+Usage: python history_store.py log --client NAME (--plan ID | --file FILE)
+                                   [--date YYYY-MM-DD]
+       python history_store.py trend --client NAME [--group NAME]
+                                     [--weeks 12] [--window 4]
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import date
+
+import numpy as np
+from tabulate import tabulate
+
+from run import TrainingPlan
+
+
+HISTORY_FOLDER = 'history'
+HEADER_FILE = 'header.json'
+NAMES_FILE = 'names.jsonl'
+
+"""
+The fixed-width columns of the set records and of the session
+summaries. A missing cadence is stored as NaN, a missing rest as -1.
+"""
+SET_COLUMNS = {
+    'session': 'i4',  # number of the session the set belongs to
+    'day': 'i4',  # date.toordinal() of the session
+    'client': 'i4',  # numbers of names in the names file
+    'group': 'i4',
+    'exercise': 'i4',
+    'reps': 'i4',
+    'weight': 'f8',
+    'contraction': 'f8',
+    'pause': 'f8',
+    'extension': 'f8',
+    'rest': 'i4',
+}
+SESSION_COLUMNS = {
+    'session': 'i4',
+    'week': 'i4',  # see week_of()
+    'client': 'i4',
+    'group': 'i4',
+    'volume': 'f8',  # calc_metrics() of the group in the session
+    'tut': 'f8',
+    'duration': 'f8',
+}
+NO_REST = -1
+# weekly totals: volume, tut, duration, sessions and the last session
+EMPTY_WEEK = (0, 0, 0, 0, -1)
+
+
+def week_of(day):
+    """
+    Return the number of the week (Monday to Sunday) of the date day.
+    """
+    return (day.toordinal() - 1) // 7  # 0001-01-01 was a Monday
+
+
+def week_start(week):
+    """
+    Return the date of the Monday of week number week.
+    """
+    return date.fromordinal(week * 7 + 1)
+
+
+class HistoryStore():
+    """
+    This class appends performed sets to the column files of a folder
+    and keeps the weekly totals of each client, in total and per muscle
+    group: [volume, time under tension, duration, sessions].
+    """
+    def __init__(self, folder=HISTORY_FOLDER):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.header = {'sessions': 0, 'sets': 0, 'summaries': 0,
+                       'names': 0}
+        header_path = os.path.join(folder, HEADER_FILE)
+        if os.path.exists(header_path):
+            with open(header_path, encoding='utf-8') as file:
+                self.header.update(json.load(file))
+        self._columns = {}  # memory-mapped columns, until the next append
+        self._cut_incomplete()
+
+        self.names = []
+        with open(self._path(NAMES_FILE), 'a+', encoding='utf-8') as file:
+            file.seek(0)
+            for line in file:
+                self.names.append(json.loads(line))
+        self.name_ids = {name: i for i, name in enumerate(self.names)}
+
+        # (client, group or None) -> {week: [volume, tut, duration,
+        # sessions]}, group None holding the client's totals
+        self.weeks = {}
+        for summary in zip(*(self.column(name, summaries=True).tolist()
+                             for name in SESSION_COLUMNS)):
+            self._add_summary(*summary)
+
+    def _path(self, file_name):
+        return os.path.join(self.folder, file_name)
+
+    def _cut_incomplete(self):
+        # drop what was appended after the last complete session
+        for columns, length in ((SET_COLUMNS, self.header['sets']),
+                                (SESSION_COLUMNS, self.header['summaries'])):
+            for name, dtype in columns.items():
+                path = self._column_path(columns, name)
+                size = length * np.dtype(dtype).itemsize
+                if not os.path.exists(path):
+                    open(path, 'wb').close()
+                if os.path.getsize(path) > size:
+                    os.truncate(path, size)
+        names_path = self._path(NAMES_FILE)
+        if os.path.exists(names_path):
+            with open(names_path, encoding='utf-8') as file:
+                lines = file.readlines()[:self.header['names']]
+            if sum(map(len, lines)) != os.path.getsize(names_path):
+                with open(names_path, 'w', encoding='utf-8') as file:
+                    file.writelines(lines)
+
+    def _column_path(self, columns, name):
+        prefix = 'set' if columns is SET_COLUMNS else 'session'
+        return self._path(f'{prefix}.{name}.bin')
+
+    def column(self, name, summaries=False):
+        """
+        Return the column name of the set records (or of the session
+        summaries), as a read-only memory-mapped numpy array.
+        """
+        if summaries:
+            columns, length = SESSION_COLUMNS, self.header['summaries']
+        else:
+            columns, length = SET_COLUMNS, self.header['sets']
+        key = (summaries, name)
+        if key not in self._columns:
+            if length:
+                self._columns[key] = np.memmap(
+                    self._column_path(columns, name), columns[name], 'r',
+                    shape=(length,))
+            else:
+                self._columns[key] = np.empty(0, columns[name])
+        return self._columns[key]
+
+    def name_id(self, name, new_names):
+        """
+        Return the number of name, giving it the next number (and adding
+        it to new_names) if it's new.
+        """
+        if name not in self.name_ids:
+            self.name_ids[name] = len(self.names)
+            self.names.append(name)
+            new_names.append(name)
+        return self.name_ids[name]
+
+    def log_session(self, client, day, training_plan):
+        """
+        Append the sets of every exercise of training_plan, performed by
+        client on the date day, and add the metrics of each muscle group
+        to the weekly totals. Returns the number of the session.
+        """
+        session = self.header['sessions']
+        week = week_of(day)
+        new_names = []
+        client_id = self.name_id(client, new_names)
+        sets = {name: [] for name in SET_COLUMNS}
+        summaries = {name: [] for name in SESSION_COLUMNS}
+        for group in training_plan.values():
+            group_id = self.name_id(group.name, new_names)
+            for exercise in group.exercises.values():
+                exercise_id = self.name_id(exercise.name, new_names)
+                cadence = exercise.cadence or (np.nan, np.nan, np.nan)
+                rest = NO_REST if exercise.rest is None else exercise.rest
+                for reps, weight in zip(exercise.reps, exercise.weights):
+                    for name, value in (
+                            ('session', session), ('day', day.toordinal()),
+                            ('client', client_id), ('group', group_id),
+                            ('exercise', exercise_id), ('reps', reps),
+                            ('weight', weight), ('contraction', cadence[0]),
+                            ('pause', cadence[1]),
+                            ('extension', cadence[2]), ('rest', rest)):
+                        sets[name].append(value)
+            # the same metrics as in the metrics table of the plan
+            volume, tut, duration = group.calc_metrics()
+            for name, value in (('session', session), ('week', week),
+                                ('client', client_id),
+                                ('group', group_id), ('volume', volume),
+                                ('tut', tut), ('duration', duration)):
+                summaries[name].append(value)
+
+        # names first, the header last: it makes the session complete
+        if new_names:
+            with open(self._path(NAMES_FILE), 'a', encoding='utf-8') as file:
+                file.writelines(json.dumps(name) + '\n'
+                                for name in new_names)
+        for columns, values in ((SET_COLUMNS, sets),
+                                (SESSION_COLUMNS, summaries)):
+            for name, dtype in columns.items():
+                with open(self._column_path(columns, name), 'ab') as file:
+                    file.write(np.array(values[name], dtype).tobytes())
+        self.header['sessions'] += 1
+        self.header['sets'] += len(sets['session'])
+        self.header['summaries'] += len(summaries['session'])
+        self.header['names'] = len(self.names)
+        temp_path = self._path(f'{HEADER_FILE}.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.header, file)
+        os.replace(temp_path, self._path(HEADER_FILE))
+        self._columns.clear()  # the arrays got longer, map them again
+
+        for summary in zip(*(summaries[name] for name in SESSION_COLUMNS)):
+            self._add_summary(*summary)
+        return session
+
+    def _add_summary(self, session, week, client, group, volume, tut,
+                     duration):
+        for key in ((client, group), (client, None)):
+            weeks = self.weeks.setdefault(key, {})
+            totals = weeks.get(week)
+            if totals is None:
+                totals = weeks[week] = list(EMPTY_WEEK)
+            totals[0] += volume
+            totals[1] += tut
+            totals[2] += duration
+            if totals[4] != session:  # a session counts once per week
+                totals[3] += 1
+                totals[4] = session
+
+    def trend(self, client, group_name=None, weeks=12, window=4,
+              until=None):
+        """
+        Return a row for each of the weeks last weeks up to the date
+        until (today by default): (Monday of the week, volume, time
+        under tension, duration, sessions, volume over the last window
+        weeks), for client's group_name or all of their groups.
+        Costs one step per week, whatever the number of sets logged.
+        """
+        client_id = self.name_ids.get(client)
+        group_id = None if group_name is None \
+            else self.name_ids.get(group_name, -1)
+        totals = self.weeks.get((client_id, group_id), {})
+        last_week = week_of(until or date.today())
+        first_week = last_week - weeks + 1
+        rows = []
+        # volume of the window - 1 weeks before, then slide the window
+        rolling_volume = sum(totals.get(week, EMPTY_WEEK)[0] for week in
+                             range(first_week - window + 1, first_week))
+        for week in range(first_week, last_week + 1):
+            volume, tut, duration, sessions, _ = totals.get(week,
+                                                            EMPTY_WEEK)
+            rolling_volume += volume
+            rows.append((week_start(week), volume, tut, duration, sessions,
+                         rolling_volume))
+            rolling_volume -= totals.get(week - window + 1, EMPTY_WEEK)[0]
+        return rows
+
+    def sets(self, client, exercise_name=None):
+        """
+        Return the day, reps and weight columns of the sets client
+        performed (of exercise_name only, if given), as numpy arrays.
+        """
+        mask = self.column('client') == self.name_ids.get(client, -1)
+        if exercise_name is not None:
+            mask &= (self.column('exercise')
+                     == self.name_ids.get(exercise_name, -1))
+        return {name: np.asarray(self.column(name)[mask])
+                for name in ('day', 'reps', 'weight')}
+
+
+def main():
+    """
+    Log a session of a client, from a plan of the plan store or a file
+    (see plan_import.py), or print the client's weekly trend.
+    """
+    parser = argparse.ArgumentParser(
+        description="Log clients' sessions and show their weekly trends."
+    )
+    parser.add_argument('--folder', default=HISTORY_FOLDER)
+    commands = parser.add_subparsers(dest='command', required=True)
+    log = commands.add_parser('log', help='log a performed session')
+    log.add_argument('--client', required=True)
+    source = log.add_mutually_exclusive_group(required=True)
+    source.add_argument('--plan', metavar='ID',
+                        help='the plan of the plan store performed')
+    source.add_argument('--file', help='CSV or JSON Lines file of the '
+                                       'sets performed')
+    log.add_argument('--date', type=date.fromisoformat, default=date.today())
+    trend = commands.add_parser('trend', help='print the weekly trend')
+    trend.add_argument('--client', required=True)
+    trend.add_argument('--group', help='muscle group (all by default)')
+    trend.add_argument('--weeks', type=int, default=12)
+    trend.add_argument('--window', type=int, default=4,
+                       help='weeks of the rolling volume')
+    args = parser.parse_args()
+
+    store = HistoryStore(args.folder)
+    if args.command == 'log':
+        if args.plan:
+            from plan_store import PlanStore
+
+            plans = PlanStore()
+            training_plan = plans.load_plan(args.client, args.plan)
+            plans.close()
+            if training_plan is None:
+                print(f'{args.client} has no plan {args.plan}')
+                return 1
+        else:
+            from plan_import import import_plan
+
+            training_plan = TrainingPlan()
+            _, skipped = import_plan(args.file, training_plan)
+            if skipped:
+                return 1
+        session = store.log_session(args.client, args.date, training_plan)
+        print(f'Session {session} of {args.client} on {args.date} logged')
+        return 0
+
+    rows = store.trend(args.client, args.group, args.weeks, args.window)
+    print(tabulate(rows, headers=['Week', 'Volume', 'Time Under\nTension',
+                                  'Duration\n(s)', 'Sessions',
+                                  f'Volume\n({args.window} weeks)'],
+                   tablefmt='fancy_grid', numalign='center'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
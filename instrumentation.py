@@ -0,0 +1,211 @@
+"""
+Lightweight instrumentation of the app: timers for every operation
+(sheet calls, table building and rendering, menu actions), counters for
+the google API calls made and bytes sent, and events for failed
+uploads, retries and backoff waits.
+
+Everything is recorded in the instruments object. A summary of what
+happened during each menu action can be printed (run.py --stats, or the
+MUSCLE_GAINS_STATS environment variable) and every timed operation and
+event can be written to a JSON Lines log (run.py --log FILE, or
+MUSCLE_GAINS_LOG=FILE), to see quota use and latency in production.
+Uploads run on the sync worker's thread, so they show up in the summary
+of the action during which they finish.
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+
+STATS_VARIABLE = 'MUSCLE_GAINS_STATS'
+LOG_VARIABLE = 'MUSCLE_GAINS_LOG'
+
+
+class Instruments():
+    """
+    This class collects the timings, counters and events of the app.
+    It is safe to use from the sync worker thread and the menu at the
+    same time.
+    """
+    def __init__(self):
+        self.timers = {}  # operation -> [calls, total seconds, max seconds]
+        self.counters = Counter()  # e.g. api_calls, bytes_sent, retries
+        # events are only counted here, and written to the log if any
+        self.event_count = 0
+        self.show_summary = False  # print a summary after menu actions
+        self._log = None  # file the JSON Lines log is written to
+        self._lock = threading.Lock()
+
+    def timer(self, operation, **fields):
+        """
+        Return a context manager timing the code in its with block as
+        operation. It gives a dictionary, fields, which is written to the
+        log with the duration, so more details (e.g. api_calls) can be
+        added to it.
+        """
+        return Timer(self, operation, fields)
+
+    def add_time(self, operation, seconds, fields, error=None):
+        with self._lock:
+            timer = self.timers.get(operation)
+            if timer is None:
+                timer = self.timers[operation] = [0, 0.0, 0.0]
+            timer[0] += 1
+            timer[1] += seconds
+            if seconds > timer[2]:
+                timer[2] = seconds
+            if self._log is not None:
+                if error is not None:
+                    fields['error'] = repr(error)
+                self._write_log('timer', operation,
+                                seconds=round(seconds, 6), **fields)
+
+    def timed(self, operation):
+        """
+        Decorator timing every call of the decorated function.
+        """
+        def decorate(function):
+            @wraps(function)
+            def timed_function(*args, **kwargs):
+                with self.timer(operation):
+                    return function(*args, **kwargs)
+            return timed_function
+        return decorate
+
+    def count(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] += amount
+
+    def event(self, kind, **fields):
+        """
+        Record a notable event, e.g. a retry ('sheet.retry') and how
+        long it waits before it.
+        """
+        with self._lock:
+            self.counters[kind] += 1
+            self.event_count += 1
+            if self._log is not None:
+                self._write_log('event', kind, **fields)
+
+    def snapshot(self):
+        """
+        Return a copy of the timers, counters and number of events, to
+        get a summary of what happened after it with summary(since).
+        """
+        with self._lock:
+            return ({operation: list(timer)
+                     for operation, timer in self.timers.items()},
+                    Counter(self.counters), self.event_count)
+
+    def summary(self, since=None):
+        """
+        Return the counters and timers as text, only counting what
+        happened after the snapshot since if given.
+        """
+        timers, counters, event_count = self.snapshot()
+        if since is not None:
+            old_timers, old_counters, old_event_count = since
+            for operation, (calls, total, _) in old_timers.items():
+                timer = timers[operation]
+                timer[0] -= calls
+                timer[1] -= total
+            counters.subtract(old_counters)
+            event_count -= old_event_count
+        retries = sum(amount for counter, amount in counters.items()
+                      if counter.endswith('.retry'))
+
+        lines = [
+            f"API calls: {counters['api_calls']}, "
+            f"sent: {format_bytes(counters['bytes_sent'])}, "
+            f"retries: {retries}, events: {event_count}"
+        ]
+        for operation, (calls, total, longest) in sorted(timers.items()):
+            if calls:
+                lines.append(f'  {operation:28} {calls:5} x '
+                             f'{total / calls * 1000:9.1f} ms avg '
+                             f'{longest * 1000:9.1f} ms max')
+        return '\n'.join(lines)
+
+    def open_log(self, path):
+        """
+        Write every timed operation and event to the file at path from
+        now on, one JSON object per line.
+        """
+        self.close_log()
+        with self._lock:
+            self._log = open(path, 'a', encoding='utf-8')
+
+    def close_log(self):
+        """
+        Write the totals to the log and close it.
+        """
+        with self._lock:
+            if self._log is None:
+                return
+            self._write_log('totals', 'session',
+                            counters=dict(self.counters),
+                            timers={operation: {
+                                'calls': calls,
+                                'seconds': round(total, 6),
+                                'max_seconds': round(longest, 6),
+                            } for operation, (calls, total, longest)
+                                in self.timers.items()})
+            self._log.close()
+            self._log = None
+
+    def configure_from_environment(self):
+        """
+        Turn on the summary and the log if the MUSCLE_GAINS_STATS and
+        MUSCLE_GAINS_LOG environment variables are set.
+        """
+        if os.environ.get(STATS_VARIABLE, '') not in ('', '0'):
+            self.show_summary = True
+        if os.environ.get(LOG_VARIABLE):
+            self.open_log(os.environ[LOG_VARIABLE])
+
+    def _write_log(self, record_type, name, **fields):
+        # called with the lock held
+        record = {'time': round(time.time(), 6), 'type': record_type,
+                  'name': name, **fields}
+        self._log.write(json.dumps(record, default=str) + '\n')
+        self._log.flush()
+
+
+class Timer():
+    """
+    This class times a with block for Instruments.timer(). A plain
+    class rather than a generator, as it wraps calls made for every
+    menu action and every sheet call.
+    """
+    __slots__ = ('instruments', 'operation', 'fields', 'start')
+
+    def __init__(self, instruments, operation, fields):
+        self.instruments = instruments
+        self.operation = operation
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.fields
+
+    def __exit__(self, error_type, error, traceback):
+        self.instruments.add_time(self.operation,
+                                  time.perf_counter() - self.start,
+                                  self.fields, error)
+
+
+def format_bytes(amount):
+    if amount < 1000:
+        return f'{amount} B'
+    if amount < 1000000:
+        return f'{amount / 1000:.1f} kB'
+    return f'{amount / 1000000:.1f} MB'
+
+
+"""
+The instruments used by the app and its tools.
+"""
+instruments = Instruments()
@@ -0,0 +1,281 @@
+"""
+Batched computation of the muscle group metrics (volume, time under
+tension and duration) of many training plans at once, for reporting.
+
+The exercises of all plans are packed into flat numpy arrays, one entry
+per set and one per exercise, and the metrics of every group of every
+plan are computed in one pass with array operations. The results are
+exactly the ones MuscleGroup.calc_metrics() returns: sums are added in
+the same order, and ints stay ints where calc_metrics() gives ints.
+
+Packing plans that are already MuscleGroup/Exercise objects is a python
+pass over every exercise, which costs about as much as the metrics
+loop itself. Plans of the plan store are packed straight from its rows
+instead (PackedPlans.from_store(), calc_store_metrics()), without
+building any objects, which is 2-3 times faster than loading the
+plans and calling calc_metrics() (see benchmarks/bench_metrics.py).
+"""
+import json
+from array import array
+from itertools import repeat
+
+import numpy as np
+
+
+# the brackets of the reps_and_weights JSON text of the plan store, so
+# the text of many exercises parses as one list of numbers
+BRACKETS = str.maketrans('', '', '[]')
+
+
+class PackedPlans():
+    """
+    This class holds the exercises of a list of training plans as
+    columns. Groups are numbered in plan order; every set and every
+    exercise records the number of the group it belongs to.
+    """
+    def __init__(self, plans):
+        self.group_names = []  # (plan index, group name) of each group
+        reps = array('i')  # repetitions of every set
+        weights = array('d')  # weight of every set
+        set_counts = []  # number of sets of each exercise
+        exercise_group = []  # group number of each exercise
+        cadence = []  # contraction, pause, extension of every exercise
+        has_cadence = []
+        rest = []  # rest after each exercise, 0 if none
+        # whether calc_metrics() would return floats for a group
+        float_tut = []
+        float_pause = []
+
+        group_number = 0
+        for plan_index, training_plan in enumerate(plans):
+            for group in training_plan.values():
+                self.group_names.append((plan_index, group.name))
+                tut_is_float = pause_is_float = False
+                for exercise in group.exercises.values():
+                    # copying between arrays of the same type is a memcpy
+                    reps.extend(exercise.reps)
+                    weights.extend(exercise.weights)
+                    set_counts.append(len(exercise.reps))
+                    exercise_group.append(group_number)
+                    if exercise.cadence is not None:
+                        cadence.extend(exercise.cadence)
+                        has_cadence.append(True)
+                        tut_is_float |= isinstance(
+                            exercise.cadence[0] + exercise.cadence[2], float)
+                        pause_is_float = isinstance(exercise.cadence[1],
+                                                    float)
+                    else:
+                        cadence.extend((0, 0, 0))
+                        has_cadence.append(False)
+                    rest.append(exercise.rest or 0)
+                float_tut.append(tut_is_float)
+                float_pause.append(pause_is_float)
+                group_number += 1
+
+        self._pack(np.frombuffer(reps, dtype=np.intc).astype(np.float64),
+                   np.frombuffer(weights, dtype=np.float64), set_counts,
+                   exercise_group, cadence, has_cadence, rest, float_tut,
+                   float_pause)
+
+    @classmethod
+    def from_store(cls, store, client=None):
+        """
+        Return the plans saved in store (a plan_store.PlanStore), or
+        only client's, packed from the rows of the store. The plans are
+        numbered in the order they were saved, and its plan_keys holds
+        the (client, plan_id) of each. Plans without exercises are left
+        out.
+        """
+        packed = cls.__new__(cls)
+        plans, groups, texts, cadence_texts, rests = (
+            list(zip(*store.exercise_rows(client))) or [()] * 5)
+        exercise_count = len(texts)
+
+        # plans and groups are numbered in the order they first appear
+        plan_numbers = {plan: i
+                        for i, plan in enumerate(dict.fromkeys(plans))}
+        plan_keys = store.plan_keys(client)
+        packed.plan_keys = [plan_keys[plan] for plan in plan_numbers]
+        group_keys = list(zip(plans, groups))
+        group_numbers = {key: i
+                         for i, key in enumerate(dict.fromkeys(group_keys))}
+        packed.group_names = [(plan_numbers[plan], group_name)
+                              for plan, group_name in group_numbers]
+        group_count = len(group_numbers)
+        exercise_group = np.fromiter(map(group_numbers.__getitem__,
+                                         group_keys),
+                                     np.intp, exercise_count)
+        set_counts = np.fromiter(map(str.count, texts, repeat('[')),
+                                 np.intp, exercise_count) - 1
+
+        # plans have few different cadences: number them, 0 is none
+        cadence_numbers = {None: 0}
+        cadence_values = [(0, 0, 0)]
+        tut_is_float = [False]
+        pause_is_float = [False]
+        for text in dict.fromkeys(cadence_texts):
+            if text is not None:
+                values = json.loads(text)
+                cadence_numbers[text] = len(cadence_values)
+                cadence_values.append(values)
+                tut_is_float.append(isinstance(values[0] + values[2], float))
+                pause_is_float.append(isinstance(values[1], float))
+        exercise_cadence = np.fromiter(map(cadence_numbers.__getitem__,
+                                           cadence_texts),
+                                       np.intp, exercise_count)
+        has_cadence = exercise_cadence > 0
+        float_tut = np.bincount(
+            exercise_group,
+            weights=np.array(tut_is_float)[exercise_cadence],
+            minlength=group_count
+        ) > 0
+        # the pause of the last exercise with a cadence of each group
+        last_cadence = np.full(group_count, -1, dtype=np.intp)
+        cadence_index = np.flatnonzero(has_cadence)
+        np.maximum.at(last_cadence, exercise_group[cadence_index],
+                      cadence_index)
+        float_pause = ((last_cadence >= 0)
+                       & np.array(pause_is_float)[
+                           exercise_cadence[last_cadence]])
+        # rests are None when skipped, nan as floats
+        rest = np.nan_to_num(np.array(rests, dtype=np.float64))
+
+        # save_plan() saves the exercises group by group, but rows saved
+        # some other way can interleave groups: keep each group together
+        order = np.argsort(exercise_group, kind='stable')
+        with_sets = order[set_counts[order] > 0]
+        # one C call parses the sets of all exercises, e.g. "[[10, 22.5],
+        # [8, 25.0]]" of each, into reps, weight, reps, weight, ...
+        sets = np.fromstring(
+            ','.join(np.array(texts, dtype=object)[with_sets])
+            .translate(BRACKETS),
+            sep=','
+        )
+        packed._pack(sets[0::2], sets[1::2], set_counts[order],
+                     exercise_group[order],
+                     np.array(cadence_values,
+                              dtype=np.float64)[exercise_cadence[order]],
+                     has_cadence[order], rest[order], float_tut,
+                     float_pause)
+        return packed
+
+    def _pack(self, reps, weights, set_counts, exercise_group, cadence,
+              has_cadence, rest, float_tut, float_pause):
+        """
+        Set the columns from the reps and weights (float arrays) of every
+        set and the lists of the exercises (in group order) and groups.
+        """
+        group_count = len(float_tut)
+        self.group_count = group_count
+        self.exercise_group = np.array(exercise_group, dtype=np.intp)
+        # exercise and group number of each set
+        set_exercise = np.repeat(np.arange(len(set_counts)), set_counts)
+        self.set_group = self.exercise_group[set_exercise]
+        self.reps = reps
+        self.weights = weights
+        self.exercise_reps = np.bincount(set_exercise, weights=self.reps,
+                                         minlength=len(set_counts))
+        self.cadence = np.asarray(cadence, dtype=np.float64).reshape(-1, 3)
+        self.has_cadence = np.array(has_cadence, dtype=bool)
+        self.rest = np.array(rest, dtype=np.int64)
+        # weights are floats, so the volume is one as soon as there's a set
+        self.float_volume = np.bincount(self.set_group,
+                                        minlength=group_count) > 0
+        self.float_tut = np.array(float_tut, dtype=bool)
+        self.float_pause = np.array(float_pause, dtype=bool)
+
+
+def compute_metrics(packed):
+    """
+    Return three arrays with the volume, time under tension and
+    duration of every group in packed (a PackedPlans object).
+
+    calc_metrics() keeps adding up repetitions over the exercises of a
+    group, so each exercise with a cadence contributes the running
+    total of repetitions times its contraction + extension time. The
+    duration is the tut plus that running total times the pause of the
+    last exercise with a cadence, plus all rest times.
+    """
+    group_count = packed.group_count
+
+    # np.bincount adds the weights one after the other, in array order,
+    # so float sums come out exactly as in the python loop
+    volume = np.bincount(packed.set_group,
+                         weights=packed.reps * packed.weights,
+                         minlength=group_count)
+
+    # running total of repetitions within each group
+    running_reps = np.cumsum(packed.exercise_reps)
+    group_starts = np.searchsorted(packed.exercise_group,
+                                   np.arange(group_count))
+    reps_before_group = np.concatenate(([0], running_reps))[group_starts]
+    running_reps -= reps_before_group[packed.exercise_group]
+
+    tension_time = np.where(
+        packed.has_cadence,
+        running_reps * (packed.cadence[:, 0] + packed.cadence[:, 2]),
+        0.0
+    )
+    tut = np.bincount(packed.exercise_group, weights=tension_time,
+                      minlength=group_count)
+
+    # index of the last exercise with a cadence in each group
+    last_cadence = np.full(group_count, -1, dtype=np.intp)
+    cadence_index = np.flatnonzero(packed.has_cadence)
+    np.maximum.at(last_cadence, packed.exercise_group[cadence_index],
+                  cadence_index)
+    has_cadence = last_cadence >= 0
+    last = last_cadence[has_cadence]
+    exercise_time = np.zeros(group_count)
+    exercise_time[has_cadence] = (tut[has_cadence]
+                                  + running_reps[last]
+                                  * packed.cadence[last, 1])
+
+    rest_time = np.bincount(packed.exercise_group, weights=packed.rest,
+                            minlength=group_count)
+    return volume, tut, exercise_time + rest_time
+
+
+def calc_all_metrics(plans):
+    """
+    Return the metrics of every group of every plan in plans (a list of
+    training plan dictionaries) as a list with one dictionary per plan,
+    mapping group names to (volume, tut, group_time) tuples like the
+    ones returned by MuscleGroup.calc_metrics().
+    """
+    return plan_metrics(PackedPlans(plans), len(plans))
+
+
+def calc_store_metrics(store, client=None):
+    """
+    Return the metrics of every group of every plan saved in store (a
+    plan_store.PlanStore), or only of client's, as a dictionary mapping
+    the (client, plan_id) of each plan to a dictionary like the ones of
+    calc_all_metrics(). The plans are never loaded into objects.
+    """
+    packed = PackedPlans.from_store(store, client)
+    return dict(zip(packed.plan_keys,
+                    plan_metrics(packed, len(packed.plan_keys))))
+
+
+def plan_metrics(packed, plan_count):
+    """
+    Compute the metrics of packed (a PackedPlans object of plan_count
+    plans) and return them as a list with one dictionary per plan, see
+    calc_all_metrics().
+    """
+    volume, tut, group_time = compute_metrics(packed)
+    float_time = packed.float_tut | packed.float_pause
+    # python floats as they are, int() where calc_metrics() has ints
+    columns = [
+        [value if is_float else int(value)
+         for value, is_float in zip(values.tolist(), floats.tolist())]
+        for values, floats in ((volume, packed.float_volume),
+                               (tut, packed.float_tut),
+                               (group_time, float_time))
+    ]
+    results = [{} for _ in range(plan_count)]
+    for (plan_index, group_name), *metrics in zip(packed.group_names,
+                                                  *columns):
+        results[plan_index][group_name] = tuple(metrics)
+    return results
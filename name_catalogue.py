@@ -0,0 +1,306 @@
+"""
+Catalogue of muscle group and exercise names, so the same group or
+exercise entered with another spelling ('biceps ', 'Bicep') ends up
+under the name already used ('Biceps') instead of a new group or
+exercise that splits the plan and its metrics.
+
+Names are compared normalised (case, spaces and punctuation ignored).
+Similar names are found with an index of the three-letter pieces
+(trigrams) of every name: a name within a few typos of another shares
+most of its trigrams, so the names of the rarest trigram lists of a
+query are counted with numpy, and only the few that share enough of
+them are compared letter by letter. Prefix lookups use the sorted list
+of names. Both stay well under a millisecond for tens of thousands of
+names (see benchmarks/bench_catalogue.py).
+
+Names that differ in their numbers ('Week 1', 'Week 2') are never
+taken as spellings of each other.
+
+The catalogues of the common names are built once, when the module is
+imported, and shared: the app's catalogues are layered on them, so the
+sessions of session_server.py don't each index them again.
+"""
+import bisect
+import re
+from array import array
+
+import numpy as np
+
+
+"""
+Names the catalogues of the app start with.
+"""
+COMMON_GROUPS = [
+    'Abdominals', 'Abductors', 'Adductors', 'Back', 'Biceps', 'Calves',
+    'Chest', 'Core', 'Forearms', 'Glutes', 'Hamstrings', 'Hip Flexors',
+    'Lats', 'Legs', 'Lower Back', 'Neck', 'Obliques', 'Quadriceps',
+    'Shoulders', 'Traps', 'Triceps',
+]
+COMMON_EXERCISES = [
+    'Ab Wheel Rollouts', 'Arnold Press', 'Barbell Row', 'Bench Press',
+    'Bulgarian Split Squats', 'Cable Crossover', 'Cable Crunches',
+    'Cable Curls', 'Calf Raises', 'Chest Fly', 'Chin-ups',
+    'Close Grip Bench Press', 'Concentration Curls', 'Crunches', 'Curls',
+    'Deadlifts', 'Decline Bench Press', 'Dips', 'Dumbbell Press',
+    'Dumbbell Row', 'Face Pulls', "Farmer's Walk", 'French Press',
+    'Front Raises', 'Front Squats', 'Glute Bridges', 'Good Mornings',
+    'Hack Squats', 'Hammer Curls', 'Hip Thrusts', 'Incline Bench Press',
+    'Lat Pulldown', 'Lateral Raises', 'Leg Curls', 'Leg Extensions',
+    'Leg Press', 'Leg Raises', 'Lunges', 'Overhead Press',
+    'Overhead Triceps Extension', 'Planks', 'Preacher Curls', 'Pull-ups',
+    'Push-ups', 'Rear Delt Fly', 'Reverse Curls', 'Romanian Deadlifts',
+    'Russian Twists', 'Seated Cable Row', 'Seated Calf Raises', 'Shrugs',
+    'Sit-ups', 'Skull Crushers', 'Squats', 'Triceps Pushdown',
+    'Upright Row', 'Wrist Curls',
+]
+
+
+def normalise_name(name):
+    """
+    Return name in lower case, with punctuation as spaces and single
+    spaces between words: ' Pull-ups ' -> 'pull ups'.
+    """
+    return ' '.join(re.sub(r'[^\w\s]', ' ', name).split()).casefold()
+
+
+def numbers(key):
+    """
+    Return the numbers in the normalised name key, e.g. ('3',) for
+    'week 3'.
+    """
+    return tuple(re.findall(r'\d+', key))
+
+
+def trigrams(key):
+    """
+    Return the set of three-letter pieces of the normalised name key,
+    padded so the first and last letters count too.
+    """
+    padded = f'  {key} '
+    return {padded[i:i+3] for i in range(len(padded) - 2)}
+
+
+MAX_POSTINGS = 50_000  # trigram list entries counted per fuzzy lookup
+TRIGRAMS_PER_TYPO = 4  # a swap of two letters changes up to 4 trigrams
+
+
+def max_typos(key):
+    """
+    Return how many typos a name may differ by from key to be taken as
+    the same name: one for short names, two for longer ones.
+    """
+    return 1 if len(key) <= 8 else 2
+
+
+def edit_distance(first, second, limit):
+    """
+    Return the number of letters to insert, delete, replace or swap
+    with the next one to turn first into second, or limit + 1 if it's
+    more than limit.
+    """
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    # the letters both start or end with don't change the distance, and
+    # names with a typo have little else
+    start = 0
+    shortest = min(len(first), len(second))
+    while start < shortest and first[start] == second[start]:
+        start += 1
+    end = 0
+    while end < shortest - start and first[-1-end] == second[-1-end]:
+        end += 1
+    first = first[start:len(first) - end]
+    second = second[start:len(second) - end]
+    before = None
+    previous = list(range(len(second) + 1))
+    for i, letter in enumerate(first, 1):
+        current = [i]
+        for j, other in enumerate(second, 1):
+            distance = min(previous[j] + 1, current[j-1] + 1,
+                           previous[j-1] + (letter != other))
+            if (before is not None and j > 1 and letter == second[j-2]
+                    and first[i-2] == other):
+                distance = min(distance, before[j-2] + 1)  # swapped
+            current.append(distance)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+class NameCatalogue():
+    """
+    This class indexes names for exact, prefix and fuzzy lookups. Each
+    name is kept with the spelling it was first added with. A catalogue
+    can be layered on a base catalogue (e.g. the shared one of the
+    common names): lookups search both, but names are only added to
+    the layer, so the base is never changed and can be shared by
+    sessions running in other threads.
+    """
+    def __init__(self, names=(), base=None):
+        self.base = base
+        self.names = {}  # normalised name -> spelling
+        self.keys = []  # normalised names without numbers, by number
+        # (trigram, length) -> numbers in keys of the names of that
+        # length having the trigram
+        self.index = {}
+        self.numbered = {}  # numbers -> normalised names with them
+        self._sorted = []  # normalised names, for prefix lookups
+        self._unsorted = []  # added since the last prefix lookup
+        self.learn(names)
+        self._sort()
+
+    def __len__(self):
+        if self.base is None:
+            return len(self.names)
+        return len(self.names) + len(self.base)
+
+    def add(self, name):
+        """
+        Add name to the catalogue. Returns the spelling kept for it.
+        """
+        key = normalise_name(name)
+        known = self._spelling(key)
+        if known is not None or not key:
+            return known or name
+        self.names[key] = name
+        key_numbers = numbers(key)
+        if key_numbers:  # only ever similar to names with the same numbers
+            self.numbered.setdefault(key_numbers, []).append(key)
+        else:
+            for trigram in trigrams(key):
+                self.index.setdefault((trigram, len(key)),
+                                      array('q')).append(len(self.keys))
+            self.keys.append(key)
+        self._unsorted.append(key)
+        return name
+
+    def learn(self, names):
+        for name in names:
+            self.add(name)
+
+    def get(self, name):
+        """
+        Return the spelling of name in the catalogue, or None.
+        """
+        return self._spelling(normalise_name(name))
+
+    def _spelling(self, key):
+        spelling = self.names.get(key)
+        if spelling is None and self.base is not None:
+            return self.base._spelling(key)
+        return spelling
+
+    def _sort(self):
+        if self._unsorted:  # nearly sorted, timsort merges it quickly
+            self._sorted.extend(self._unsorted)
+            self._sorted.sort()
+            self._unsorted = []
+
+    def complete(self, prefix, limit=10):
+        """
+        Return up to limit names starting with prefix, in alphabetical
+        order.
+        """
+        key = normalise_name(prefix)
+        return [self._spelling(completion)
+                for completion in self._completions(key, limit)]
+
+    def _completions(self, key, limit):
+        # the normalised names starting with key, of the base too
+        self._sort()
+        completions = []
+        for i in range(bisect.bisect_left(self._sorted, key),
+                       len(self._sorted)):
+            completion = self._sorted[i]
+            if len(completions) == limit or not completion.startswith(key):
+                break
+            completions.append(completion)
+        if self.base is not None:
+            completions = sorted(completions
+                                 + self.base._completions(key, limit))
+        return completions[:limit]
+
+    def similar(self, name, limit=5):
+        """
+        Return up to limit names within max_typos() of name, closest
+        first. Names that are the same once normalised come first.
+        """
+        key = normalise_name(name)
+        matches = sorted(self._matches(key, max_typos(key)))
+        return [self._spelling(candidate) for _, candidate in matches[:limit]]
+
+    def _matches(self, key, typos):
+        # (distance, normalised name) of the names within typos of key
+        key_numbers = numbers(key)
+        if key_numbers:
+            candidates = self.numbered.get(key_numbers, ())
+        else:
+            candidates = self._candidates(key, typos)
+        matches = []
+        for candidate in candidates:
+            distance = edit_distance(key, candidate, typos)
+            if distance <= typos:
+                matches.append((distance, candidate))
+        if self.base is not None:
+            matches.extend(self.base._matches(key, typos))
+        return matches
+
+    def _candidates(self, key, typos):
+        """
+        Return the names without numbers that share enough trigrams
+        with key and are about as long to be within typos of it.
+        """
+        lengths = range(len(key) - typos, len(key) + typos + 1)
+        # the lists of each trigram, of names about as long as key
+        lists = []
+        for trigram in trigrams(key):
+            ids = [self.index[trigram, length] for length in lengths
+                   if (trigram, length) in self.index]
+            lists.append((sum(map(len, ids)), ids))
+        lists.sort(key=lambda item: item[0])
+        # a similar name misses at most TRIGRAMS_PER_TYPO * typos of the
+        # lists, so it's in enough of the rarest ones counted here
+        missed = TRIGRAMS_PER_TYPO * typos
+        used = min(len(lists), missed + 1)
+        postings = sum(size for size, _ in lists[:used])
+        while used < len(lists) and \
+                postings + lists[used][0] <= MAX_POSTINGS:
+            postings += lists[used][0]
+            used += 1
+        if not postings:
+            return []
+        counts = np.bincount(np.frombuffer(b''.join(
+            [ids for _, trigram_ids in lists[:used] for ids in trigram_ids]),
+            np.int64))
+        ids = np.flatnonzero(counts >= used - missed)
+        return [self.keys[i] for i in ids.tolist()]
+
+    def match(self, name, prefixes=False):
+        """
+        Return the name of the catalogue name most likely stands for:
+        the same name spelled differently, the closest similar name, or
+        (if prefixes is True) the only name name is the beginning of.
+        Returns None if there is none.
+        """
+        known = self.get(name)
+        if known is not None:
+            return known
+        similar = self.similar(name, limit=1)
+        if similar:
+            return similar[0]
+        if prefixes:
+            completions = self.complete(name, limit=2)
+            if (len(completions) == 1
+                    and numbers(normalise_name(name))
+                    == numbers(normalise_name(completions[0]))):
+                return completions[0]
+        return None
+
+
+"""
+The catalogues of the common names, built once and shared by the app's
+catalogues (see run.py), which add the names of the session on top.
+"""
+shared_groups = NameCatalogue(COMMON_GROUPS)
+shared_exercises = NameCatalogue(COMMON_EXERCISES)
@@ -0,0 +1,396 @@
+"""
+Bulk import of training plans from CSV or JSON Lines files, without
+going through the prompts of create_training_plan().
+
+CSV files use the same columns as the 'Training Table' worksheet:
+Muscle Group, Exercise, Sets, Set1 Reps, Set1 Weight (kg), ...,
+Cadence (s), Rest (s). Cadence and Rest are optional and '--' marks an
+empty cell, so a table downloaded from google sheet can be imported
+again.
+
+JSON Lines files contain one exercise object per line, e.g.
+{"group": "Biceps", "exercise": "Curls", "sets": 2, "reps": [10, 8],
+ "weights": [12.5, 15], "cadence": "2 0 4", "rest": 60}
+
+A plan saved to the sheet can be loaded back the same way with
+import_worksheet(): the whole worksheet is fetched with one read
+(get_all_values) and its rows are parsed like a CSV file.
+
+Files are read one row at a time and every value is checked with the
+same rules as the prompts (compile_requirements() in run.py), so
+invalid rows are reported and skipped without stopping the import.
+Group and exercise names spelled differently from a name already known
+(see name_catalogue.py: the catalogues of the session importing the
+rows, or new ones on top of the common names) are merged into it:
+'biceps ' is imported into 'Biceps'. Names only similar to a known one
+('Decline Press', 'Incline Press') may be other exercises, so they are
+kept and reported as warnings rather than errors.
+
+Usage: python plan_import.py [FILE ...] [--sheet] [--client NAME]
+                             [--plan ID] [--sync]
+"""
+import argparse
+import csv
+import json
+import sys
+
+from run import (MuscleGroup, Exercise, TrainingPlan, compile_requirements,
+                 build_training_table, build_metrics_table, REPS_REQUIREMENTS)
+from name_catalogue import NameCatalogue, shared_groups, shared_exercises
+from plan_store import PlanStore
+from sheet_sync import sync_worker, worksheet_title, read_worksheet
+
+
+"""
+The requirements each value must satisfy, the same ones used when the
+values are entered by hand (REPS_REQUIREMENTS too, which limits reps to
+what the typed arrays of Exercise can hold).
+"""
+GROUP_REQUIREMENTS = ['name']
+EXERCISE_REQUIREMENTS = ['name']
+SETS_REQUIREMENTS = ['positive integer', 'minimum 1']
+WEIGHT_REQUIREMENTS = ['positive float']
+CADENCE_REQUIREMENTS = ['can skip', 'cadence']
+REST_REQUIREMENTS = ['can skip', 'positive integer']
+
+# compiled once, as every row runs them (see compile_requirements())
+check_group = compile_requirements(GROUP_REQUIREMENTS)
+check_exercise = compile_requirements(EXERCISE_REQUIREMENTS)
+check_sets = compile_requirements(SETS_REQUIREMENTS)
+check_reps = compile_requirements(REPS_REQUIREMENTS)
+check_weight = compile_requirements(WEIGHT_REQUIREMENTS)
+check_cadence = compile_requirements(CADENCE_REQUIREMENTS)
+check_rest = compile_requirements(REST_REQUIREMENTS)
+
+EMPTY_CELL = '--'  # placeholder used in the sheet for missing values
+
+
+def normalise_header(header):
+    """
+    Turn a column title like 'Set1\\nWeight\\n(kg)' into 'set1 weight (kg)'
+    so titles written on one or several lines are recognised alike.
+    """
+    return ' '.join(header.split()).lower()
+
+
+def cell_text(value):
+    """
+    Return the value as the string a user would have typed,
+    with the sheet's '--' placeholder and missing values as ''.
+    """
+    if type(value) is not str:  # sheet cells are mostly strings
+        if value is None:
+            return ''
+        if isinstance(value, (list, tuple)):  # e.g. cadence as [2, 0, 4]
+            return ' '.join(str(el) for el in value)
+        value = str(value)
+    value = value.strip()
+    if value == EMPTY_CELL:
+        return ''
+    return value
+
+
+def make_exercise(fields):
+    """
+    Build a (group_name, Exercise) pair from a dictionary of raw values
+    with the keys group, exercise, sets, reps, weights, cadence, rest.
+    Every value is checked like check_input() does. Returns
+    (group_name, exercise, errors) where errors is a list of
+    (field, error_message); exercise is None if errors isn't empty.
+    """
+    errors = []
+
+    def check(field, text, check_value):
+        value, error_message = check_value(text)
+        if error_message:
+            errors.append((field, error_message))
+        return value
+
+    group_name = check('group', cell_text(fields.get('group')), check_group)
+    exercise = Exercise()
+    exercise.name = check('exercise', cell_text(fields.get('exercise')),
+                          check_exercise)
+    exercise.sets = check('sets', cell_text(fields.get('sets')),
+                          check_sets)
+
+    reps = [cell_text(value) for value in fields.get('reps') or []]
+    weights = [cell_text(value) for value in fields.get('weights') or []]
+    # trailing '--' cells only pad the row up to the longest exercise
+    while reps and reps[-1] == '' and (not weights or weights[-1] == ''):
+        reps.pop()
+        weights = weights[:len(reps)]
+    if len(weights) != len(reps):
+        errors.append(('weights', f'expected {len(reps)} weights, '
+                                  f'found {len(weights)}'))
+    elif not errors and len(reps) != exercise.sets:
+        errors.append(('reps', f'expected {exercise.sets} sets, '
+                               f'found {len(reps)}'))
+    else:
+        for set_number, (rep, weight) in enumerate(zip(reps, weights), 1):
+            rep = check(f'set{set_number} reps', rep, check_reps)
+            weight = check(f'set{set_number} weight', weight,
+                           check_weight)
+            if not errors:  # the typed arrays only take valid numbers
+                exercise.add_set(rep, weight)
+
+    cadence = check('cadence', cell_text(fields.get('cadence')),
+                    check_cadence)
+    if cadence != '':
+        exercise.cadence = tuple(cadence)
+    rest = check('rest', cell_text(fields.get('rest')), check_rest)
+    if rest != '':
+        exercise.rest = rest
+
+    if errors:
+        return group_name, None, errors
+    return group_name, exercise, errors
+
+
+def iter_table_rows(rows):
+    """
+    Yield (row_number, fields) for every row of rows (a header row then
+    the exercises) in the 'Training Table' layout, fields being the
+    dictionary expected by make_exercise(). The columns are looked up
+    once from the header row.
+    """
+    reader = iter(rows)
+    headers = [normalise_header(str(header))
+               for header in next(reader, [])]
+    columns = {header: i for i, header in enumerate(headers)}
+    set_columns = []  # (reps column, weight column) for each set
+    set_number = 1
+    while f'set{set_number} reps' in columns:
+        set_columns.append((columns[f'set{set_number} reps'],
+                            columns.get(f'set{set_number} weight (kg)')))
+        set_number += 1
+
+    def cell(row, column):
+        if column is None or column >= len(row):
+            return None
+        return row[column]
+
+    for row_number, row in enumerate(reader, 2):
+        if not any(cell_text(value) for value in row):  # skip blank rows
+            continue
+        yield row_number, {
+            'group': cell(row, columns.get('muscle group')),
+            'exercise': cell(row, columns.get('exercise')),
+            'sets': cell(row, columns.get('sets')),
+            'reps': [cell(row, reps) for reps, _ in set_columns],
+            'weights': [cell(row, weight) for _, weight in set_columns],
+            'cadence': cell(row, columns.get('cadence (s)')),
+            'rest': cell(row, columns.get('rest (s)')),
+        }
+
+
+def iter_csv_rows(file):
+    """
+    Yield (row_number, fields) for every row of a CSV file in the
+    'Training Table' layout, see iter_table_rows().
+    """
+    return iter_table_rows(csv.reader(file))
+
+
+def iter_json_rows(file):
+    """
+    Yield (line_number, fields) for every exercise object of a JSON
+    Lines file. Lines that aren't valid JSON objects are yielded with
+    fields set to the error message.
+    """
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            fields = json.loads(line)
+            if not isinstance(fields, dict):
+                raise ValueError('expected a JSON object')
+        except ValueError as error:
+            yield line_number, str(error)
+        else:
+            yield line_number, fields
+
+
+def iter_file_rows(path):
+    """
+    Open the file at path and yield its rows with iter_csv_rows() or
+    iter_json_rows() depending on the file extension.
+    """
+    with open(path, newline='', encoding='utf-8') as file:
+        if path.lower().endswith(('.json', '.jsonl', '.ndjson')):
+            yield from iter_json_rows(file)
+        else:
+            yield from iter_csv_rows(file)
+
+
+def import_plan(path, training_plan, report_error=print,
+                report_warning=print, group_catalogue=None,
+                exercise_catalogue=None):
+    """
+    Add every valid exercise of the file at path to training_plan,
+    creating the muscle groups as needed. Rows with invalid values, and
+    rows of an exercise the group already has, are passed to
+    report_error and skipped. New names similar to a known one of
+    group_catalogue or exercise_catalogue are imported and passed to
+    report_warning, once for each name.
+    Returns (imported, skipped) counts.
+    """
+    return add_rows(iter_file_rows(path), training_plan, path, report_error,
+                    report_warning, group_catalogue, exercise_catalogue)
+
+
+def import_worksheet(worksheet_name, training_plan, report_error=print,
+                     report_warning=print, group_catalogue=None,
+                     exercise_catalogue=None):
+    """
+    Add every valid exercise of the worksheet worksheet_name (a
+    'Training Table') to training_plan, like import_plan() does for a
+    file. The worksheet is read with a single call, after the uploads
+    still queued are written, so the plan last saved is the one loaded.
+    Returns (imported, skipped) counts, (0, 0) if the worksheet doesn't
+    exist.
+    """
+    sync_worker.flush()
+    rows = read_worksheet(worksheet_name)
+    return add_rows(iter_table_rows(rows), training_plan,
+                    f'worksheet "{worksheet_name}"', report_error,
+                    report_warning, group_catalogue, exercise_catalogue)
+
+
+def known_name(name, catalogue):
+    """
+    Return (spelling, similar): the spelling of name in catalogue, if
+    it's the same name once normalised, or name itself, added to the
+    catalogue; and for a new name the closest name of the catalogue it
+    may be a misspelling of, or None.
+    """
+    known = catalogue.get(name)
+    if known is not None:
+        return known, None
+    similar = catalogue.similar(name, limit=1)
+    return catalogue.add(name), similar[0] if similar else None
+
+
+def add_rows(rows, training_plan, source, report_error, report_warning,
+             group_catalogue=None, exercise_catalogue=None):
+    """
+    Add the exercises of rows, (row_number, fields) pairs, to
+    training_plan, merging names spelled differently and reporting new
+    names similar to known ones as warnings. Errors and warnings are
+    reported with the name of the source the rows come from. A new name
+    is added to the catalogue, so it's only reported once. Names are
+    looked up in group_catalogue and exercise_catalogue (e.g. those of
+    a session), or in new catalogues on top of the common names.
+    Returns (imported, skipped) counts.
+    """
+    if group_catalogue is None:
+        group_catalogue = NameCatalogue(base=shared_groups)
+    if exercise_catalogue is None:
+        exercise_catalogue = NameCatalogue(base=shared_exercises)
+    imported = 0
+    skipped = 0
+    for row_number, fields in rows:
+        if isinstance(fields, str):  # the row couldn't be parsed at all
+            skipped += 1
+            report_error(f'{source}, row {row_number}: {fields}')
+            continue
+        group_name, exercise, errors = make_exercise(fields)
+        if errors:
+            skipped += 1
+            for field, error_message in errors:
+                report_error(f'{source}, row {row_number}, {field}: '
+                             f'{error_message.strip()}')
+            continue
+        group_name, similar_group = known_name(group_name, group_catalogue)
+        typed_name = exercise.name
+        exercise.name, similar_exercise = known_name(typed_name,
+                                                     exercise_catalogue)
+        group = training_plan.get(group_name)
+        if group is not None and exercise.name in group.exercises:
+            # the row must not replace the exercise of another row
+            skipped += 1
+            if exercise.name != typed_name:
+                report_error(f'{source}, row {row_number}, exercise: '
+                             f'"{typed_name}" is "{exercise.name}", which '
+                             f'{group_name} already has')
+            else:
+                report_error(f'{source}, row {row_number}, exercise: '
+                             f'{group_name} already has "{exercise.name}"')
+            continue
+        for field, name, similar in (('group', group_name, similar_group),
+                                     ('exercise', exercise.name,
+                                      similar_exercise)):
+            if similar is not None:
+                report_warning(f'{source}, row {row_number}, {field}: '
+                               f'"{name}" is kept as a new name, check it '
+                               f'isn\'t "{similar}"')
+        if group is None:
+            group = MuscleGroup()
+            group.name = group_name
+            training_plan[group_name] = group
+        group.add_exercise(exercise)
+        imported += 1
+    return imported, skipped
+
+
+def main():
+    """
+    Import the files given on the command line (and/or the training
+    table saved in google sheet) into one training plan and optionally
+    save it to the plan store and/or google sheet.
+    """
+    parser = argparse.ArgumentParser(
+        description='Import training plans from CSV or JSON Lines files.'
+    )
+    parser.add_argument('files', nargs='*', metavar='FILE')
+    parser.add_argument('--sheet', action='store_true',
+                        help="import the client's Training Table worksheet")
+    parser.add_argument('--client',
+                        help='client the plan belongs to')
+    parser.add_argument('--plan', metavar='ID',
+                        help='save the plan under this id in the plan store')
+    parser.add_argument('--sync', action='store_true',
+                        help='save the imported plan to google sheet')
+    args = parser.parse_args()
+    if args.plan and not args.client:
+        parser.error('--plan needs a --client')
+    if not args.files and not args.sheet:
+        parser.error('give files to import or --sheet')
+
+    training_plan = TrainingPlan()
+    # names are merged across all the files
+    catalogues = (NameCatalogue(base=shared_groups),
+                  NameCatalogue(base=shared_exercises))
+    total_skipped = 0
+    if args.sheet:
+        worksheet_name = worksheet_title('Training Table', args.client)
+        imported, skipped = import_worksheet(worksheet_name, training_plan,
+                                             print, print, *catalogues)
+        total_skipped += skipped
+        print(f'{worksheet_name}: {imported} exercises imported, '
+              f'{skipped} skipped')
+    for path in args.files:
+        imported, skipped = import_plan(path, training_plan, print, print,
+                                        *catalogues)
+        total_skipped += skipped
+        print(f'{path}: {imported} exercises imported, {skipped} skipped')
+
+    if args.plan and training_plan:
+        store = PlanStore()
+        store.save_plan(args.client, args.plan, training_plan)
+        store.close()
+        print(f'Plan "{args.plan}" saved for {args.client}')
+    if args.sync and training_plan:
+        sync_worker.submit(worksheet_title('Training Table', args.client),
+                           build_training_table(training_plan))
+        sync_worker.submit(worksheet_title('Training Metrics', args.client),
+                           build_metrics_table(training_plan)[0])
+        if sync_worker.flush():
+            print(sync_worker.status_message())
+        else:
+            print(f'Saving to google sheet failed: {sync_worker.last_error}')
+            return 1
+    return 1 if total_skipped else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""
+Local copy of the session's training plan, so a restarted app carries
+on with the plan it had instead of starting empty.
+
+Each session keeps its plan in a folder of its own, named after the
+session id the app is started with (run.py --session, passed by the
+web terminal for each browser tab), so trainers using the app at the
+same time never see or overwrite each other's plans. A lock file
+stops two running apps from using the same folder.
+
+The plan is kept in two JSON Lines files: a snapshot of the whole plan
+and a journal that every change is appended to (an exercise added or
+replaced, a client chosen). A change costs one short line whatever the
+size of the plan. The snapshot is only rewritten (to a temporary file,
+then renamed) when the whole plan is replaced or the journal has grown
+longer than the plan, and the journal is emptied then. Both files start
+with the number of the snapshot (its generation), and only a journal
+of the same generation as the snapshot is replayed: if the app stops
+after a new snapshot was written but before the journal was emptied,
+the old journal's changes are already in the snapshot, or belong to
+the plan it replaced, and are left out.
+
+Restoring reads the snapshot and replays the journal, without going
+through the prompts' checks or reading google sheet. A last journal line
+cut short by a crash is ignored.
+
+Exercise lines use the JSON Lines format of plan_import.py, e.g.
+{"group": "Biceps", "exercise": "Curls", "sets": 2, "reps": [10, 8],
+ "weights": [12.5, 15.0], "cadence": [2, 0, 4], "rest": 60}
+"""
+import json
+import os
+import re
+
+from run import MuscleGroup, Exercise, TrainingPlan
+
+
+JOURNAL_FOLDER = 'journals'  # a folder for each session in there
+SNAPSHOT_FILE = 'snapshot.jsonl'
+JOURNAL_FILE = 'journal.jsonl'
+MIN_COMPACT_RECORDS = 100  # don't rewrite the snapshot for tiny plans
+
+
+def session_folder(session, folder=JOURNAL_FOLDER):
+    """
+    Return the folder the plan of the session with id session is kept
+    in, with any character not allowed in a file name replaced.
+    """
+    return os.path.join(folder, re.sub(r'[^\w-]', '_', session)[:64])
+
+
+def process_running(pid):
+    """
+    Return True if a process with the number pid is running.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # running, as another user
+        return True
+    return True
+
+
+def exercise_record(group_name, exercise):
+    """
+    Return the exercise of group group_name as a dictionary that can be
+    written as JSON.
+    """
+    return {
+        'group': group_name,
+        'exercise': exercise.name,
+        'sets': exercise.sets,
+        'reps': exercise.reps.tolist(),
+        'weights': exercise.weights.tolist(),
+        'cadence': None if exercise.cadence is None
+        else list(exercise.cadence),
+        'rest': exercise.rest,
+    }
+
+
+def add_record(training_plan, record):
+    """
+    Add the exercise of an exercise_record() dictionary to training_plan,
+    replacing an exercise of the same name in the same group.
+    """
+    group = training_plan.get(record['group'])
+    if group is None:
+        group = MuscleGroup()
+        group.name = record['group']
+        training_plan[group.name] = group
+    exercise = Exercise()
+    exercise.name = record['exercise']
+    exercise.sets = record['sets']
+    exercise.reps.extend(record['reps'])
+    exercise.weights.extend(record['weights'])
+    if record['cadence'] is not None:
+        exercise.cadence = tuple(record['cadence'])
+    exercise.rest = record['rest']
+    group.add_exercise(exercise)
+
+
+def read_records(path):
+    """
+    Return the records of the JSON Lines file at path, stopping at a
+    line that isn't complete (the app stopped while writing it).
+    Returns (records, complete) where complete is False if a line was
+    left out.
+    """
+    records = []
+    if not os.path.exists(path):
+        return records, True
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if not line.endswith('\n'):
+                return records, False
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                return records, False
+    return records, True
+
+
+class PlanJournal():
+    """
+    This class keeps the snapshot and journal of the session's training
+    plan and the client it belongs to.
+    """
+    def __init__(self, snapshot_path, journal_path):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.lock_path = f'{snapshot_path}.lock'
+        self.generation = 0  # number of the snapshot
+        self.records = 0  # changes in the journal
+        self.exercises = 0  # exercises in the plan, roughly
+        self.client = None
+        self.locked = False
+        self._journal = None  # opened on the first change
+
+    @classmethod
+    def for_session(cls, session, folder=JOURNAL_FOLDER):
+        """
+        Return the journal of the session with id session.
+        """
+        path = session_folder(session, folder)
+        os.makedirs(path, exist_ok=True)
+        return cls(os.path.join(path, SNAPSHOT_FILE),
+                   os.path.join(path, JOURNAL_FILE))
+
+    def lock(self):
+        """
+        Take the journal for this app. Returns False if another running
+        app has it, e.g. the same session open in two terminals.
+        """
+        while True:
+            try:
+                lock_file = os.open(self.lock_path,
+                                    os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    with open(self.lock_path, encoding='utf-8') as file:
+                        pid = int(file.read() or 0)
+                except (OSError, ValueError):
+                    pid = 0
+                if pid and process_running(pid):
+                    return False
+                try:  # left by an app that stopped without unlocking
+                    os.remove(self.lock_path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(lock_file, 'w', encoding='utf-8') as file:
+                file.write(str(os.getpid()))
+            self.locked = True
+            return True
+
+    def unlock(self):
+        if self.locked:
+            os.remove(self.lock_path)
+            self.locked = False
+
+    def restore(self):
+        """
+        Return the (training_plan, client) saved by the last session,
+        or (None, None) if there is nothing to restore. If the journal
+        isn't empty, it's merged into a new snapshot.
+        """
+        training_plan = TrainingPlan()
+        client = None
+        snapshot, _ = read_records(self.snapshot_path)
+        journal, complete = read_records(self.journal_path)
+        if snapshot and snapshot[0].get('op') == 'reset':
+            self.generation = snapshot[0].get('generation', 0)
+        journal_generation = 0
+        if journal and journal[0].get('op') == 'generation':
+            journal_generation = journal.pop(0)['generation']
+        stale = journal_generation != self.generation
+        if stale:
+            journal = []  # merged into the snapshot, or replaced with it
+        for record in snapshot + journal:
+            operation = record.get('op', 'add')
+            if operation == 'add':
+                add_record(training_plan, record)
+            elif operation == 'reset':
+                training_plan = TrainingPlan()
+            elif operation == 'client':
+                client = record['client']
+        if not snapshot and not journal:
+            return None, None
+        if journal or stale or not complete:
+            # start the next changes on a clean line of an empty journal
+            self.save_snapshot(training_plan, client)
+        else:
+            self.exercises = sum(len(group.exercises)
+                                 for group in training_plan.values())
+            self.client = client
+        return training_plan, client
+
+    def exercise_added(self, training_plan, group_name, exercise):
+        """
+        Record that exercise was added to (or replaced in) the group
+        group_name of training_plan.
+        """
+        self.exercises += 1
+        self._append(exercise_record(group_name, exercise), training_plan)
+
+    def client_changed(self, training_plan, client):
+        self.client = client
+        self._append({'op': 'client', 'client': client}, training_plan)
+
+    def save_snapshot(self, training_plan, client=None):
+        """
+        Write the whole plan to the snapshot and empty the journal,
+        e.g. when the plan is replaced by a new or a loaded one.
+        """
+        generation = self.generation + 1
+        temp_path = f'{self.snapshot_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'op': 'reset', 'generation': generation})
+                       + '\n')
+            if client is not None:
+                file.write(json.dumps({'op': 'client', 'client': client})
+                           + '\n')
+            for group in training_plan.values():
+                for exercise in group.exercises.values():
+                    file.write(json.dumps(exercise_record(group.name,
+                                                          exercise)) + '\n')
+        os.replace(temp_path, self.snapshot_path)
+        self.generation = generation
+        self.exercises = sum(len(group.exercises)
+                             for group in training_plan.values())
+        # the snapshot is complete, the journal starts again after it
+        self.close()
+        with open(self.journal_path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'op': 'generation',
+                                   'generation': generation}) + '\n')
+        self.records = 0
+        self.client = client
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _append(self, record, training_plan):
+        if self._journal is None:
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        # one write per line, flushed so a restarted app finds it
+        self._journal.write(json.dumps(record) + '\n')
+        self._journal.flush()
+        self.records += 1
+        if self.records > max(MIN_COMPACT_RECORDS, self.exercises):
+            self.save_snapshot(training_plan, self.client)
@@ -0,0 +1,226 @@
+"""
+Local store for the training plans of many clients.
+
+Plans are saved in an SQLite file, one row per exercise, and keyed by
+client and plan id. Plans are only rebuilt into MuscleGroup/Exercise
+objects when they are loaded, and the exercises are indexed by client,
+muscle group and exercise name so plans can be looked up without
+loading them.
+"""
+import json
+import sqlite3
+
+from run import MuscleGroup, Exercise, TrainingPlan
+
+
+STORE_FILE = 'plans.db'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS plans (
+    id INTEGER PRIMARY KEY,
+    client TEXT NOT NULL,
+    plan_id TEXT NOT NULL,
+    UNIQUE (client, plan_id)
+);
+CREATE TABLE IF NOT EXISTS exercises (
+    plan INTEGER NOT NULL REFERENCES plans (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    muscle_group TEXT NOT NULL,
+    name TEXT NOT NULL,
+    sets INTEGER NOT NULL,
+    reps_and_weights TEXT NOT NULL,
+    cadence TEXT,
+    rest INTEGER,
+    PRIMARY KEY (plan, position)
+);
+-- UNIQUE (client, plan_id) already indexes plans by client
+DROP INDEX IF EXISTS plans_by_client;
+CREATE INDEX IF NOT EXISTS exercises_by_group ON exercises (muscle_group);
+CREATE INDEX IF NOT EXISTS exercises_by_name ON exercises (name);
+'''
+
+
+class PlanStore():
+    """
+    This class saves training plans (dictionaries of MuscleGroup
+    objects, like training_plan in run.py) to an SQLite file and loads
+    them back on demand.
+    """
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def save_plan(self, client, plan_id, training_plan):
+        """
+        Save training_plan as plan plan_id of client, replacing the
+        exercises of any plan saved before under the same id. A plan
+        saved again keeps its place in plans().
+        """
+        rows = []
+        for group in training_plan.values():
+            for exercise in group.exercises.values():
+                rows.append((
+                    group.name,
+                    exercise.name,
+                    exercise.sets,
+                    json.dumps(exercise.reps_and_weights),
+                    None if exercise.cadence is None
+                    else json.dumps(exercise.cadence),
+                    exercise.rest,
+                ))
+        with self.connection:  # one transaction for the whole plan
+            # the row of a plan saved before is kept, with its id
+            plan, = self.connection.execute(
+                'INSERT INTO plans (client, plan_id) VALUES (?, ?) '
+                'ON CONFLICT (client, plan_id) DO UPDATE '
+                'SET plan_id = excluded.plan_id RETURNING id',
+                (client, plan_id)
+            ).fetchone()
+            self.connection.execute('DELETE FROM exercises WHERE plan = ?',
+                                    (plan,))
+            self.connection.executemany(
+                'INSERT INTO exercises VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                ((plan, position) + row for position, row in enumerate(rows))
+            )
+
+    def load_plan(self, client, plan_id):
+        """
+        Build the training plan saved as plan_id of client back into
+        MuscleGroup and Exercise objects, in the order they were saved.
+        Returns None if there is no such plan.
+        """
+        plan = self.connection.execute(
+            'SELECT id FROM plans WHERE client = ? AND plan_id = ?',
+            (client, plan_id)
+        ).fetchone()
+        if plan is None:
+            return None
+        training_plan = TrainingPlan()
+        rows = self.connection.execute(
+            'SELECT muscle_group, name, sets, reps_and_weights, cadence, '
+            'rest FROM exercises WHERE plan = ? ORDER BY position',
+            plan
+        )
+        for group_name, name, sets, reps_and_weights, cadence, rest in rows:
+            group = training_plan.get(group_name)
+            if group is None:
+                group = MuscleGroup()
+                group.name = group_name
+                training_plan[group_name] = group
+            exercise = Exercise()
+            exercise.name = name
+            exercise.sets = sets
+            exercise.reps_and_weights = json.loads(reps_and_weights)
+            if cadence is not None:
+                exercise.cadence = tuple(json.loads(cadence))
+            exercise.rest = rest
+            group.add_exercise(exercise)
+        return training_plan
+
+    def exercise_rows(self, client=None):
+        """
+        Return the (plan, muscle_group, reps_and_weights, cadence, rest)
+        of every saved exercise, or only of client's, plan by plan in the
+        order they were saved, without building any objects. plan is the
+        row id of the plan (see plan_keys()), reps_and_weights and
+        cadence are the JSON text they are saved as.
+        """
+        if client is None:
+            rows = self.connection.execute(
+                'SELECT plan, muscle_group, reps_and_weights, cadence, rest '
+                'FROM exercises ORDER BY plan, position'
+            )
+        else:
+            rows = self.connection.execute(
+                'SELECT plan, muscle_group, reps_and_weights, cadence, rest '
+                'FROM exercises JOIN plans ON plans.id = exercises.plan '
+                'WHERE client = ? ORDER BY plan, position',
+                (client,)
+            )
+        return rows.fetchall()
+
+    def plan_keys(self, client=None):
+        """
+        Return a dictionary mapping the row id of every saved plan, or
+        of client's, to its (client, plan_id).
+        """
+        if client is None:
+            rows = self.connection.execute(
+                'SELECT id, client, plan_id FROM plans'
+            )
+        else:
+            rows = self.connection.execute(
+                'SELECT id, client, plan_id FROM plans WHERE client = ?',
+                (client,)
+            )
+        return {plan: (client, plan_id) for plan, client, plan_id in rows}
+
+    def delete_plan(self, client, plan_id):
+        with self.connection:
+            self.connection.execute(
+                'DELETE FROM plans WHERE client = ? AND plan_id = ?',
+                (client, plan_id)
+            )
+
+    def clients(self):
+        """
+        Return the names of all clients with at least one saved plan.
+        """
+        rows = self.connection.execute(
+            'SELECT DISTINCT client FROM plans ORDER BY client'
+        )
+        return [client for client, in rows]
+
+    def plans(self, client):
+        """
+        Return the ids of the plans saved for client.
+        """
+        rows = self.connection.execute(
+            'SELECT plan_id FROM plans WHERE client = ? ORDER BY id',
+            (client,)
+        )
+        return [plan_id for plan_id, in rows]
+
+    def group_names(self):
+        """
+        Return the names of the muscle groups of all saved plans.
+        """
+        rows = self.connection.execute(
+            'SELECT DISTINCT muscle_group FROM exercises'
+        )
+        return [group_name for group_name, in rows]
+
+    def exercise_names(self):
+        """
+        Return the names of the exercises of all saved plans.
+        """
+        rows = self.connection.execute('SELECT DISTINCT name FROM exercises')
+        return [name for name, in rows]
+
+    def find_by_group(self, group_name):
+        """
+        Return the (client, plan_id) of every plan containing the
+        muscle group group_name.
+        """
+        return self._find('muscle_group', group_name)
+
+    def find_by_exercise(self, exercise_name):
+        """
+        Return the (client, plan_id) of every plan containing the
+        exercise exercise_name.
+        """
+        return self._find('name', exercise_name)
+
+    def _find(self, column, value):
+        rows = self.connection.execute(
+            f'SELECT DISTINCT client, plan_id FROM exercises '
+            f'JOIN plans ON plans.id = exercises.plan '
+            f'WHERE exercises.{column} = ? ORDER BY client, plan_id',
+            (value,)
+        )
+        return rows.fetchall()
@@ -1,23 +1,24 @@
+import argparse
+import asyncio
+import os
+import signal
+import sys
+from array import array
 from tabulate import tabulate
 from colorama import just_fix_windows_console
 from termcolor import colored
-import gspread
-from google.oauth2.service_account import Credentials
+from sheet_sync import sync_worker, worksheet_title
+from table_render import render_pages
+from session_io import ConsoleInput, ScriptedInput, Transcript
+from instrumentation import instruments
+from name_catalogue import (NameCatalogue, normalise_name, shared_groups,
+                            shared_exercises)
 
 
 """
-Define needed variables to access google sheet and write data.
+The google sheet is only connected to when the first table is saved,
+and tables are uploaded in the background, see sheet_sync.py.
 """
-SCOPE = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive.file",
-    "https://www.googleapis.com/auth/drive"
-    ]
-
-CREDS = Credentials.from_service_account_file('creds.json')
-SCOPED_CREDS = CREDS.with_scopes(SCOPE)
-GSPREAD_CLIENT = gspread.authorize(SCOPED_CREDS)
-SHEET = GSPREAD_CLIENT.open('Muscle Gains')
 sheet_tinyurl = 'https://tinyurl.com/mr2cfuv8'
 
 
@@ -66,14 +67,19 @@ def welcome_message():
     return get_message(message)
 
 
-def main_menu_message():
+def main_menu_message(session):
     """
     Return the main menu options text that will be printed for the user.
     """
     message = ' Please choose an option:\n\
     1. Create a training plan\n\
     2. Display current training plan\n\
-    3. Display calculated metrics'
+    3. Display calculated metrics\n\
+    4. Save or load a client\'s plan\n\
+    5. Schedule the plan over the week'
+    if session.current_client:
+        message += f'\n\n Current client: {session.current_client}'
+    message += f'\n\n {sync_worker.status_message()}'
 
     return message
 
@@ -86,80 +92,221 @@ def color_error_message(message):
     return colored(message, 'white', 'on_red')
 
 
-def check_input(user_input, requirements_list):
+class InvalidInput():
     """
-    This function takes in the user_input and a list of requirements
-    the input must fulfil. Depending on the requirements list, it checks
-    if the input is valid. If it's not valid it returns an appropriate
-    error message for the user, otherwise it returns the processed user_input.
+    This class describes why a user_input doesn't satisfy a requirement.
+    Validators return it instead of the processed user_input. The error
+    text is only formatted and colored when it is first shown, and then
+    kept, since the same few messages are shown over and over.
     """
-    error_message = ''
-    for req in requirements_list:
-        if req == 'can skip':  # user can skip entering some values
-            if user_input == '':
-                break
+    __slots__ = ('text', 'args', 'message')
 
-        elif req == 'name':  # names must be at least 4 chars long
-            try:
-                if len(user_input) < 4:
-                    raise ValueError
-            except ValueError:
-                error_message = '\nName must be at least 4 characters long!'
-                error_message = color_error_message(error_message)
+    def __init__(self, text, *args):
+        self.text = text
+        self.args = args
+        self.message = None
+
+    def error_message(self):
+        if self.message is None:
+            self.message = color_error_message(
+                '\n' + self.text.format(*self.args))
+        return self.message
+
+
+"""
+The validators for every requirement tag, see validator(). Each one
+takes the user_input (already processed by the validators before it in
+the requirements list) and returns it processed, or an InvalidInput.
+"""
+VALIDATORS = {}
+
+
+def validator(tag):
+    """
+    Register the decorated function as the validator of requirement tag.
+    """
+    def register(function):
+        VALIDATORS[tag] = function
+        return function
+    return register
+
+
+INVALID_NAME = InvalidInput('Name must be at least 4 characters long!')
+INVALID_EMPTY = InvalidInput('Please enter at least one character.')
+INVALID_INTEGER = InvalidInput('Please enter a positive natural number.')
+INVALID_MINIMUM_1 = InvalidInput('Please enter a number of at least 1.')
+INVALID_FLOAT = InvalidInput('Please enter a positive real number')
+INVALID_YES_OR_NO = InvalidInput("Please enter a 'yes' or 'no' answer.")
+INVALID_CADENCE_NUMBERS = InvalidInput('Please enter numbers only')
+INVALID_CADENCE_COUNT = InvalidInput('Please enter three numbers')
+
+
+@validator('name')
+def check_name(user_input):  # names must be at least 4 chars long
+    if len(user_input) < 4:
+        return INVALID_NAME
+    return user_input
+
+
+@validator('not empty')
+def check_not_empty(user_input):  # e.g. client names, 'Bob' is fine
+    user_input = user_input.strip()
+    if not user_input:
+        return INVALID_EMPTY
+    return user_input
 
-        elif req == 'positive integer':
-            try:
-                user_input = int(user_input)
-                if user_input <= 0:
-                    raise ValueError
-            except ValueError:
-                error_message = '\nPlease enter a positive natural number.'
-                error_message = color_error_message(error_message)
-                break
 
-        elif req == 'positive float':
+@validator('positive integer')
+def check_positive_integer(user_input):
+    try:
+        user_input = int(user_input)
+    except ValueError:
+        return INVALID_INTEGER
+    if user_input <= 0:
+        return INVALID_INTEGER
+    return user_input
+
+
+@validator('minimum 1')
+def check_minimum_1(user_input):  # e.g. at least one set
+    if user_input < 1:
+        return INVALID_MINIMUM_1
+    return user_input
+
+
+@validator('positive float')
+def check_positive_float(user_input):
+    try:
+        user_input = float(user_input)
+    except ValueError:
+        return INVALID_FLOAT
+    if not user_input >= 0:  # also rejects 'nan'
+        return INVALID_FLOAT
+    return user_input
+
+
+@validator('yes or no')
+def check_yes_or_no(user_input):  # for yes or no answers
+    user_input = user_input.lower()
+    if len(user_input) <= 3:  # random strings are not valid
+        if user_input.find('yes') > -1:
+            return 'yes'
+        if user_input.find('no') > -1:
+            return 'no'
+    return INVALID_YES_OR_NO
+
+
+@validator('cadence')
+def check_cadence(user_input):
+    """
+    Expect three numbers separated by commas or spaces or both, as they
+    should be entered by the user, and return them as a list.
+    """
+    nums = []
+    for element in user_input.replace(',', ' ').split():
+        try:
+            nums.append(int(element))
+        except ValueError:
             try:
-                user_input = float(user_input)
-                if user_input < 0:
-                    raise ValueError
+                nums.append(float(element))
             except ValueError:
-                error_message = '\nPlease enter a positive real number'
-                error_message = color_error_message(error_message)
-                break
-
-        # user can choose a number only from the available options list
-        elif (
-            type(req) == tuple and
-            (user_input < req[0] or user_input > req[1])
-        ):
-            error_message = f'\nPlease enter a value between\
-            {req[0]} and {req[1]}.'
-            error_message = color_error_message(error_message)
+                return INVALID_CADENCE_NUMBERS
+    if len(nums) != 3:
+        return INVALID_CADENCE_COUNT
+    return nums
+
+
+def check_range(minimum, maximum):
+    """
+    Return the validator of a (minimum, maximum) requirement: the user
+    can choose a number only from the available options list.
+    """
+    invalid = InvalidInput('Please enter a value between {} and {}.',
+                           minimum, maximum)
+
+    def check_option(user_input):
+        if user_input < minimum or user_input > maximum:
+            return invalid
+        return user_input
+    return check_option
+
+
+def chain_validators(first, second):
+    """
+    Return one validator running first, then second if first succeeds.
+    """
+    def check_both(user_input):
+        user_input = first(user_input)
+        if user_input.__class__ is InvalidInput:
+            return user_input
+        return second(user_input)
+    return check_both
+
+
+def build_validator(requirements):
+    """
+    Turn a tuple of requirements into one validator. Strings are looked
+    up in VALIDATORS and (minimum, maximum) tuples limit the options to
+    choose from. 'can skip' accepts an empty answer without checking the
+    requirements after it. Unknown requirements raise a ValueError here,
+    rather than being ignored when the user answers.
+    """
+    validators = []
+    for i, req in enumerate(requirements):
+        if req == 'can skip':  # user can skip entering some values
+            rest = build_validator(requirements[i + 1:])
+
+            def check_unless_skipped(user_input, rest=rest):
+                if user_input == '':
+                    return user_input
+                return rest(user_input)
+            validators.append(check_unless_skipped)
             break
+        if isinstance(req, tuple):
+            validators.append(check_range(*req))
+        elif req in VALIDATORS:
+            validators.append(VALIDATORS[req])
+        else:
+            raise ValueError(f'Unknown input requirement: {req!r}')
+    if not validators:
+        return lambda user_input: user_input
+    validate = validators[-1]
+    for check in reversed(validators[:-1]):
+        validate = chain_validators(check, validate)
+    return validate
 
-        elif req == 'yes or no':  # for yes or no answers
-            try:
-                user_input = user_input.lower()
-                if len(user_input) > 3:  # random strings are not valid
-                    raise ValueError
-                elif user_input.find('yes') > -1:
-                    user_input = 'yes'
-                elif user_input.find('no') > -1:
-                    user_input = 'no'
-                else:
-                    raise ValueError
-            except ValueError:
-                error_message = "\nPlease enter a 'yes' or 'no' answer."
-                error_message = color_error_message(error_message)
-                break
 
-        # validate that the user has entered exactly three numbers
-        elif req == 'cadence':  # input format required e.g. '2 4 5'
-            user_input, error_message = get_cadence_values(user_input)
-            if error_message:
-                break
+compiled_requirements = {}  # requirement tuple -> check function
+
 
-    return user_input, error_message
+def compile_requirements(requirements_list):
+    """
+    Return a function checking a user_input against requirements_list,
+    with the same (user_input, error_message) result as check_input().
+    Requirement lists are only compiled the first time they are used.
+    """
+    requirements = tuple(requirements_list)
+    check = compiled_requirements.get(requirements)
+    if check is None:
+        validate = build_validator(requirements)
+
+        def check(user_input):
+            result = validate(user_input)
+            if result.__class__ is InvalidInput:
+                return user_input, result.error_message()
+            return result, ''
+        compiled_requirements[requirements] = check
+    return check
+
+
+def check_input(user_input, requirements_list):
+    """
+    This function takes in the user_input and a list of requirements
+    the input must fulfil. Depending on the requirements list, it checks
+    if the input is valid. If it's not valid it returns an appropriate
+    error message for the user, otherwise it returns the processed user_input.
+    """
+    return compile_requirements(requirements_list)(user_input)
 
 
 def get_cadence_values(user_input):
@@ -168,43 +315,30 @@ def get_cadence_values(user_input):
     as they should be entered by the user. If these criteria are not met,
     an appropriate error message is presented.
     """
-    error_message = ''
-    space_free_list = user_input.split()
+    return check_input(user_input, ['cadence'])
 
-    nums = []
-    for element in space_free_list:
-        comma_free_list = element.split(',')
-        for el in comma_free_list:
-            if el:  # ignore empty strings '' separated after the commas
-                try:
-                    el = int(el)
-                except ValueError:
-                    try:
-                        el = float(el)
-                    except ValueError:
-                        error_message = color_error_message(
-                            '\nPlease enter numbers only'
-                        )
-                        return user_input, error_message
-                nums.append(el)
-    if len(nums) != 3:
-        error_message = color_error_message('\nPlease enter three numbers')
-    else:
-        user_input = nums
-
-    return user_input, error_message
 
-
-def get_user_input(message, requirements_list):
+async def get_user_input(session, message, requirements_list):
     """
     This function handles all input requests: print out prompt message to
     user, check if their answer satisfies all requirements by calling the
     check_input function. It keeps prompting the user with an appropriate
     error message until the answer is valid.
+    Answers come from the input source of session (the keyboard, a
+    script in replay mode or a connection to session_server.py), which
+    is awaited, and are recorded in its transcript if there is one.
     """
+    check = compile_requirements(requirements_list)
+    input_source = session.input_source
     while True:
-        user_input = input(get_message(message))
-        user_input, error_message = check_input(user_input, requirements_list)
+        if input_source.framed:
+            prompt = get_message(message)
+        else:  # no separator lines when nobody is watching a terminal
+            prompt = f'\n{message}\n'
+        answer = await input_source.read(prompt)
+        user_input, error_message = check(answer)
+        if session.transcript is not None:
+            session.transcript.record(message, answer, error_message)
         if error_message:
             print(error_message)
         else:
@@ -212,49 +346,100 @@ def get_user_input(message, requirements_list):
     return user_input
 
 
-def create_training_plan():
+async def choose_known_name(session, name, catalogue, kind):
+    """
+    Return the name to use for a name the user entered: the spelling
+    already known if only case or spacing differ, or a known name that
+    is similar (e.g. 'Biceps' for 'Bicep') or that name begins, if the
+    user confirms it. Other names are added to the catalogue.
+    """
+    known = catalogue.match(name, prefixes=True)
+    if known is None or known == name:
+        return catalogue.add(name)
+    if normalise_name(known) != normalise_name(name):
+        message = (f'Did you mean the {kind} "{known}"? Please type '
+                   f'\'yes\' to use it or \'no\' to keep "{name}"')
+        if await get_user_input(session, message, ['yes or no']) == 'no':
+            return catalogue.add(name)
+    print(f'\nUsing the {kind} "{known}".')
+    return known
+
+
+class Session():
+    """
+    This class holds the state of one trainer's session: the training
+    plan and the client it belongs to (if any), where answers come from,
+    the transcript they're recorded to and the journal the plan is saved
+    to (if any), and the names entered so far, on top of the shared
+    common names, to spot other spellings (see name_catalogue.py).
+    The menu functions get the session they work on, so one process can
+    run many sessions at the same time (see session_server.py).
+    """
+    def __init__(self, input_source=None, transcript=None,
+                 plan_journal=None):
+        self.training_plan = TrainingPlan()
+        self.current_client = None
+        self.input_source = input_source or ConsoleInput()
+        self.transcript = transcript
+        self.plan_journal = plan_journal
+        self.group_catalogue = NameCatalogue(base=shared_groups)
+        self.exercise_catalogue = NameCatalogue(base=shared_exercises)
+
+
+async def create_training_plan(session):
     """
     This function creates a new training plan. If the user has already
     created a plan, it asks the user for confirmation to delete previous
     data or to continue modifying current plan.
     """
-    global training_plan
+    plan_journal = session.plan_journal
 
-    if training_plan != {}:  # in case user has already created a training plan
+    if session.training_plan != {}:  # in case user has already created a plan
         message = "You have already created a plan. Do you want to edit it or "\
         "replace it?\nPlease choose an option:\n1. Add exercises to current "\
         "training plan.\n2. Delete current plan and create a new one."
-        user_input = get_user_input(message, ['positive integer', (1, 2)])
+        user_input = await get_user_input(session, message,
+                                          ['positive integer', (1, 2)])
         if user_input == 1:  # continue modifying current plan
             pass
         else:  # delete old plan and create a new one
-            training_plan = {}
+            session.training_plan = TrainingPlan()
+            if plan_journal is not None:
+                plan_journal.save_snapshot(session.training_plan,
+                                           session.current_client)
 
     # construct muscle group objects and/or add exercises by prompting the user
+    training_plan = session.training_plan
     while True:
-        group = get_group(training_plan)
-        group.add_exercise(get_exercise())
+        group = await get_group(session)
+        exercise = await get_exercise(session)
+        group.add_exercise(exercise)
         training_plan[group.name] = group  # add new group to dictionary
+        if plan_journal is not None:  # keep a copy in case the app restarts
+            plan_journal.exercise_added(training_plan, group.name, exercise)
 
         """
         Continue looping to add more exercises until user is done.
         """
         message = "Do you want to add another exercise? "\
         "Please type 'yes' or 'no'"
-        user_input = get_user_input(message, ['yes or no'])
+        user_input = await get_user_input(session, message, ['yes or no'])
         if user_input == 'no':
             break
 
     return
 
 
-def get_group(training_plan):
+async def get_group(session):
     """
     This function constructs a MuscleGroup object which will
     contain the user's data for exercises in a muscle group.
-    If other MuscleGroup objects already exist, ask the user
-    to choose from them or to create a new muscle group.
+    If other MuscleGroup objects already exist in the session's plan,
+    ask the user to choose from them or to create a new muscle group.
     """
+    training_plan = session.training_plan
+    # e.g. a restored plan's groups
+    session.group_catalogue.learn(training_plan)
     if training_plan != {}:  # other MuscleGroup objects already exist
         i = 1
         group_names = []
@@ -265,10 +450,11 @@ def get_group(training_plan):
             i += 1
             group_names.append(group_name)
             message += f'\n{i}. {group_name}'
-        user_input = get_user_input(message, ['positive integer', (1, i)])
+        user_input = await get_user_input(session, message,
+                                          ['positive integer', (1, i)])
         if user_input == 1:  # user chooses to create a new muscle group
             group = MuscleGroup()
-            group.get_name()
+            await group.get_name(session)
             """
             If user enters name of a group that already exists,
             let them know and use it instead
@@ -282,22 +468,22 @@ def get_group(training_plan):
             group = training_plan[group_names[user_input-2]]
     else:  # in case no muscle group exists just create a new one
         group = MuscleGroup()
-        group.get_name()
+        await group.get_name(session)
     return group
 
 
-def get_exercise():
+async def get_exercise(session):
     """
     Create an Exercise object and prompt user to define its data.
     This object will then be added to the already constructed
     MuscleGroup in create_training_plan().
     """
     exercise = Exercise()
-    exercise.get_name()
-    exercise.get_sets()
-    exercise.get_reps_and_weights()
-    exercise.get_cadence()
-    exercise.get_rest()
+    await exercise.get_name(session)
+    await exercise.get_sets(session)
+    await exercise.get_reps_and_weights(session)
+    await exercise.get_cadence(session)
+    await exercise.get_rest(session)
     return exercise
 
 
@@ -307,283 +493,776 @@ class MuscleGroup():
     Exercise objects to contain data for the rows of the training table
     which belong to a given muscle group. This class also contains methods
     to calculate the metrics needed for each muscle group from all contained
-    row data.
+    row data. The metrics, and the columns the group's exercises need in
+    the training table, are kept up to date as exercises are added, so
+    reading them doesn't go through all the sets again.
     """
+    __slots__ = ('name', 'exercises',  # no per-object __dict__
+                 'volume', 'tut', 'exercise_time', 'total_reps', 'rest_time',
+                 'most_sets', 'has_cadence', 'has_rest', 'version')
+
     def __init__(self):
         self.name = ''
         self.exercises = {}  # each object contains a dictionary of exercises
+        self.version = 0  # increased on every change of the exercises
+        self.reset_metrics()
 
-    def get_name(self):
+    async def get_name(self, session):
         message = 'Enter name of the muscle group\n(e.g. Biceps, Chest, Abs)'
-        self.name = get_user_input(message, ['name'])
+        name = await get_user_input(session, message, ['name'])
+        self.name = await choose_known_name(
+            session, name, session.group_catalogue, 'muscle group')
 
     def add_exercise(self, exercise):
-        self.exercises[exercise.name] = exercise
+        """
+        Add exercise to the group, or replace the exercise with the same
+        name. A new exercise only adds its own sets to the running totals,
+        a replaced one makes the totals be calculated again.
+        """
+        if exercise.name in self.exercises:
+            self.exercises[exercise.name] = exercise
+            self.update_metrics()
+        else:
+            self.exercises[exercise.name] = exercise
+            self.add_to_metrics(exercise)
+            self.version += 1
+
+    def remove_exercise(self, exercise_name):
+        del self.exercises[exercise_name]
+        self.update_metrics()
+
+    def reset_metrics(self):
+        self.volume = 0
+        # 'time under tension': time where muscles are under tension
+        self.tut = 0
+        self.exercise_time = 0  # total time of exercise
+        self.total_reps = 0  # total number of repetitions so far
+        self.rest_time = 0  # time of resting after each exercises
+        # layout of the group's rows in the training table
+        self.most_sets = 0  # the highest number of sets
+        self.has_cadence = False  # whether any exercise has a cadence
+        self.has_rest = False  # whether any exercise has a rest time
+
+    def add_to_metrics(self, exercise):
+        """
+        Add the sets of exercise (the last one of the group) to the
+        running totals.
+        """
+        for reps, weight in zip(exercise.reps, exercise.weights):
+            self.volume += reps*weight
+            self.total_reps += reps
+        if exercise.cadence is not None:
+            self.tut += self.total_reps * (exercise.cadence[0] +
+                                           exercise.cadence[2])
+            self.exercise_time = self.tut + (self.total_reps *
+                                             exercise.cadence[1])
+        if exercise.rest is not None:
+            self.rest_time += exercise.rest
+        if exercise.sets > self.most_sets:
+            self.most_sets = exercise.sets
+        self.has_cadence |= exercise.cadence is not None
+        self.has_rest |= exercise.rest is not None
+
+    def update_metrics(self):
+        """
+        Calculate the running totals again from all exercises, e.g. after
+        an exercise was edited or removed.
+        """
+        self.reset_metrics()
+        for exercise in self.exercises.values():
+            self.add_to_metrics(exercise)
+        self.version += 1
 
     def calc_metrics(self):
         """
-        A method to calculate volume of the muscle group.
+        A method to return volume, time under tension and total duration
+        of training of the muscle group.
         """
-        volume = 0
-        tut = 0  # 'time under tension': time where muscles are under tension
-        exercise_time = 0  # total time of exercise
-        total_reps = 0  # to get total number of repetitions in an exercise
-        rest_time = 0  # time of resting after each exercises
-        for exercise in self.exercises.values():
-            for rnw in exercise.reps_and_weights:
-                volume += rnw[0]*rnw[1]
-                total_reps += rnw[0]
-            if exercise.cadence != []:
-                tut += total_reps * (exercise.cadence[0] + exercise.cadence[2])
-                exercise_time = tut + (total_reps * exercise.cadence[1])
-            if exercise.rest != '':
-                rest_time += exercise.rest
         # total duration of training in this group
-        group_time = exercise_time + rest_time
+        group_time = self.exercise_time + self.rest_time
+
+        return self.volume, self.tut, group_time
+
+    def check_metrics(self):
+        """
+        Return True if the running totals are equal to the metrics
+        calculated again from all exercises.
+        """
+        metrics = self.calc_metrics()
+        fresh = MuscleGroup()
+        fresh.exercises = self.exercises
+        fresh.update_metrics()
+        return metrics == fresh.calc_metrics()
+
 
-        return volume, tut, group_time
+class TableSchema():
+    """
+    This class describes the columns of the training table: the highest
+    number of sets, whether the cadence and rest columns are needed and
+    the header row for google sheet.
+    """
+    __slots__ = ('most_sets', 'cadence', 'rest', 'headers')
+
+    def __init__(self, most_sets, cadence, rest):
+        self.most_sets = most_sets
+        self.cadence = cadence
+        self.rest = rest
+
+        """
+        Create the title row for the table.
+        We add the 'cadence' and 'rest' columns if they exist in any
+        exercise.
+        """
+        self.headers = ["Muscle\nGroup", "Exercise", "Sets"]
+        # Add all Reps and Weight columns
+        for set_number in range(1, most_sets+1):
+            self.headers.extend(
+                [f'Set{set_number}\nReps', f'Set{set_number}\nWeight\n(kg)']
+                )
+        # add cadence and rest columns if entered by the user
+        if cadence:
+            self.headers.append('Cadence\n(s)')
+        if rest:
+            self.headers.append('Rest\n(s)')
+
+    @classmethod
+    def from_groups(cls, groups):
+        """
+        Return the schema of a table with the exercises of groups,
+        using the layout each MuscleGroup keeps up to date.
+        """
+        most_sets = 0
+        cadence = False
+        rest = False
+        for group in groups:
+            most_sets = max(most_sets, group.most_sets)
+            cadence |= group.has_cadence
+            rest |= group.has_rest
+        return cls(most_sets, cadence, rest)
+
+
+class TrainingPlan(dict):
+    """
+    This class is the dictionary of MuscleGroup objects (by name) that
+    makes up a training plan. It keeps the schema of the training table,
+    so it is only worked out again after the plan changed.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._schema = None
+        self._schema_key = None
+
+    def changes_key(self):
+        """
+        Return a value that changes whenever a group is added, removed
+        or modified.
+        """
+        return tuple((id(group), group.version) for group in self.values())
+
+    def table_schema(self):
+        key = self.changes_key()
+        if self._schema is None or key != self._schema_key:
+            self._schema = TableSchema.from_groups(self.values())
+            self._schema_key = key
+        return self._schema
+
+
+def table_schema(training_plan):
+    """
+    Return the TableSchema of training_plan, the cached one if it's
+    a TrainingPlan.
+    """
+    if isinstance(training_plan, TrainingPlan):
+        return training_plan.table_schema()
+    return TableSchema.from_groups(training_plan.values())
+
+
+"""
+The most repetitions of a set. Reps are kept in an array('i'), which
+can't hold numbers above 2**31 - 1, so larger answers are rejected when
+they are entered rather than when they are added to the array.
+"""
+MAX_REPS = 10000
+REPS_REQUIREMENTS = ['positive integer', (1, MAX_REPS)]
 
 
 class Exercise():
     """
     This class defines objects which represent one row of the training plan.
     Each Object contains the name of the exercise and its relevant metrics.
+    Reps and weights of the sets are kept in compact typed arrays, and
+    values the user skipped (cadence, rest) are None.
     """
+    __slots__ = ('name', 'sets', 'reps', 'weights', 'cadence', 'rest')
+
     def __init__(self):
         self.name = ''
-        self.sets = ''
-        self.reps_and_weights = []
-        self.cadence = []
-        self.rest = ''
+        self.sets = None
+        self.reps = array('i')  # repetitions of each set
+        self.weights = array('d')  # weight in kg of each set
+        self.cadence = None  # (contraction, pause, extension) in seconds
+        self.rest = None  # resting duration after each set in seconds
+
+    @property
+    def reps_and_weights(self):
+        """
+        The [reps, weight] pair of each set, as a new list.
+        """
+        return [[reps, weight]
+                for reps, weight in zip(self.reps, self.weights)]
 
-    def get_name(self):
+    @reps_and_weights.setter
+    def reps_and_weights(self, reps_and_weights):
+        self.reps = array('i', [rnw[0] for rnw in reps_and_weights])
+        self.weights = array('d', [rnw[1] for rnw in reps_and_weights])
+
+    def add_set(self, reps, weight):
+        self.reps.append(reps)
+        self.weights.append(weight)
+
+    async def get_name(self, session):
         message = 'Enter name of the exercise\n'\
         '(e.g. Curls, Front Squats, French press)'
-        self.name = get_user_input(message, ['name'])
+        name = await get_user_input(session, message, ['name'])
+        self.name = await choose_known_name(
+            session, name, session.exercise_catalogue, 'exercise')
 
-    def get_sets(self):
+    async def get_sets(self, session):
         message = 'How many sets?'
-        self.sets = get_user_input(message, ['positive integer', 'minimum 1'])
+        self.sets = await get_user_input(session, message,
+                                         ['positive integer', 'minimum 1'])
 
-    def get_reps_and_weights(self):
+    async def get_reps_and_weights(self, session):
         """
         Get data for repetitions and weight for each set
         """
         for set in range(self.sets):
             message = f'How many repetitions (Reps) in set Nr. {set+1}'
-            reps = get_user_input(message, ['positive integer', 'minimum 1'])
+            reps = await get_user_input(session, message, REPS_REQUIREMENTS)
             message = f'Enter weight in kg for set Nr. {set+1}'
-            weight = get_user_input(message, ['positive float'])
-            self.reps_and_weights.append([reps, weight])
+            weight = await get_user_input(session, message,
+                                          ['positive float'])
+            self.add_set(reps, weight)
 
     # get the cadence values (a set of three numbers) in seconds
-    def get_cadence(self):
+    async def get_cadence(self, session):
         message = 'Cadence (in seconds): enter the duration of the '\
         'contraction, pause and extension\n of the muscle in that '\
         'order as comma (or space) separated numbers:\ne.g. 2, 0, 4'\
         '\n\nYou can skip this value by pressing enter instead.'
-        cadence = get_user_input(message, ['can skip', 'cadence'])
+        cadence = await get_user_input(session, message,
+                                       ['can skip', 'cadence'])
         if cadence != '':
-            self.cadence = cadence
+            self.cadence = tuple(cadence)
 
     # Get the resting duration after the exercise set in seconds
-    def get_rest(self):
+    async def get_rest(self, session):
         message = 'Please enter the resting duration after each set '\
         'in seconds?\n\nYou can skip this value by pressing enter instead.'
-        rest = get_user_input(message, ['can skip', 'positive integer'])
+        rest = await get_user_input(session, message,
+                                    ['can skip', 'positive integer'])
         if rest != '':
             self.rest = rest
 
 
-def print_training_plan():
+@instruments.timed('build.training_table')
+def build_training_table(training_plan):
     """
-    This function fetches all exercise data from all muscle groups,
-    orders them into lists and prints them out to the terminal as a
-    table using the tabulate library.
-    It also saves them into google sheet for better usability.
+    This function fetches all exercise data from all muscle groups
+    and orders them into the rows for google sheet (header row
+    included), in a single pass over the exercises. The terminal table
+    shows a part of these columns.
     """
-    global training_plan
-
-    most_sets = 0  # register the highest number of sets
-    cadence = False
-    rest = False
     """
-    In this cascading for loop we only count the highest number of
-    sets and register whether cadence and rest variables were entered
-    by the user. We will use this information to set equal row lengths
-    for all exercises.
+    The schema tells the highest number of sets and whether cadence and
+    rest variables were entered by the user. We will use this information
+    to set equal row lengths for all exercises.
     """
-    for group in training_plan.values():
-        for exercise in group.exercises.values():
-            if exercise.sets > most_sets:  # get the highest number of sets
-                most_sets = exercise.sets
-            if exercise.cadence != []:
-                cadence = True
-            if exercise.rest != '':
-                rest = True
-
-    """
-    Next we create the title row for the table. Due to the 80 character length
-    restriction on Heroku terminal, we will only print first Reps and Weights
-    columns to the terminal, while printing the rest of them to google sheet.
-    We add the 'cadence' and 'rest' columns if they exist in any exercise.
-    """
-    # clear worksheet on google sheet
-    SHEET.worksheet('Training Table').clear()
-    # header row for google sheet
-    sheet_headers = ["Muscle\nGroup", "Exercise", "Sets"]
-    # header row for terminal table
-    table_headers = ["Muscle\nGroup", "Exercise", "Sets"]
-
-    # Add all Reps and Weight columns to sheet but not to terminal table
-    for set_number in range(1, most_sets+1):
-        sheet_headers.extend(
-            [f'Set{set_number}\nReps', f'Set{set_number}\nWeight\n(kg)']
-            )
-    # add cadence and rest columns if entered by the user
-    if cadence:
-        sheet_headers.append('Cadence\n(s)')
-        table_headers.append('Cadence\n(s)')
-    if rest:
-        sheet_headers.append('Rest\n(s)')
-        table_headers.append('Rest\n(s)')
-
-    # add row to google sheet
-    SHEET.worksheet('Training Table').append_row(sheet_headers)
+    schema = table_schema(training_plan)
+    most_sets = schema.most_sets
+    cadence = schema.cadence
+    rest = schema.rest
 
     """
     Now we can populate the rows of the table.
     Where a value is missing we set the cell to '--'.
+    All sheet rows are collected first and written to google sheet
+    together in one request.
     """
+    sheet_rows = [list(schema.headers)]
     sheet_row = []
-    table_row = []
-    table_rows = []
     for group in training_plan.values():
         for exercise in group.exercises.values():
             sheet_row.extend([group.name, exercise.name, exercise.sets])
-            table_row.extend([group.name, exercise.name, exercise.sets])
             # Add all Reps and Weight columns to sheet
-            for reps_and_weights in exercise.reps_and_weights:
-                sheet_row.extend(reps_and_weights)
+            for reps, weight in zip(exercise.reps, exercise.weights):
+                sheet_row.extend([reps, weight])
             # In case of empty values, fill cells with '--'
             for set_number in range(exercise.sets, most_sets):
                 sheet_row.extend(['--', '--'])
             if cadence:
-                if exercise.cadence:
+                if exercise.cadence is not None:
                     cadence_str = (f'{exercise.cadence[0]}, '
                                    f'{exercise.cadence[1]}, '
                                    f'{exercise.cadence[2]}')
                     sheet_row.append(cadence_str)
-                    table_row.append(cadence_str)
                 else:
                     sheet_row.append('--')
-                    table_row.append('--')
             if rest:
-                if exercise.rest:
+                if exercise.rest is not None:
                     sheet_row.append(exercise.rest)
-                    table_row.append(exercise.rest)
                 else:
                     sheet_row.append('--')
-                    table_row.append('--')
-            SHEET.worksheet('Training Table').append_row(sheet_row)
-            table_rows.append(table_row)
+            sheet_rows.append(sheet_row)
             sheet_row = []  # reset sheet_row for the next exercise
-            table_row = []  # reset table_row for the next exercise
 
-    # create table for terminal
-    table = tabulate(table_rows, headers=table_headers,
-                     tablefmt="fancy_grid", stralign=("center"),
-                     numalign=("center"))
-    print(f'\n{table}')
+    return sheet_rows
+
+
+@instruments.timed('render.table_pages')
+def print_table_pages(headers, rows, key_columns, column_units):
+    """
+    Print a table with the streaming renderer of table_render.py:
+    lines are printed as soon as they are drawn, and columns that don't
+    fit in the terminal are printed on further pages.
+    """
+    for page_number, page_count, lines in render_pages(
+        headers, rows, key_columns, column_units
+    ):
+        if page_count > 1:
+            print(f'\nPage {page_number} of {page_count}')
+        print()
+        for line in lines:
+            print(line)
+
+
+async def print_training_plan(session):
+    """
+    This function prints the training plan of session out to the
+    terminal as a table. Due to the 80 character length restriction on
+    Heroku terminal, the Reps and Weight columns are only printed if the
+    user asks for them, on pages of their own.
+    It also saves it into google sheet for better usability.
+    """
+    sheet_rows = build_training_table(session.training_plan)
+
+    # hand the rows to the background worker to save them to google sheet
+    worksheet = worksheet_title('Training Table', session.current_client)
+    sync_worker.submit(worksheet, sheet_rows)
+
+    headers = sheet_rows[0]
+    rows = sheet_rows[1:]
+    # columns 3 and up to the cadence/rest columns are the sets columns
+    set_columns = [i for i, header in enumerate(headers)
+                   if header.startswith('Set') and header != 'Sets']
+    other_columns = [i for i in range(2, len(headers))
+                     if i not in set_columns]
+
+    # create table for terminal, muscle group and exercise on every page
+    print_table_pages(headers, rows, [0, 1],
+                      [[i] for i in other_columns])
 
     # notify user that not all data were printed to the terminal
     print(f'\nThis table does not shows Reps and Weight data due '\
     f'to display width limits.\nYou can view the complete table in '\
-    f'google sheet:\n{sheet_tinyurl} -> worksheet: "Training Table"')
+    f'google sheet:\n{sheet_tinyurl} -> worksheet: "{worksheet}"')
+
+    if set_columns:
+        message = ("Do you want to see the Reps and Weight columns here "
+                   "page by page?\nPlease type 'yes' or 'no'")
+        user_input = await get_user_input(session, message, ['yes or no'])
+        if user_input == 'yes':
+            # keep the reps and weight of a set on the same page
+            set_units = [set_columns[i:i+2]
+                         for i in range(0, len(set_columns), 2)]
+            print_table_pages(headers, rows, [0, 1], set_units)
 
     return
 
 
-def print_calculated_values():
+"""
+The header row of the metrics table, the same on the terminal and in
+google sheet.
+"""
+METRICS_HEADERS = ["Muscle\nGroup",
+                   "Volume\n(kg)",
+                   "Time Under\nTension (s)"]
+
+
+def build_metrics_table(training_plan):
     """
-    This function calculates the metrics of each muscle group
-    and prints them out in a table to the terminal. A copy is
-    also saved to google sheet.
+    This function calculates the metrics of each muscle group and
+    orders them into lists: the rows for google sheet (header row
+    included), the headers and rows of the terminal table and the
+    total duration of the training session.
     """
-    worksheet = 'Training Metrics'
-    SHEET.worksheet(worksheet).clear()  # clear worksheet
-    sheet_headers = ["Muscle\nGroup",
-                     "Volume\n(kg)",
-                     "Time Under\nTension (s)"]
-    table_headers = ["Muscle\nGroup",
-                     "Volume\n(kg)",
-                     "Time Under\nTension (s)"]
-    SHEET.worksheet(worksheet).append_row(sheet_headers)
-
-    sheet_row = []
+    sheet_rows = [list(METRICS_HEADERS)]
+    table_headers = METRICS_HEADERS
     table_rows = []
     tot_session_time = 0  # total duration of training session
     for group in training_plan.values():
         volume, tut, group_time = group.calc_metrics()
         tot_session_time += group_time
-        sheet_row.extend([group.name, volume, tut])
+        sheet_rows.append([group.name, volume, tut])
         table_rows.append([group.name, volume, tut])
-        SHEET.worksheet(worksheet).append_row(sheet_row)
-        sheet_row = []  # reset sheet_row for next row in google sheet
-    table = tabulate(table_rows, headers=table_headers,
-                     tablefmt="fancy_grid", stralign=("center"),
-                     numalign=("center"))
-    print(f'\n{table}')
+    return sheet_rows, table_headers, table_rows, tot_session_time
+
+
+def print_calculated_values(session):
+    """
+    This function prints the metrics of each muscle group of the
+    session's plan out in a table to the terminal. A copy is also saved
+    to google sheet.
+    """
+    worksheet = worksheet_title('Training Metrics', session.current_client)
+    sheet_rows, table_headers, table_rows, tot_session_time = \
+        build_metrics_table(session.training_plan)
+    # hand the rows to the background worker to save them to google sheet
+    sync_worker.submit(worksheet, sheet_rows)
+    with instruments.timer('render.metrics_table'):
+        table = tabulate(table_rows, headers=table_headers,
+                         tablefmt="fancy_grid", stralign=("center"),
+                         numalign=("center"))
+        print(f'\n{table}')
     print(f'\nTotal Duration Of Training: {tot_session_time}(s)')
     print(f'\nYou can also view this table in google sheet:\n'\
-    f'{sheet_tinyurl} -> worksheet: "Training Metrics"')
+    f'{sheet_tinyurl} -> worksheet: "{worksheet}"')
     return
 
 
-def main_menu():
+async def schedule_training_week(session):
+    """
+    This function spreads the muscle groups of the session's plan over
+    the training days of a week, so the longest training day is as
+    short as possible, and prints the schedule out in a table to the
+    terminal. A copy is also saved to google sheet.
+    """
+    from week_scheduler import (schedule_week, group_durations,
+                                spread_days, render_schedule)
+
+    message = 'How many training days are there in the week? (1 to 7)'
+    day_count = await get_user_input(session, message,
+                                     ['positive integer', (1, 7)])
+    message = ('How many times a week should each muscle group be '
+               f'trained? (1 to {day_count})')
+    times = await get_user_input(session, message,
+                                 ['positive integer', (1, day_count)])
+    rest_days = 1
+    if times > 1:
+        message = ('How many rest days should there be between the '
+                   'sessions of a muscle group?\n\nYou can skip this value '
+                   'by pressing enter instead (1 day).')
+        rest = await get_user_input(session, message,
+                                    ['can skip', 'positive integer'])
+        if rest != '':
+            rest_days = rest
+    message = ('What is the longest a training day can be, in minutes?'
+               '\n\nYou can skip this value by pressing enter instead.')
+    max_minutes = await get_user_input(session, message,
+                                       ['can skip', 'positive integer'])
+    max_session = None if max_minutes == '' else max_minutes * 60
+
+    training_plan = session.training_plan
+    with instruments.timer('schedule.week', groups=len(training_plan)):
+        schedule = schedule_week(group_durations(training_plan),
+                                 spread_days(day_count), times, rest_days,
+                                 max_session)
+    sheet_rows = schedule.build_table()
+    # hand the rows to the background worker to save them to google sheet
+    worksheet = worksheet_title('Weekly Schedule', session.current_client)
+    sync_worker.submit(worksheet, sheet_rows)
+    print(f'\n{render_schedule(sheet_rows)}')
+    print(f'\n{schedule.message()}')
+    print(f'\nYou can also view this table in google sheet:\n'
+          f'{sheet_tinyurl} -> worksheet: "{worksheet}"')
+
+
+async def manage_client_plans(session):
+    """
+    This function lets the user save the session's plan for a client or
+    load one of the client's saved plans to keep editing it, or the
+    plan last saved to the client's training table in google sheet.
+    Each client's tables are saved to their own worksheets in google
+    sheet.
+    """
+    from plan_store import PlanStore  # only opened when needed
+
+    plan_journal = session.plan_journal
+    message = "Enter the client's name"
+    client = await get_user_input(session, message, ['not empty'])
+    store = PlanStore()
+    try:
+        plan_ids = store.plans(client)
+        message = ('Please choose an option:\n1. Save current plan\n'
+                   f'2. Load the training table of {client} from the sheet')
+        if plan_ids:
+            message += f'\n3. Load one of the plans of {client}'
+        user_input = await get_user_input(
+            session, message, ['positive integer', (1, 3 if plan_ids else 2)]
+        )
+        if user_input == 2:
+            from plan_import import import_worksheet
+
+            worksheet = worksheet_title('Training Table', client)
+            loaded_plan = TrainingPlan()
+            # waits for the uploads still queued and for the sheet, on a
+            # thread so the other sessions of session_server.py go on
+            imported, skipped = await asyncio.to_thread(
+                import_worksheet, worksheet, loaded_plan,
+                lambda error: print(color_error_message(error)), print,
+                session.group_catalogue, session.exercise_catalogue)
+            if not imported:
+                message = f'\nSorry, no plan was found in "{worksheet}"!'
+                print(color_error_message(message))
+                return
+            session.training_plan = loaded_plan
+            if plan_journal is not None:
+                plan_journal.save_snapshot(loaded_plan, client)
+            print(f'\n{imported} exercises of {client} loaded from '
+                  f'"{worksheet}", you can continue editing them by '
+                  f'choosing option 1.')
+            if skipped:
+                print(f'{skipped} rows with invalid values were skipped.')
+        elif user_input == 1:
+            training_plan = session.training_plan
+            if training_plan == {}:
+                message = "\nSorry, you didn't create a training plan yet!"
+                print(color_error_message(message))
+                return
+            message = 'Enter a name for this plan\n(e.g. Week 1, Strength)'
+            plan_id = await get_user_input(session, message, ['name'])
+            store.save_plan(client, plan_id, training_plan)
+            print(f'\nPlan "{plan_id}" saved for {client}.')
+            if (plan_journal is not None
+                    and client != session.current_client):
+                plan_journal.client_changed(training_plan, client)
+        else:
+            message = 'Choose the plan to load:'
+            for i, plan_id in enumerate(plan_ids, 1):
+                message += f'\n{i}. {plan_id}'
+            user_input = await get_user_input(
+                session, message, ['positive integer', (1, len(plan_ids))]
+            )
+            plan_id = plan_ids[user_input-1]
+            session.training_plan = store.load_plan(client, plan_id)
+            if plan_journal is not None:
+                plan_journal.save_snapshot(session.training_plan, client)
+            print(f'\nPlan "{plan_id}" of {client} loaded, you can '
+                  f'continue editing it by choosing option 1.')
+        session.current_client = client
+    finally:
+        store.close()
+
+
+async def main_menu(session):
     """
     This function presents the user with the main menu options
     to choose from. It presents them with the option to create a
     training plan, print the training plan or calculate the metrics.
     After each option that's executed the user is brought back
-    to the main menu again.
+    to the main menu again, with a summary of the time spent and the
+    API calls made if instruments.show_summary is on.
     """
     while True:
-        global training_plan
-
-        message = main_menu_message()  # print main menu options to the user
-        # get user's choice as a number: 1, 2 or 3
-        user_input = get_user_input(message, ['positive integer', (1, 3)])
-        if user_input == 1:  # option create training plan
-            create_training_plan()
-            print('\nThank you for your participation!')
-        elif user_input == 2:  # option print out current plan
-            if training_plan == {}:  # in case no plan has been created
-                message = "\nSorry, you didn't create a training plan yet!"
-                print(color_error_message(message))
-            else:
-                print_training_plan()
-        elif user_input == 3:  # option print out training metrics
-            if training_plan == {}:  # in case no plan has been created
-                message = "\nSorry, you didn't create a training plan yet!"
-                print(color_error_message(message))
-            else:
-                print_calculated_values()
-        input('\nPress Enter to return to main menu.\n')
+        # print main menu options to the user
+        message = main_menu_message(session)
+        # get user's choice as a number from 1 to 5
+        user_input = await get_user_input(session, message,
+                                          ['positive integer', (1, 5)])
+        before_action = instruments.snapshot()
+        with instruments.timer(f'menu.option {user_input}'):
+            await menu_action(session, user_input)
+        if instruments.show_summary:
+            print(f'\n{instruments.summary(since=before_action)}')
+        await session.input_source.read(
+            '\nPress Enter to return to main menu.\n')
+
+
+async def menu_action(session, user_input):
+    """
+    Run the main menu option user_input in session.
+    """
+    training_plan = session.training_plan
+    if user_input == 1:  # option create training plan
+        await create_training_plan(session)
+        print('\nThank you for your participation!')
+    elif user_input == 2:  # option print out current plan
+        if training_plan == {}:  # in case no plan has been created
+            message = "\nSorry, you didn't create a training plan yet!"
+            print(color_error_message(message))
+        else:
+            await print_training_plan(session)
+    elif user_input == 3:  # option print out training metrics
+        if training_plan == {}:  # in case no plan has been created
+            message = "\nSorry, you didn't create a training plan yet!"
+            print(color_error_message(message))
+        else:
+            print_calculated_values(session)
+    elif user_input == 4:  # option save or load a client's plan
+        await manage_client_plans(session)
+    elif user_input == 5:  # option spread the plan over the week
+        if training_plan == {}:  # in case no plan has been created
+            message = "\nSorry, you didn't create a training plan yet!"
+            print(color_error_message(message))
+        else:
+            await schedule_training_week(session)
+
+
+def run_until_done(coroutine):
+    """
+    Run coroutine on an event loop of its own and return its result.
+    Unlike asyncio.run(), Ctrl-C raises KeyboardInterrupt at once, even
+    while ConsoleInput waits for the keyboard.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
 
 
-def main():
+def run_scripted_session(lines):
+    """
+    Run a whole session without printing the welcome message, answering
+    the prompts with lines (one answer per line, see ScriptedInput), and
+    return the training plan it created. Used to drive many synthetic
+    sessions, e.g. for load tests of the sheet sync.
+    """
+    session = Session(ScriptedInput(lines, echo=False))
+    try:
+        run_until_done(main_menu(session))
+    except EOFError:  # the script has no more answers
+        pass
+    return session.training_plan
+
+
+def learn_stored_names(session):
+    """
+    Add the names of the groups and exercises of all plans in the plan
+    store to the catalogues of session, if there is a plan store.
+    """
+    from plan_store import PlanStore, STORE_FILE
+
+    if not os.path.exists(STORE_FILE):
+        return
+    store = PlanStore()
+    try:
+        session.group_catalogue.learn(store.group_names())
+        session.exercise_catalogue.learn(store.exercise_names())
+    finally:
+        store.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Design training plans for your customers.'
+    )
+    parser.add_argument('--replay', metavar='FILE',
+                        help="answer the prompts from FILE, one answer per "
+                             "line ('-' reads them from stdin)")
+    parser.add_argument('--quiet', action='store_true',
+                        help="don't echo prompts and answers in replay mode")
+    parser.add_argument('--transcript', metavar='FILE',
+                        help='record every prompt, answer and error to FILE '
+                             'as JSON lines')
+    parser.add_argument('--session', metavar='ID',
+                        help="keep the plan in a local journal under ID and "
+                             "carry on with it when started with the same "
+                             "ID, e.g. one ID per browser tab")
+    parser.add_argument('--new', action='store_true',
+                        help="start with an empty plan instead of the last "
+                             "plan of the session")
+    parser.add_argument('--stats', action='store_true',
+                        help='print the time spent and API calls made after '
+                             'each menu option')
+    parser.add_argument('--log', metavar='FILE',
+                        help='log every sheet call, rendering and retry to '
+                             'FILE as JSON lines')
+    return parser.parse_args(argv)
+
+
+def exit_on_signal(signum, frame):
+    """
+    Leave the app like on Ctrl-D when the web terminal is closed (it
+    sends SIGTERM, and the pty SIGHUP), so the journal is closed and
+    the uploads still queued are written before exiting (see the atexit
+    flush in sheet_sync.py), which the default handlers skip.
+    """
+    raise SystemExit(128 + signum)
+
+
+def main(argv=None):
     """
     Print the welcome message and present the
-    main menu options to the user.
+    main menu options to the user. With a session id (and unless answers
+    are replayed), the last plan of the session is restored from its
+    local journal, and every change is recorded there (see
+    plan_journal.py). Without one, the app starts with an empty plan.
     """
+    args = parse_args(argv)
+    session = Session()
+    if args.replay:
+        session.input_source = ScriptedInput.from_file(args.replay,
+                                                       echo=not args.quiet)
+    if args.transcript:
+        session.transcript = Transcript.open(args.transcript)
+    instruments.configure_from_environment()
+    if args.stats:
+        instruments.show_summary = True
+    if args.log:
+        instruments.open_log(args.log)
+
     print(welcome_message())
-    main_menu()
+    if args.session and not args.replay:
+        from plan_journal import PlanJournal  # imports run, see below
+
+        plan_journal = PlanJournal.for_session(args.session)
+        if plan_journal.lock():
+            session.plan_journal = plan_journal
+        else:
+            message = ('The plan of this session is open in another '
+                       'terminal, changes made here will not be kept.')
+            print(color_error_message(message))
+    plan_journal = session.plan_journal
+    if plan_journal is not None:
+        restored_plan, client = plan_journal.restore()
+        if args.new or restored_plan is None:
+            plan_journal.save_snapshot(session.training_plan)
+        else:
+            session.training_plan = restored_plan
+            session.current_client = client
+            exercise_count = sum(len(group.exercises)
+                                 for group in restored_plan.values())
+            print(f'Restored the plan of your last session '
+                  f'({exercise_count} exercises), start with --new to '
+                  f'discard it.')
+    if not args.replay:
+        learn_stored_names(session)
+    for name in ('SIGTERM', 'SIGHUP'):  # no SIGHUP on windows
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), exit_on_signal)
+    try:
+        run_until_done(main_menu(session))
+    except (KeyboardInterrupt, EOFError):
+        # make sure the latest tables reach google sheet before leaving
+        print('\nSaving pending changes to google sheet...')
+        sync_worker.flush()
+    finally:
+        if session.transcript is not None:
+            session.transcript.close()
+        if plan_journal is not None:
+            plan_journal.close()
+            plan_journal.unlock()
+        instruments.close_log()
 
 
 """
-Define the training plan as a global variable for all functions
-to access independently, then call the main function.
+Call the main function when run as a script (importing the module
+doesn't start a session). The state of a session is kept in a Session
+object rather than in globals, so session_server.py can run many
+sessions in one process.
 """
-training_plan = {}
-main()
+if __name__ == '__main__':
+    # modules importing run (e.g. plan_store) use this module's classes
+    sys.modules.setdefault('run', sys.modules[__name__])
+    main()
@@ -0,0 +1,87 @@
+"""
+Where the answers to the app's prompts come from, and where they are
+recorded.
+
+ConsoleInput reads what the user types, ScriptedInput replays answers
+from a script (a file or a stdin pipe, one answer per line) so whole
+sessions can run without anyone at the keyboard, e.g. for load tests
+and regression benchmarks. A Transcript records every prompt, answer
+and validation error of a session as JSON lines.
+
+Input sources are read with a coroutine, read(prompt), so the sessions
+of session_server.py can wait for their answers on the event loop.
+"""
+import json
+import sys
+
+
+class ConsoleInput():
+    """
+    This class reads the answers typed by the user. Prompts are framed
+    with separator lines only when a person is at a terminal. The
+    console is the only session of its process, so it simply waits for
+    input() (and Ctrl-C still interrupts it).
+    """
+    def __init__(self):
+        self.framed = sys.stdin.isatty()
+
+    async def read(self, prompt):
+        return input(prompt)
+
+
+class ScriptedInput():
+    """
+    This class replays answers from lines of text, one answer per line.
+    Empty lines are answers too (e.g. to skip the cadence), lines
+    starting with '#' are comments. Once the answers run out, EOFError
+    is raised like input() does at the end of a pipe.
+    """
+    framed = False
+
+    def __init__(self, lines, echo=True):
+        self.lines = iter(lines)
+        self.echo = echo  # print prompts and answers like a console would
+        self.answers = 0  # number of answers read so far
+
+    @classmethod
+    def from_file(cls, path, echo=True):
+        """
+        Return a ScriptedInput reading the file at path, or stdin if
+        path is '-'.
+        """
+        if path == '-':
+            return cls(sys.stdin, echo)
+        with open(path, encoding='utf-8') as file:
+            return cls(file.read().splitlines(), echo)
+
+    async def read(self, prompt):
+        for line in self.lines:
+            line = line.rstrip('\r\n')
+            if line.startswith('#'):
+                continue
+            self.answers += 1
+            if self.echo:
+                print(f'{prompt}{line}')
+            return line
+        raise EOFError('no more answers in the script')
+
+
+class Transcript():
+    """
+    This class writes one JSON object per prompt of a session to file:
+    the prompt, the answer and the validation error if any.
+    """
+    def __init__(self, file):
+        self.file = file
+
+    @classmethod
+    def open(cls, path):
+        return cls(open(path, 'w', encoding='utf-8'))
+
+    def record(self, prompt, answer, error=''):
+        self.file.write(json.dumps(
+            {'prompt': prompt, 'answer': answer, 'error': error}
+        ) + '\n')
+
+    def close(self):
+        self.file.close()
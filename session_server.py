@@ -0,0 +1,199 @@
+"""
+Serve many trainers from one python process.
+
+Every TCP connection gets a session of its own: the lines received are
+the answers to the prompts and everything the session prints is sent
+back, so any terminal can connect, e.g. 'nc localhost 8023'.
+
+Each session is a run.Session (its plan, client and name catalogues)
+driven by run.main_menu() as a task of the event loop: the answers are
+awaited from an input source fed by the connection, so a waiting
+session costs no thread. Slow calls, like loading a plan from the
+sheet, run on a thread so the other sessions go on. What a session
+prints is routed to its connection by a sys.stdout replacement.
+
+Everything run.py imports is shared by the sessions, in particular
+sheet_sync's backend and SyncWorker: google is authorised once and all
+sessions' tables are uploaded by the same worker, within the same rate
+limits (see sheet_retry.py). Sessions should choose a client (option 4)
+so they write to their own worksheets.
+
+Usage: python session_server.py [--host HOST] [--port PORT]
+                                [--max-sessions N]
+"""
+import argparse
+import asyncio
+import contextvars
+import io
+import os
+import sys
+
+import run
+
+
+HOST = '127.0.0.1'
+PORT = 8023
+MAX_SESSIONS = 200
+
+# write function of the connection of the session printing
+session_output = contextvars.ContextVar('session_output', default=None)
+
+
+class SessionOutput(io.TextIOBase):
+    """
+    This class replaces sys.stdout: text printed by a session goes to
+    its connection, anything else to the real stdout.
+    """
+    def __init__(self, stdout):
+        self.stdout = stdout
+
+    def write(self, text):
+        write = session_output.get()
+        if write is None:
+            return self.stdout.write(text)
+        write(text)
+        return len(text)
+
+    def flush(self):
+        if session_output.get() is None:
+            self.stdout.flush()
+
+    def isatty(self):
+        # sessions are shown in a terminal, keep the colored errors
+        return session_output.get() is not None or self.stdout.isatty()
+
+
+class SessionInput():
+    """
+    This class is the input source of a session: the server feeds it
+    the lines received, and the session's task awaits them.
+    """
+    framed = True  # a person is at the terminal on the other end
+
+    def __init__(self):
+        self.answers = asyncio.Queue()
+
+    def feed(self, line):
+        self.answers.put_nowait(line)
+
+    def close(self):
+        self.answers.put_nowait(None)
+
+    async def read(self, prompt):
+        print(prompt, end='')
+        answer = await self.answers.get()
+        if answer is None:  # the connection was closed
+            raise EOFError('connection closed')
+        return answer
+
+
+async def run_session(session):
+    """
+    Run session until its connection is closed.
+    """
+    print(run.welcome_message())
+    # the plan store is read on a thread, like every slow call
+    await asyncio.to_thread(run.learn_stored_names, session)
+    try:
+        await run.main_menu(session)
+    except EOFError:
+        pass
+
+
+class SessionServer():
+    """
+    This class accepts connections and runs a session for each of them,
+    up to max_sessions at the same time.
+    """
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        # SessionInput -> task handling the connection, of open sessions
+        self.sessions = {}
+        self.session_count = 0  # sessions served since the start
+        self.server = None
+
+    async def start(self, host=HOST, port=PORT):
+        if not isinstance(sys.stdout, SessionOutput):
+            sys.stdout = SessionOutput(sys.stdout)
+        self.server = await asyncio.start_server(self.handle_connection,
+                                                 host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        """
+        End all sessions and wait until their tables are uploaded.
+        """
+        self.server.close()
+        tasks = list(self.sessions.values())
+        for session_input in list(self.sessions):
+            session_input.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.server.wait_closed()
+        await asyncio.to_thread(run.sync_worker.flush)
+
+    async def handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        if len(self.sessions) >= self.max_sessions:
+            writer.write(b'Sorry, the server is full, try again later.\n')
+            await writer.drain()
+            writer.close()
+            return
+
+        def send(text):  # also called from threads the session waits for
+            data = text.replace('\n', '\r\n').encode()
+            loop.call_soon_threadsafe(writer.write, data)
+
+        session_input = SessionInput()
+        self.sessions[session_input] = asyncio.current_task()
+        self.session_count += 1
+        # the session's task and its threads (asyncio.to_thread) copy
+        # this context, so they print to this connection
+        session_output.set(send)
+        feeding = asyncio.ensure_future(self.feed(reader, session_input))
+        try:
+            await run_session(run.Session(session_input))
+        finally:
+            del self.sessions[session_input]
+            feeding.cancel()
+            writer.close()
+
+    async def feed(self, reader, session_input):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                session_input.feed(line.decode(errors='replace')
+                                   .rstrip('\r\n'))
+        finally:
+            session_input.close()
+
+
+async def serve(host, port, max_sessions):
+    server = SessionServer(max_sessions)
+    host, port = await server.start(host, port)
+    print(f'Serving sessions on {host}:{port}, up to {max_sessions} '
+          f'at a time')
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve many training plan sessions from one process.'
+    )
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int,
+                        default=int(os.environ.get('PORT', PORT)))
+    parser.add_argument('--max-sessions', type=int, default=MAX_SESSIONS)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_sessions))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
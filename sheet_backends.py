@@ -0,0 +1,505 @@
+"""
+Storage backends the app's tables can be saved to.
+
+All backends have the same two methods: write_worksheet() replaces the
+content of a worksheet with a list of rows and returns the number of
+API calls it made, read_worksheet() returns the rows of a worksheet.
+
+- GspreadBackend saves to the 'Muscle Gains' google sheet,
+- LocalFileBackend saves each worksheet as a CSV or JSON file in a
+  local folder, e.g. to keep working during google outages,
+- MemoryBackend keeps the worksheets in memory and records how many
+  calls were made and how long they took, for benchmarks and tests.
+  It can also fail calls like google does when overloaded.
+
+The app wraps the backend in a ScheduledBackend (see sheet_retry.py)
+that keeps to the backend's requests_per_minute quota and retries
+failed calls.
+"""
+import csv
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+import gspread
+from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+
+from instrumentation import instruments
+
+
+"""
+Define needed variables to access google sheet and write data.
+"""
+SCOPE = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.file",
+    "https://www.googleapis.com/auth/drive"
+    ]
+CREDS_FILE = 'creds.json'
+SHEET_NAME = 'Muscle Gains'
+POOL_SIZE = 10  # HTTP connections kept open to google
+
+
+class SheetAPIError(Exception):
+    """
+    Raised by the fake backends to fail a call with an HTTP status,
+    like gspread's APIError.
+    """
+    def __init__(self, status, message=''):
+        super().__init__(f'{status} {message}'.strip())
+        self.status = status
+
+
+class SheetBackend():
+    """
+    This class defines the methods every storage backend implements.
+    """
+    name = 'backend'
+    requests_per_minute = None  # quota of each kind of call, if any
+
+    def write_worksheet(self, worksheet_name, values):
+        """
+        Make the content of the worksheet worksheet_name equal to values
+        (a list of rows), creating the worksheet if needed.
+        Return the number of API calls used.
+        """
+        raise NotImplementedError
+
+    def read_worksheet(self, worksheet_name):
+        """
+        Return all rows of the worksheet worksheet_name as a list of
+        lists, or an empty list if the worksheet doesn't exist.
+        """
+        raise NotImplementedError
+
+
+class GspreadBackend(SheetBackend):
+    """
+    This class saves worksheets to google sheet.
+
+    Instead of clearing a worksheet and appending one row per API call,
+    the tables are written together with the clear in a single
+    batchUpdate request. The connection to google is only opened on the
+    first sync, so the app can start without credentials or network
+    access. After the first write of a session only the rows that
+    changed since the last successful sync are sent, as long as the
+    column layout (the header row) stays the same.
+
+    One backend can be used by several threads at once (e.g. the
+    workers of bulk_export.py) as long as they write to different
+    worksheets: they share the authorised session and its pool of
+    pool_size connections, and connect only once.
+    """
+    name = 'google sheet'
+    requests_per_minute = 60  # read and write requests per user
+
+    def __init__(self, creds_file=CREDS_FILE, sheet_name=SHEET_NAME,
+                 pool_size=POOL_SIZE):
+        self.creds_file = creds_file
+        self.sheet_name = sheet_name
+        self.pool_size = pool_size
+        self._connect_lock = threading.RLock()  # guards the handles
+        self.reset_connection()
+
+    def reset_connection(self):
+        """
+        Forget the cached spreadsheet and worksheet handles, so the next
+        sync connects again.
+        """
+        self._spreadsheet = None  # opened on first use
+        self._worksheets = {}  # worksheet handles cached by title
+        self._grid_sizes = {}  # (rows, columns) of each worksheet's grid
+        self._synced = {}  # last values successfully written to each one
+
+    def get_spreadsheet(self):
+        """
+        Return the 'Muscle Gains' spreadsheet, authorising with the
+        service account credentials the first time it's called.
+        Returns (spreadsheet, api_calls) where api_calls is the number
+        of requests made to google to get it.
+        """
+        with self._connect_lock:
+            if self._spreadsheet is not None:
+                return self._spreadsheet, 0
+            with instruments.timer('sheet.connect'):
+                creds = Credentials.from_service_account_file(
+                    self.creds_file)
+                client = gspread.authorize(creds.with_scopes(SCOPE))
+                # keep a connection open for each thread using the session
+                client.session.mount('https://', HTTPAdapter(
+                    pool_connections=1, pool_maxsize=self.pool_size))
+                # file lookup + metadata
+                self._spreadsheet = client.open(self.sheet_name)
+            return self._spreadsheet, 2
+
+    def get_worksheet(self, worksheet_name, create=True):
+        """
+        Return the cached handle of worksheet worksheet_name.
+        All handles are fetched together in one request the first time,
+        and the worksheet is created if it doesn't exist yet (or None
+        is returned if create is False).
+        Returns (worksheet, api_calls) like get_spreadsheet().
+        """
+        if worksheet_name in self._worksheets:
+            return self._worksheets[worksheet_name], 0
+        with self._connect_lock:  # so a worksheet is only added once
+            if worksheet_name in self._worksheets:
+                return self._worksheets[worksheet_name], 0
+            spreadsheet, api_calls = self.get_spreadsheet()
+            for worksheet in spreadsheet.worksheets():
+                self._worksheets[worksheet.title] = worksheet
+                self._grid_sizes[worksheet.title] = (worksheet.row_count,
+                                                     worksheet.col_count)
+            api_calls += 1
+            if worksheet_name not in self._worksheets:  # e.g. a new client
+                if not create:
+                    return None, api_calls
+                worksheet = spreadsheet.add_worksheet(worksheet_name, 100,
+                                                      26)
+                self._worksheets[worksheet_name] = worksheet
+                self._grid_sizes[worksheet_name] = (100, 26)
+                api_calls += 1
+            return self._worksheets[worksheet_name], api_calls
+
+    def write_worksheet(self, worksheet_name, values):
+        """
+        Once connected, at most one API call is made, whatever the
+        number of rows: only the changed rows are sent if the worksheet
+        was already synced with the same header row, nothing at all if
+        no row changed, and the whole worksheet is rewritten otherwise.
+        """
+        try:
+            return self._write_worksheet(worksheet_name, values)
+        except Exception:
+            # e.g. the worksheet was deleted or created meanwhile, so
+            # fetch the handles again before the next attempt
+            self._worksheets.pop(worksheet_name, None)
+            raise
+
+    def _write_worksheet(self, worksheet_name, values):
+        worksheet, api_calls = self.get_worksheet(worksheet_name)
+        grid_size = self._grid_sizes[worksheet_name]
+        diff = build_diff_requests(worksheet.id, grid_size,
+                                   self._synced.get(worksheet_name), values)
+        if diff is None:
+            requests, grid_size = build_write_requests(worksheet.id,
+                                                       grid_size, values)
+        else:
+            requests, grid_size = diff
+        if requests:
+            body = {'requests': requests}
+            # what gspread sends, to see how close we get to the quotas
+            instruments.count('bytes_sent', len(json.dumps(body)))
+            worksheet.spreadsheet.batch_update(body)
+            api_calls += 1
+        self._grid_sizes[worksheet_name] = grid_size
+        self._synced[worksheet_name] = values
+        return api_calls
+
+    def read_worksheet(self, worksheet_name):
+        worksheet, api_calls = self.get_worksheet(worksheet_name,
+                                                  create=False)
+        rows = []
+        if worksheet is not None:
+            rows = worksheet.get_all_values()
+            api_calls += 1
+        instruments.count('api_calls', api_calls)
+        return rows
+
+
+class LocalFileBackend(SheetBackend):
+    """
+    This class saves each worksheet as a file in a local folder,
+    as CSV (the default) or JSON. Files are replaced atomically, so an
+    interrupted write never leaves a half written worksheet.
+    """
+    name = 'local files'
+
+    def __init__(self, folder='sheets', file_format='csv'):
+        if file_format not in ('csv', 'json'):
+            raise ValueError(f'Unknown file format: {file_format}')
+        self.folder = folder
+        self.file_format = file_format
+
+    def path(self, worksheet_name):
+        # keep the name readable but safe to use as a file name
+        file_name = ''.join(
+            char if char.isalnum() or char in ' -_.' else '_'
+            for char in worksheet_name
+        )
+        return os.path.join(self.folder, f'{file_name}.{self.file_format}')
+
+    def write_worksheet(self, worksheet_name, values):
+        os.makedirs(self.folder, exist_ok=True)
+        path = self.path(worksheet_name)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', newline='', encoding='utf-8') as file:
+            if self.file_format == 'csv':
+                csv.writer(file).writerows(values)
+            else:
+                json.dump(values, file)
+            instruments.count('bytes_sent', file.tell())
+        os.replace(temp_path, path)
+        return 1
+
+    def read_worksheet(self, worksheet_name):
+        path = self.path(worksheet_name)
+        if not os.path.exists(path):
+            return []
+        with open(path, newline='', encoding='utf-8') as file:
+            if self.file_format == 'csv':
+                return list(csv.reader(file))
+            return json.load(file)
+
+
+class MemoryBackend(SheetBackend):
+    """
+    This class keeps worksheets in memory. Each call can be slowed down
+    by latency seconds to behave like a remote sheet, and the number
+    and duration of the calls of each kind are recorded.
+    Calls fail with a SheetAPIError of failure_status with probability
+    failure_rate, or with the statuses given to fail_next(), before
+    changing anything, like a rejected google request.
+    """
+    name = 'memory'
+
+    def __init__(self, latency=0, failure_rate=0, failure_status=503,
+                 seed=0, requests_per_minute=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.requests_per_minute = requests_per_minute
+        self.worksheets = {}  # worksheet name -> list of rows
+        self.calls = Counter()  # number of calls of each kind
+        self.call_times = Counter()  # total seconds spent in each kind
+        self._failures = []  # statuses of the next calls to fail
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def fail_next(self, *statuses):
+        """
+        Fail the next calls with statuses, e.g. fail_next(429, 503).
+        """
+        with self._lock:
+            self._failures.extend(statuses)
+
+    def _check_failure(self, kind, start):
+        with self._lock:
+            if self._failures:
+                status = self._failures.pop(0)
+            elif self.failure_rate and \
+                    self._random.random() < self.failure_rate:
+                status = self.failure_status
+            else:
+                return
+        self._record(f'failed {kind}', start)
+        raise SheetAPIError(status, f'injected {kind} failure')
+
+    def _record(self, kind, start):
+        with self._lock:
+            self.calls[kind] += 1
+            self.call_times[kind] += time.perf_counter() - start
+
+    def write_worksheet(self, worksheet_name, values):
+        start = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        self._check_failure('write', start)
+        rows = [list(row) for row in values]  # keep a copy, like a sheet
+        with self._lock:
+            self.worksheets[worksheet_name] = rows
+        self._record('write', start)
+        return 1
+
+    def read_worksheet(self, worksheet_name):
+        start = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        self._check_failure('read', start)
+        with self._lock:
+            rows = [list(row) for row in
+                    self.worksheets.get(worksheet_name, [])]
+        self._record('read', start)
+        return rows
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.call_times.clear()
+
+
+def make_backend(spec):
+    """
+    Return the backend described by spec: 'gspread' (the default),
+    'memory', 'memory:LATENCY', 'memory:LATENCY:FAILURE_RATE', 'local',
+    'local:FOLDER' or 'local:FOLDER:json'.
+    """
+    kind, _, options = (spec or 'gspread').partition(':')
+    if kind == 'gspread':
+        return GspreadBackend()
+    if kind == 'memory':
+        latency, _, failure_rate = options.partition(':')
+        return MemoryBackend(float(latency or 0), float(failure_rate or 0))
+    if kind == 'local':
+        folder, _, file_format = options.partition(':')
+        return LocalFileBackend(folder or 'sheets', file_format or 'csv')
+    raise ValueError(f'Unknown sheet backend: {spec}')
+
+
+def to_cell(value):
+    """
+    Convert a python value into the cell data format expected by
+    the google sheets API. Numbers stay numbers, everything else
+    is written as a raw string.
+    """
+    if isinstance(value, bool):
+        return {'userEnteredValue': {'boolValue': value}}
+    if isinstance(value, (int, float)):
+        return {'userEnteredValue': {'numberValue': value}}
+    return {'userEnteredValue': {'stringValue': str(value)}}
+
+
+def grow_grid_request(sheet_id, grid_size, row_count, col_count):
+    """
+    Return the request that grows the grid of worksheet sheet_id so
+    that row_count rows and col_count columns fit, or None if the
+    current grid_size is big enough. Returns (request, new_grid_size).
+    """
+    grid_rows, grid_cols = grid_size
+    # append_row grew the grid on its own, updateCells does not
+    if row_count <= grid_rows and col_count <= grid_cols:
+        return None, grid_size
+    grid_rows = max(row_count, grid_rows)
+    grid_cols = max(col_count, grid_cols)
+    request = {
+        'updateSheetProperties': {
+            'properties': {
+                'sheetId': sheet_id,
+                'gridProperties': {
+                    'rowCount': grid_rows,
+                    'columnCount': grid_cols,
+                },
+            },
+            'fields': 'gridProperties(rowCount,columnCount)',
+        }
+    }
+    return request, (grid_rows, grid_cols)
+
+
+def update_cells_request(sheet_id, row_index, col_index, rows):
+    """
+    Return the request that writes the block rows with its top left
+    cell at (row_index, col_index).
+    """
+    return {
+        'updateCells': {
+            'start': {'sheetId': sheet_id,
+                      'rowIndex': row_index,
+                      'columnIndex': col_index},
+            'rows': [
+                {'values': [to_cell(value) for value in row]}
+                for row in rows
+            ],
+            'fields': 'userEnteredValue',
+        }
+    }
+
+
+def build_write_requests(sheet_id, grid_size, values):
+    """
+    Return the list of batchUpdate requests that replace the whole
+    content of the worksheet sheet_id with the rows in values: grow
+    the grid if the block doesn't fit, clear all cells, then write the
+    block starting at cell A1. grid_size is the current (rows, columns)
+    size of the worksheet.
+    Returns (requests, new_grid_size).
+    """
+    requests = []
+
+    row_count = len(values)
+    col_count = max((len(row) for row in values), default=0)
+    request, grid_size = grow_grid_request(sheet_id, grid_size,
+                                           row_count, col_count)
+    if request:
+        requests.append(request)
+
+    # a range with only the sheet id covers the whole worksheet
+    requests.append({
+        'updateCells': {
+            'range': {'sheetId': sheet_id},
+            'fields': 'userEnteredValue',
+        }
+    })
+    if values:
+        requests.append(update_cells_request(sheet_id, 0, 0, values))
+    return requests, grid_size
+
+
+def changed_columns(old_row, new_row):
+    """
+    Return the (first, last) column indexes where old_row and new_row
+    differ, or None if they are equal.
+    """
+    if old_row == new_row:
+        return None
+    length = max(len(old_row), len(new_row))
+    changed = [
+        i for i in range(length)
+        if i >= len(old_row) or i >= len(new_row) or old_row[i] != new_row[i]
+    ]
+    return changed[0], changed[-1]
+
+
+def build_diff_requests(sheet_id, grid_size, old_values, new_values):
+    """
+    Return the batchUpdate requests that turn a worksheet holding
+    old_values into new_values by writing only the changed cells.
+    Consecutive changed rows are written as one block, new rows are
+    appended below the old ones.
+    Returns (requests, new_grid_size), or None when the column layout
+    changed or rows were removed and the worksheet must be rewritten.
+    """
+    if not old_values or not new_values:
+        return None
+    if old_values[0] != new_values[0] or len(new_values) < len(old_values):
+        return None
+
+    requests = []
+    col_count = max(len(row) for row in new_values)
+    request, grid_size = grow_grid_request(sheet_id, grid_size,
+                                           len(new_values), col_count)
+    if request:
+        requests.append(request)
+
+    block_start = None  # first row of the current block of changed rows
+    first_col = last_col = 0
+    for row_index in range(len(new_values) + 1):
+        columns = None
+        if row_index < len(new_values):
+            new_row = new_values[row_index]
+            old_row = (old_values[row_index]
+                       if row_index < len(old_values) else [])
+            # covers the old cells too if the row got shorter, they are
+            # blanked by the padding below
+            columns = changed_columns(old_row, new_row)
+        if columns:
+            if block_start is None:
+                block_start = row_index
+                first_col, last_col = columns
+            else:
+                first_col = min(first_col, columns[0])
+                last_col = max(last_col, columns[1])
+        elif block_start is not None:
+            # pad rows so every row of the block covers the same columns
+            block = [
+                (row + [''] * (last_col + 1 - len(row)))[first_col:last_col+1]
+                for row in new_values[block_start:row_index]
+            ]
+            requests.append(update_cells_request(sheet_id, block_start,
+                                                 first_col, block))
+            block_start = None
+    return requests, grid_size
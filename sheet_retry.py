@@ -0,0 +1,202 @@
+"""
+Rate limiting and retries around the calls of a storage backend.
+
+Google sheets allows about 60 read and 60 write requests per minute and
+user, and answers 429 (quota exceeded) or 5xx when overloaded. The
+ScheduledBackend keeps the calls within the quota with a token bucket
+per kind of call, and retries failed calls with jittered exponential
+backoff, honouring the Retry-After header when google sends one.
+
+Each write is a single batchUpdate (see GspreadBackend), which google
+applies completely or not at all, so a failed attempt never leaves a
+cleared or half written worksheet, and retrying it is safe.
+"""
+import random
+import threading
+import time
+
+import requests
+
+from sheet_backends import SheetBackend
+from instrumentation import instruments
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}  # worth another try
+MAX_ATTEMPTS = 5
+BASE_DELAY = 1  # seconds before the first retry, doubled for every retry
+MAX_DELAY = 32  # seconds, the longest wait between two attempts
+BURST = 10  # calls let through at once by default
+
+
+def error_status(error):
+    """
+    Return the HTTP status of a failed call: SheetAPIError (the fakes)
+    has it as status, gspread's APIError has the response.
+    """
+    status = getattr(error, 'status', None)
+    if status is None:
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None)
+    return status
+
+
+def retry_after(error):
+    """
+    Return the seconds google asks to wait in the Retry-After header of
+    a failed call, or None.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    """
+    Return True if the call that raised error can be tried again:
+    rate limits, server errors and dropped connections.
+    """
+    if isinstance(error, (requests.exceptions.ConnectionError,
+                          requests.exceptions.Timeout,
+                          ConnectionError, TimeoutError)):
+        return True
+    return error_status(error) in RETRY_STATUSES
+
+
+class TokenBucket():
+    """
+    This class lets through at most per_minute calls in any minute,
+    with bursts of up to capacity calls (BURST, or half of per_minute
+    if that's less, by default). The bucket is refilled with what the
+    burst leaves of the quota, so a full bucket and a minute of refills
+    add up to per_minute. Calls take their token straight away, letting
+    the balance go negative, and wait until it would have been
+    refilled, so concurrent callers are served in order.
+    """
+    def __init__(self, per_minute, capacity=None, clock=time.monotonic,
+                 sleep=time.sleep):
+        if capacity is None:
+            capacity = min(BURST, per_minute / 2)
+        if not 0 < capacity < per_minute:
+            raise ValueError(f'a burst of {capacity} calls must be smaller '
+                             f'than the quota of {per_minute} a minute')
+        self.rate = (per_minute - capacity) / 60  # tokens added per second
+        self.capacity = capacity
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def take(self, tokens=1):
+        """
+        Take tokens from the bucket and return the seconds the caller
+        must wait before making the call.
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """
+        Wait until tokens are available. Return the seconds waited.
+        """
+        wait = self.take(tokens)
+        if wait:
+            self.sleep(wait)
+        return wait
+
+
+class ScheduledBackend(SheetBackend):
+    """
+    This class wraps a storage backend: calls wait for a token of the
+    bucket of their kind ('read' or 'write', none if the backend has no
+    quota), allowing bursts of burst calls (see TokenBucket), and
+    failed calls are retried up to max_attempts times.
+    Every retry and every wait for the quota is recorded as an event
+    (see instrumentation.py).
+    """
+    def __init__(self, backend, per_minute=None, burst=None,
+                 max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY,
+                 max_delay=MAX_DELAY, clock=time.monotonic, sleep=time.sleep,
+                 rng=None):
+        self.backend = backend
+        if per_minute is None:  # the quota of the backend, if any
+            per_minute = getattr(backend, 'requests_per_minute', None)
+        self.buckets = {}
+        if per_minute:
+            self.buckets = {kind: TokenBucket(per_minute, burst, clock,
+                                              sleep)
+                            for kind in ('read', 'write')}
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    def backoff(self, attempt, error):
+        """
+        Return the seconds to wait before attempt number attempt + 1:
+        between half and all of base_delay * 2 ** (attempt - 1), capped
+        at max_delay, or longer if google asked for it.
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        wait = delay / 2 + self.rng.uniform(0, delay / 2)
+        asked = retry_after(error)
+        if asked is not None and asked > wait:
+            wait = asked
+        return wait
+
+    def write_worksheet(self, worksheet_name, values):
+        """
+        Return the number of API calls used, failed attempts included.
+        """
+        api_calls, attempts = self._call(
+            'write', self.backend.write_worksheet, worksheet_name, values)
+        return api_calls + attempts - 1
+
+    def read_worksheet(self, worksheet_name):
+        rows, _ = self._call('read', self.backend.read_worksheet,
+                             worksheet_name)
+        return rows
+
+    def _call(self, kind, method, worksheet_name, *args):
+        # return (result, number of attempts)
+        bucket = self.buckets.get(kind)
+        attempt = 1
+        while True:
+            if bucket is not None:
+                waited = bucket.acquire()
+                if waited:
+                    instruments.event('sheet.throttled', call=kind,
+                                      worksheet=worksheet_name,
+                                      wait=round(waited, 3))
+            try:
+                result = method(worksheet_name, *args)
+            except Exception as error:
+                if attempt >= self.max_attempts or not is_retryable(error):
+                    raise
+                wait = self.backoff(attempt, error)
+                instruments.event('sheet.retry', call=kind,
+                                  worksheet=worksheet_name, attempt=attempt,
+                                  status=error_status(error),
+                                  error=repr(error), wait=round(wait, 3))
+                self.sleep(wait)
+                attempt += 1
+                continue
+            if bucket is not None and kind == 'write' and result > 1:
+                # e.g. the first write also connected and made a worksheet
+                bucket.take(result - 1)
+            return result, attempt
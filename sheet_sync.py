@@ -0,0 +1,193 @@
+"""
+Helpers to save the app's tables to google sheet, or to the storage
+backend chosen with the MUSCLE_GAINS_BACKEND environment variable
+(see sheet_backends.make_backend(), e.g. 'local:sheets' or 'memory').
+
+The backend is only created on the first sync, so the app can start
+(and be imported by other tools) without credentials or network access.
+
+Writes are handed to a background SyncWorker, so the menu doesn't wait
+for google: only the newest snapshot of each worksheet is uploaded and
+pending uploads are flushed when the app exits.
+"""
+import atexit
+import os
+import threading
+
+from sheet_backends import make_backend
+from sheet_retry import ScheduledBackend
+from instrumentation import instruments
+
+
+BACKEND_VARIABLE = 'MUSCLE_GAINS_BACKEND'
+
+_backend = None  # created on first use by get_backend()
+
+
+def get_backend():
+    """
+    Return the storage backend tables are saved to, creating it from
+    the MUSCLE_GAINS_BACKEND environment variable the first time, with
+    rate limiting and retries (see sheet_retry.py).
+    """
+    global _backend
+
+    if _backend is None:
+        _backend = ScheduledBackend(
+            make_backend(os.environ.get(BACKEND_VARIABLE)))
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Save tables to backend from now on (e.g. a MemoryBackend in tests
+    and benchmarks).
+    """
+    global _backend
+
+    _backend = backend
+
+
+def worksheet_title(worksheet_name, client=None):
+    """
+    Return the title of the worksheet worksheet_name (e.g. 'Training
+    Table') for client. Each client gets their own worksheets, prefixed
+    with their name; without a client the shared worksheets are used.
+    """
+    if client:
+        return f'{client} - {worksheet_name}'
+    return worksheet_name
+
+
+def write_worksheet(worksheet_name, values):
+    """
+    Make the content of the worksheet worksheet_name equal to values
+    (a list of rows) in the current backend.
+    Return the number of API calls used.
+    """
+    with instruments.timer('sheet.write', worksheet=worksheet_name,
+                           rows=len(values)) as fields:
+        api_calls = get_backend().write_worksheet(worksheet_name, values)
+        fields['api_calls'] = api_calls
+    instruments.count('api_calls', api_calls)
+    return api_calls
+
+
+def read_worksheet(worksheet_name):
+    """
+    Return the rows of the worksheet worksheet_name in the current
+    backend.
+    """
+    with instruments.timer('sheet.read', worksheet=worksheet_name):
+        return get_backend().read_worksheet(worksheet_name)
+
+
+class SyncWorker():
+    """
+    This class uploads worksheet snapshots to the storage backend on a
+    background thread. Snapshots are kept per worksheet, so if a
+    worksheet is submitted several times before the upload starts only
+    the newest values are sent.
+    """
+    def __init__(self, write=write_worksheet):
+        self.write = write  # function(worksheet_name, values) -> api calls
+        self.api_calls = 0  # API calls made since the app started
+        self.merged = 0  # snapshots replaced by a newer one before upload
+        self.last_error = None
+        self._pending = {}  # worksheet name -> newest values to upload
+        self._failed = {}  # worksheet name -> values of a failed upload
+        self._uploading = None  # name of the worksheet being uploaded
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, worksheet_name, values):
+        """
+        Queue values (a list of rows) to be written to worksheet_name
+        and return immediately. Any older snapshot of the same worksheet
+        that hasn't been uploaded yet is dropped.
+        """
+        with self._condition:
+            if worksheet_name in self._pending:
+                self.merged += 1
+                instruments.count('sync.merged')
+            self._pending[worksheet_name] = values
+            self._failed.pop(worksheet_name, None)
+            self._retry_failed()
+            self._start()
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Retry failed uploads and wait until every queued snapshot has
+        been written. Return True if nothing is left to upload.
+        """
+        with self._condition:
+            self._retry_failed()
+            if self._pending:
+                self._start()
+                self._condition.notify_all()
+            self._condition.wait_for(
+                lambda: not self._pending and self._uploading is None,
+                timeout
+            )
+            return not self._pending and not self._failed
+
+    def status_message(self):
+        """
+        Return a one line description of the sync state for the menu.
+        """
+        with self._condition:
+            waiting = len(self._pending) + (self._uploading is not None)
+            storage = get_backend().name.capitalize()
+            if waiting:
+                return f'{storage}: saving {waiting} table(s)...'
+            if self._failed:
+                return (f'{storage}: saving failed ({self.last_error}),'
+                        f' will retry with the next save')
+            return (f'{storage}: all changes saved '
+                    f'({self.api_calls} API calls)')
+
+    def _retry_failed(self):
+        # requeue failed snapshots unless a newer one is already waiting
+        for worksheet_name, values in self._failed.items():
+            instruments.event('sync.retry', worksheet=worksheet_name)
+            self._pending.setdefault(worksheet_name, values)
+        self._failed.clear()
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending)
+                worksheet_name = next(iter(self._pending))
+                values = self._pending.pop(worksheet_name)
+                self._uploading = worksheet_name
+            try:
+                api_calls = self.write(worksheet_name, values)
+            except Exception as error:
+                instruments.event('sync.failed', worksheet=worksheet_name,
+                                  error=repr(error))
+                with self._condition:
+                    self.last_error = error
+                    # keep the values for the next retry, if not outdated
+                    if worksheet_name not in self._pending:
+                        self._failed[worksheet_name] = values
+                    self._uploading = None
+                    self._condition.notify_all()
+            else:
+                with self._condition:
+                    self.api_calls += api_calls
+                    self._uploading = None
+                    self._condition.notify_all()
+
+
+"""
+The worker used by the app. Whatever is still queued is written
+before the process exits.
+"""
+sync_worker = SyncWorker()
+atexit.register(sync_worker.flush)
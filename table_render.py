@@ -0,0 +1,127 @@
+"""
+Streaming renderer for the training table, drawn like tabulate's
+"fancy_grid" format with centered cells.
+
+Column widths are worked out in one pass over the rows first, then the
+table is produced line by line, so long tables start printing straight
+away and no big string is built. Columns that don't fit in the 80
+characters of the Heroku terminal are moved to further pages, each
+repeating the key columns (e.g. muscle group and exercise name).
+"""
+MAX_WIDTH = 80  # character limit of the terminal, see get_lines_str()
+MIN_PADDING = 2  # extra width around headers, as in tabulate
+
+
+def cell_str(value):
+    """
+    Return the text shown for a cell. Floats are written like tabulate
+    does by default, so 12.0 is shown as 12.
+    """
+    if isinstance(value, float):
+        return format(value, 'g')
+    return str(value)
+
+
+def column_widths(headers, rows):
+    """
+    Return the width of every column: the longest of its cells, but at
+    least the longest line of its header plus MIN_PADDING. This is the
+    only pass over all rows needed before drawing.
+    """
+    widths = [max(len(line) for line in header.split('\n')) + MIN_PADDING
+              for header in headers]
+    for row in rows:
+        for i, value in enumerate(row):
+            length = len(cell_str(value))
+            if length > widths[i]:
+                widths[i] = length
+    return widths
+
+
+def table_width(widths, columns):
+    """
+    Return the number of characters of a table line showing columns.
+    """
+    return sum(widths[i] + 3 for i in columns) + 1
+
+
+def split_pages(widths, key_columns, column_units, max_width=MAX_WIDTH):
+    """
+    Split column_units (lists of column indexes that must stay together,
+    e.g. the reps and weight of a set) into pages that fit in max_width
+    when shown after key_columns. Returns a list of column index lists.
+    A unit too wide for any page still gets a page of its own.
+    """
+    pages = []
+    page = list(key_columns)
+    for unit in column_units:
+        if (len(page) > len(key_columns)
+                and table_width(widths, page + unit) > max_width):
+            pages.append(page)
+            page = list(key_columns)
+        page += unit
+    if len(page) > len(key_columns) or not pages:
+        pages.append(page)
+    return pages
+
+
+def center(text, width):
+    """
+    Center text in width characters, with any odd space on the right
+    like tabulate (str.center() puts it on either side).
+    """
+    left = (width - len(text)) // 2
+    return ' ' * left + text + ' ' * (width - len(text) - left)
+
+
+def border(widths, columns, left, fill, middle, right):
+    return left + middle.join(fill * (widths[i] + 2) for i in columns) + right
+
+
+def text_lines(widths, columns, texts):
+    """
+    Yield the lines of one table row whose cells may span several lines
+    (like the headers), each cell centered in its column.
+    """
+    cells = [text.split('\n') for text in texts]
+    height = max(len(lines) for lines in cells)
+    for line_number in range(height):
+        yield '│' + '│'.join(
+            ' ' + center(lines[line_number] if line_number < len(lines)
+                         else '', widths[i]) + ' '
+            for i, lines in zip(columns, cells)
+        ) + '│'
+
+
+def render_page(headers, rows, widths, columns):
+    """
+    Yield the lines of the table showing only columns (a list of column
+    indexes) of headers and rows, as soon as each row is drawn.
+    """
+    yield border(widths, columns, '╒', '═', '╤', '╕')
+    yield from text_lines(widths, columns, [headers[i] for i in columns])
+    yield border(widths, columns, '╞', '═', '╪', '╡')
+    separator = border(widths, columns, '├', '─', '┼', '┤')
+    first = True
+    for row in rows:
+        if not first:
+            yield separator
+        first = False
+        yield from text_lines(widths, columns,
+                              [cell_str(row[i]) for i in columns])
+    yield border(widths, columns, '╘', '═', '╧', '╛')
+
+
+def render_pages(headers, rows, key_columns, column_units,
+                 max_width=MAX_WIDTH):
+    """
+    Yield (page_number, page_count, lines) for every page of the table,
+    lines being a generator of the page's lines. rows must be a sequence
+    (or anything that can be iterated more than once), it is iterated
+    once for the widths and once per page.
+    """
+    widths = column_widths(headers, rows)
+    pages = split_pages(widths, key_columns, column_units, max_width)
+    for page_number, columns in enumerate(pages, 1):
+        yield page_number, len(pages), render_page(headers, rows, widths,
+                                                   columns)
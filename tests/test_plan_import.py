@@ -0,0 +1,113 @@
+"""
+Round trip of a plan through a sheet: the training table exported with
+write_worksheet() to a MemoryBackend is loaded back with
+plan_import.import_worksheet() into the same plan, from the values as
+they were written and from the values formatted as text, the way
+google's get_all_values() returns them (e.g. 40.0 as '40').
+"""
+import pytest
+
+import sheet_sync
+from run import (MuscleGroup, Exercise, TrainingPlan, build_training_table,
+                 build_metrics_table)
+from plan_import import import_worksheet
+from sheet_backends import MemoryBackend
+
+
+WORKSHEET = 'Training Table'
+
+
+def make_exercise(name, sets, cadence=None, rest=None):
+    exercise = Exercise()
+    exercise.name = name
+    exercise.sets = len(sets)
+    for reps, weight in sets:
+        exercise.add_set(reps, weight)
+    exercise.cadence = cadence
+    exercise.rest = rest
+    return exercise
+
+
+def make_plan():
+    """
+    Return a plan with exercises of different numbers of sets (so rows
+    are padded with '--'), with and without cadence and rest, and names
+    a letter or two apart that must not be merged.
+    """
+    exercises = {
+        'Chest': [
+            make_exercise('Incline Press', [(10, 40.0), (8, 42.5)],
+                          (2, 0, 4), 90),
+            make_exercise('Decline Press', [(12, 35.0)]),
+            make_exercise('Dumbbell Flys', [(15, 12.25), (12, 14.0),
+                                            (10, 16.0)], (1.5, 0.5, 2)),
+        ],
+        'Biceps': [
+            make_exercise('Hammer Curl', [(10, 0.0), (10, 10.0)], rest=60),
+            make_exercise('Cable Curls', [(20, 7.5)], (3, 1, 3)),
+        ],
+    }
+    training_plan = TrainingPlan()
+    for group_name, group_exercises in exercises.items():
+        group = MuscleGroup()
+        group.name = group_name
+        for exercise in group_exercises:
+            group.add_exercise(exercise)
+        training_plan[group_name] = group
+    return training_plan
+
+
+def formatted(value):
+    """
+    Return value as google shows it in the sheet.
+    """
+    if isinstance(value, float):
+        return f'{value:g}'
+    return str(value)
+
+
+def plan_values(training_plan):
+    """
+    Return everything saved of training_plan, to compare plans.
+    """
+    return [(group.name, [(exercise.name, exercise.sets,
+                           exercise.reps_and_weights, exercise.cadence,
+                           exercise.rest)
+                          for exercise in group.exercises.values()])
+            for group in training_plan.values()]
+
+
+@pytest.fixture
+def backend():
+    previous_backend = sheet_sync.get_backend()
+    backend = MemoryBackend()
+    sheet_sync.set_backend(backend)
+    yield backend
+    sheet_sync.set_backend(previous_backend)
+
+
+@pytest.mark.parametrize('as_text', [False, True], ids=['values', 'text'])
+def test_round_trip(backend, as_text):
+    training_plan = make_plan()
+    rows = build_training_table(training_plan)
+    if as_text:
+        rows = [[formatted(value) for value in row] for row in rows]
+    sheet_sync.write_worksheet(WORKSHEET, rows)
+
+    errors = []
+    loaded_plan = TrainingPlan()
+    imported, skipped = import_worksheet(WORKSHEET, loaded_plan,
+                                         errors.append, lambda warning: None)
+
+    assert errors == []
+    assert (imported, skipped) == (5, 0)
+    assert plan_values(loaded_plan) == plan_values(training_plan)
+    assert (build_metrics_table(loaded_plan)
+            == build_metrics_table(training_plan))
+    assert backend.calls['read'] == 1  # the whole worksheet at once
+
+
+def test_missing_worksheet(backend):
+    loaded_plan = TrainingPlan()
+    assert import_worksheet(WORKSHEET, loaded_plan) == (0, 0)
+    assert loaded_plan == {}
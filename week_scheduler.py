@@ -0,0 +1,349 @@
+"""
+Weekly program scheduler: spreads the muscle groups of a plan over the
+training days of a week, so the longest training day is as short as
+possible, instead of the trainer balancing them by hand.
+
+The duration of each group is the one MuscleGroup.calc_metrics() gives.
+A group can be trained several times a week, with at least a number of
+rest days between its sessions, and a day can have a maximum session
+length. Groups are placed longest first on the days that keep the
+longest day shortest, then groups are moved or swapped away from the
+longest day while that makes it shorter. That takes a few milliseconds
+for plans of a hundred groups and well under a second for a thousand
+(see benchmarks/bench_scheduler.py). The result is compared with a
+lower bound of the longest day (the average day, or the longest group),
+which it's usually equal or close to. Groups that fit on no day (too
+long for a session, or trained too often for the rest days) are
+reported as not scheduled.
+
+The schedule is saved to the client's 'Weekly Schedule' worksheet.
+
+Usage: python week_scheduler.py --client NAME (--plan ID | --file FILE)
+                                [--days 3] [--times 1] [--rest-days 1]
+                                [--max-session MINUTES] [--backend SPEC]
+"""
+import argparse
+import bisect
+import itertools
+import os
+import sys
+
+from tabulate import tabulate
+
+from run import TrainingPlan
+from sheet_sync import BACKEND_VARIABLE, write_worksheet, worksheet_title
+
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+            'Saturday', 'Sunday']
+"""
+The header row of the schedule, the same on the terminal and in google
+sheet.
+"""
+SCHEDULE_HEADERS = ['Day', 'Muscle\nGroups', 'Duration\n(s)']
+GROUPS_WIDTH = 50  # wrap the groups of a day to fit the terminal
+MAX_ROUNDS = 1000  # moves or swaps tried to shorten the longest day
+SWAP_CANDIDATES = 8  # closest groups of a day tried for each swap
+CLOSE_ENOUGH = 1  # seconds above the lower bound not worth a move
+
+
+def spread_days(count):
+    """
+    Return count weekdays (0 is Monday) spread evenly over the week,
+    e.g. [0, 2, 5] (Monday, Wednesday, Saturday) for 3.
+    """
+    return sorted({round(i * 7 / count) % 7 for i in range(count)})
+
+
+def rest_days_between(first, second):
+    """
+    Return the number of days without training between the weekdays
+    first and second, counted the shorter way round the week.
+    """
+    apart = abs(first - second) % 7
+    return min(apart, 7 - apart) - 1
+
+
+class WeekSchedule():
+    """
+    This class holds the muscle groups of each training day, the
+    duration of each day and the groups that couldn't be scheduled.
+    """
+    def __init__(self, days, durations):
+        self.days = days  # weekdays, 0 is Monday
+        self.durations = durations  # group name -> seconds
+        self.groups = [[] for _ in days]  # group names of each day
+        self.loads = [0] * len(days)  # seconds of training of each day
+        self.unscheduled = []  # group names, once per missing session
+        self.lower_bound = 0  # no schedule has a shorter longest day
+
+    def longest(self):
+        return max(self.loads, default=0)
+
+    def build_table(self):
+        """
+        Return the rows of the schedule (header row included), with the
+        groups of each day in the order of the plan.
+        """
+        order = {name: i for i, name in enumerate(self.durations)}
+        rows = [list(SCHEDULE_HEADERS)]
+        for day, names, load in zip(self.days, self.groups, self.loads):
+            rows.append([WEEKDAYS[day],
+                         ', '.join(sorted(names, key=order.get)), load])
+        if self.unscheduled:
+            missing = {}  # group name -> sessions not scheduled
+            for name in self.unscheduled:
+                missing[name] = missing.get(name, 0) + 1
+            rows.append(['Not scheduled', ', '.join(
+                name if count == 1 else f'{name} ({count}x)'
+                for name, count in missing.items()), ''])
+        return rows
+
+    def message(self):
+        message = (f'Longest day: {self.longest()}(s), the shortest '
+                   f'possible is at least {self.lower_bound:.0f}(s)')
+        if self.unscheduled:
+            message += (f'\n{len(self.unscheduled)} sessions fit on no day, '
+                        f'see "Not scheduled"')
+        return message
+
+
+def group_durations(training_plan):
+    """
+    Return the duration in seconds of each muscle group of
+    training_plan, by name.
+    """
+    return {name: group.calc_metrics()[2]
+            for name, group in training_plan.items()}
+
+
+def schedule_week(durations, days, times=1, rest_days=1, max_session=None):
+    """
+    Spread the muscle groups of durations (group name -> seconds) over
+    the weekdays days, each group times times a week (an int, or a
+    dictionary by group name) with at least rest_days days between its
+    sessions, and no day longer than max_session seconds (if given).
+    Return a WeekSchedule.
+    """
+    def sessions(name):
+        return times.get(name, 1) if isinstance(times, dict) else times
+
+    days = sorted(days)
+    schedule = WeekSchedule(days, durations)
+    # the sets of days a group trained k times a week can be trained on
+    day_sets = {}
+    for name in durations:
+        count = sessions(name)
+        if count not in day_sets:
+            day_sets[count] = [
+                chosen for chosen in itertools.combinations(
+                    range(len(days)), count)
+                if all(rest_days_between(days[i], days[j]) >= rest_days
+                       for i, j in itertools.combinations(chosen, 2))]
+    group_days = {}  # group name -> numbers of the days it's trained on
+    total = 0
+    longest_group = 0
+    for name, duration in sorted(durations.items(), key=lambda item: -item[1]):
+        count = sessions(name)
+        best = None
+        for chosen in day_sets[count]:
+            # the longest of the days, then the least training in total
+            loads = [schedule.loads[i] for i in chosen]
+            score = (max(loads) + duration, sum(loads))
+            if max_session is not None and score[0] > max_session:
+                continue
+            if best is None or score < best[0]:
+                best = (score, chosen)
+        if best is None:
+            schedule.unscheduled.extend([name] * count)
+            continue
+        total += duration * count
+        longest_group = max(longest_group, duration)
+        group_days[name] = set(best[1])
+        for i in best[1]:
+            schedule.groups[i].append(name)
+            schedule.loads[i] += duration
+    if days:
+        schedule.lower_bound = max(total / len(days), longest_group)
+    improve(schedule, group_days, day_sets, rest_days, max_session)
+    return schedule
+
+
+def improve(schedule, group_days, day_sets, rest_days, max_session=None):
+    """
+    Move groups of the longest day of schedule to other days (see
+    schedule_week() for group_days and day_sets), or swap them with
+    groups of other days, while that makes the longest day shorter.
+    """
+    durations = schedule.durations
+    loads = schedule.loads
+    days = schedule.days
+    # whether the same group can be trained on both days
+    rested = [[rest_days_between(first, second) >= rest_days
+               for second in days] for first in days]
+
+    def can_move(name, source, target):
+        """
+        Return True if the session of group name on day source can be
+        moved to day target without breaking its rest days.
+        """
+        trained = group_days[name]
+        return target not in trained and all(
+            rested[target][i] for i in trained if i != source)
+
+    def fits(load):
+        return max_session is None or load <= max_session
+
+    for _ in range(MAX_ROUNDS):
+        longest = max(range(len(days)), key=loads.__getitem__)
+        if loads[longest] - schedule.lower_bound < CLOSE_ENOUGH:
+            return
+        best = None  # (new longest of the days changed, move)
+        for name in schedule.groups[longest]:
+            # the sessions of the group on other days, keeping its rest
+            duration = durations[name]
+            trained = group_days[name]
+            for chosen in day_sets[len(trained)]:
+                if longest in chosen:
+                    continue
+                added = [i for i in chosen if i not in trained]
+                new = max([loads[i] - duration for i in trained
+                           if i not in chosen]
+                          + [loads[i] + duration for i in added])
+                if ((best is None or new < best[0]) and new < loads[longest]
+                        and all(fits(loads[i] + duration) for i in added)):
+                    best = (new, name, chosen, None, None)
+        for target in range(len(days)):
+            gap = loads[longest] - loads[target]
+            if target == longest or gap <= 0:
+                continue
+            # swapping groups of durations d and e makes the two days
+            # loads[longest] - (d - e) and loads[target] + (d - e) long:
+            # the closer d - e is to gap / 2, the shorter the longer of
+            # them
+            limit = loads[longest] if best is None else best[0]
+            others = sorted((durations[name], name)
+                            for name in schedule.groups[target])
+            for name in schedule.groups[longest]:
+                duration = durations[name]
+                start = bisect.bisect_left(others, (duration - gap / 2,))
+                # the closest group that can be swapped on either side
+                for indices in (
+                        range(start, min(start + SWAP_CANDIDATES,
+                                         len(others))),
+                        range(start - 1, max(start - SWAP_CANDIDATES, 0) - 1,
+                              -1)):
+                    for i in indices:
+                        other_duration, other = others[i]
+                        change = duration - other_duration
+                        new = max(loads[longest] - change,
+                                  loads[target] + change)
+                        if new >= limit:
+                            break  # only worse swaps are further on
+                        if (fits(loads[target] + change)
+                                and can_move(name, longest, target)
+                                and can_move(other, target, longest)):
+                            best = (new, name, None, target, other)
+                            limit = new
+                            break
+        if best is None:
+            return
+        _, name, chosen, target, other = best
+        if other is None:
+            for source in group_days[name] - set(chosen):
+                target = min(set(chosen) - group_days[name])
+                move_group(schedule, group_days, name, source, target)
+        else:
+            move_group(schedule, group_days, name, longest, target)
+            move_group(schedule, group_days, other, target, longest)
+
+
+def move_group(schedule, group_days, name, source, target):
+    schedule.groups[source].remove(name)
+    schedule.groups[target].append(name)
+    schedule.loads[source] -= schedule.durations[name]
+    schedule.loads[target] += schedule.durations[name]
+    group_days[name].remove(source)
+    group_days[name].add(target)
+
+
+def render_schedule(rows):
+    """
+    Return the rows of a schedule (header row included) as a table for
+    the terminal.
+    """
+    return tabulate(rows[1:], headers=rows[0], tablefmt='fancy_grid',
+                    stralign='center', numalign='center',
+                    maxcolwidths=[None, GROUPS_WIDTH, None])
+
+
+def save_schedule(schedule, client=None):
+    """
+    Write schedule to the 'Weekly Schedule' worksheet of client.
+    Return the title of the worksheet.
+    """
+    worksheet = worksheet_title('Weekly Schedule', client)
+    write_worksheet(worksheet, schedule.build_table())
+    return worksheet
+
+
+def main():
+    """
+    Schedule the plan of a client, from the plan store or a file (see
+    plan_import.py), print the schedule and save it to the sheet.
+    """
+    parser = argparse.ArgumentParser(
+        description="Spread a plan's muscle groups over the training days "
+                    "of a week."
+    )
+    parser.add_argument('--client', required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--plan', metavar='ID',
+                        help='a plan of the plan store')
+    source.add_argument('--file', help='CSV or JSON Lines file of the plan')
+    parser.add_argument('--days', type=int, default=3,
+                        help='training days in the week')
+    parser.add_argument('--times', type=int, default=1,
+                        help='sessions of each muscle group in the week')
+    parser.add_argument('--rest-days', type=int, default=1,
+                        help='days between sessions of the same group')
+    parser.add_argument('--max-session', type=float, metavar='MINUTES',
+                        help='longest training day allowed')
+    parser.add_argument('--backend', help='storage backend, e.g. memory or '
+                                          'local:sheets (default: '
+                                          f'${BACKEND_VARIABLE} or gspread)')
+    args = parser.parse_args()
+    if args.backend:
+        os.environ[BACKEND_VARIABLE] = args.backend
+
+    if args.plan:
+        from plan_store import PlanStore
+
+        plans = PlanStore()
+        training_plan = plans.load_plan(args.client, args.plan)
+        plans.close()
+        if training_plan is None:
+            print(f'{args.client} has no plan {args.plan}')
+            return 1
+    else:
+        from plan_import import import_plan
+
+        training_plan = TrainingPlan()
+        _, skipped = import_plan(args.file, training_plan)
+        if skipped:
+            return 1
+
+    max_session = None
+    if args.max_session is not None:
+        max_session = args.max_session * 60
+    schedule = schedule_week(group_durations(training_plan),
+                             spread_days(min(args.days, 7)), args.times,
+                             args.rest_days, max_session)
+    print(render_schedule(schedule.build_table()))
+    print(schedule.message())
+    print(f'Saved to "{save_schedule(schedule, args.client)}"')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())